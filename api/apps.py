@@ -4,3 +4,11 @@ from django.apps import AppConfig
 class ApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'api'
+
+    def ready(self):
+        from api import dashboard, parents, search, versions
+
+        versions.connect()
+        dashboard.connect()
+        parents.connect()
+        search.connect()
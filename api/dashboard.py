@@ -0,0 +1,170 @@
+from django.conf import settings
+from django.contrib.admin.models import LogEntry
+from django.core.cache import cache
+from django.db.models import Count, Q
+from django.db.models.signals import m2m_changed, post_save, pre_delete
+from api import versions
+from core.models import ConfigurationItem, GroupWbs, Program, ProgramInventory, WbsElement
+
+'''
+Kit-readiness dashboard of a program, rolled up Program -> GroupWbs ->
+WbsElement from three grouped queries: the item counts (with their
+late-to-need status and program inventory), the parent/child edges and
+the WBS elements themselves. The totals of a group WBS and of the
+program are summed from those of their WBS elements.
+
+The rollup is cached per program, keyed by the program's dashboard
+counter alone (see `api.versions`), so a change to one program leaves
+the dashboards of the others cached. The counter is stored in the
+database, so whichever process bumps it, every process computes the
+dashboard again on its next request. It is bumped by `invalidate`:
+
+    the BOM and inventory pipelines, in their transaction
+    saves and deletes of the rows the dashboard reads (`connect`)
+    admin changes and deletes (admin log entries)
+    the API deleting a configuration item, which sends no delete signal
+
+Like `api.versions`, no delete receiver is connected to the tables the
+pipelines bulk-delete from (`ConfigurationItem`, `ProgramInventory`).
+'''
+
+Edges = ConfigurationItem.parents.through
+
+# How each model the dashboard reads leads to its program
+PROGRAMS = {
+    Program: "pk",
+    GroupWbs: "program_id",
+    WbsElement: "group_wbs__program_id",
+    ConfigurationItem: "wbs_element__group_wbs__program_id",
+    ProgramInventory: "group_wbs__program_id",
+}
+
+COUNTS = ["items", "children", "on_hand", "stocked", ConfigurationItem.LTN, ConfigurationItem.ON_TIME, "n/a"]
+
+
+def counter(program_id):
+    return f"dashboard:{program_id}"
+
+
+def cache_key(program_id):
+    # the version is read before the data, so a write landing meanwhile files the dashboard under the old one
+    (version,) = versions.get([counter(program_id)])
+    return f"dashboard:{program_id}:{version}"
+
+
+def rollup(program_id):
+    '''
+    The cached dashboard of a program, computed on a miss.
+    '''
+
+    key = cache_key(program_id)
+    dashboard = cache.get(key)
+    if dashboard is None:
+        dashboard = compute(program_id)
+        cache.set(key, dashboard, settings.DASHBOARD_CACHE_TIMEOUT)
+    return dashboard
+
+
+def invalidate(*program_ids):
+    '''
+    Has every process compute the dashboards of `program_ids` again once
+    the current transaction commits.
+    '''
+
+    versions.bump(*(counter(program_id) for program_id in program_ids))
+
+
+def programs(model, pks):
+    '''
+    Ids of the programs of the `model` rows `pks`.
+    '''
+
+    return set(model.objects.filter(pk__in=pks).exclude(**{f"{PROGRAMS[model]}__isnull": True}).values_list(PROGRAMS[model], flat=True))
+
+
+def changed(sender, instance, **kwargs):
+    invalidate(*programs(sender, [instance.pk]))
+
+
+def edges_changed(sender, instance, action, model, pk_set, **kwargs):
+    if action.startswith("post_"):
+        invalidate(*programs(type(instance), [instance.pk]), *programs(model, pk_set or []))
+
+
+def logged(sender, instance, **kwargs):
+    model = instance.content_type.model_class() if instance.content_type_id else None
+    if model in PROGRAMS:
+        # deletions are logged before the object is deleted
+        invalidate(*programs(model, [instance.object_id]))
+
+
+def connect():
+    '''
+    Connects the receivers; called once by `ApiConfig.ready`.
+    '''
+
+    m2m_changed.connect(edges_changed, sender=Edges, dispatch_uid="api.dashboard.edges")
+    post_save.connect(logged, sender=LogEntry, dispatch_uid="api.dashboard.logged")
+    for model in PROGRAMS:
+        uid = model._meta.label_lower
+        post_save.connect(changed, sender=model, dispatch_uid=f"api.dashboard.saved.{uid}")
+        if model not in (ConfigurationItem, ProgramInventory):
+            pre_delete.connect(changed, sender=model, dispatch_uid=f"api.dashboard.deleted.{uid}")
+
+
+def compute(program_id):
+    '''
+    The kit-readiness and late-to-need counts of a program, of each of
+    its group WBS and of each of their WBS elements. `kit_ready_percentage`
+    is the share of the children of their items that are on hand.
+    '''
+
+    program = Program.objects.values("id", "name").get(pk=program_id)
+    items = (
+        ConfigurationItem.objects.filter(wbs_element__group_wbs__program_id=program_id)
+        .with_program_inventory()
+        .late_to_need_counts()
+        .annotate(items=Count("pk"), stocked=Count("pk", filter=Q(program_inventory__gt=0)))
+    )
+    edges = (
+        Edges.objects.filter(to_configurationitem__wbs_element__group_wbs__program_id=program_id)
+        .values("to_configurationitem__wbs_element_id")
+        .annotate(children=Count("pk"), on_hand=Count("pk", filter=Q(from_configurationitem__replenishment=ConfigurationItem.ON_HAND)))
+        .order_by()
+    )
+    wbs_elements = WbsElement.objects.filter(group_wbs__program_id=program_id).values("id", "name", "group_wbs_id", "group_wbs__name").order_by("group_wbs__name", "name")
+
+    counts = {}
+    for row in items:
+        counts[row["wbs_element_id"]] = {
+            "items": row["items"],
+            "stocked": row["stocked"],
+            ConfigurationItem.LTN: row["ltn"],
+            ConfigurationItem.ON_TIME: row["on_time"],
+            "n/a": row["na"],
+        }
+    for row in edges:
+        counts.setdefault(row["to_configurationitem__wbs_element_id"], {}).update(children=row["children"], on_hand=row["on_hand"])
+
+    dashboard = node(program["id"], program["name"], group_wbs=[])
+    groups = {}
+    for wbs_element in wbs_elements:
+        group = groups.get(wbs_element["group_wbs_id"])
+        if group is None:
+            group = groups[wbs_element["group_wbs_id"]] = node(wbs_element["group_wbs_id"], wbs_element["group_wbs__name"], wbs_elements=[])
+            dashboard["group_wbs"].append(group)
+
+        element = node(wbs_element["id"], wbs_element["name"], **counts.get(wbs_element["id"], {}))
+        group["wbs_elements"].append(element)
+        for total in (group, dashboard):
+            for field in COUNTS:
+                total[field] += element[field]
+
+    for total in [dashboard, *dashboard["group_wbs"], *(element for group in dashboard["group_wbs"] for element in group["wbs_elements"])]:
+        total["kit_ready_percentage"] = round(100.0 * total["on_hand"] / total["children"], 1) if total["children"] else 0.0
+
+    return dashboard
+
+
+def node(id, name, **fields):
+    return {"id": id, "name": name, **{field: 0 for field in COUNTS}, **fields}
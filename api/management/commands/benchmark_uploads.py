@@ -0,0 +1,318 @@
+from pathlib import Path
+from django.contrib.auth import get_user_model
+from django.core.files import File
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings
+from django.utils import timezone
+from api.uploads import jobs
+from api.v1.resources import alt_sub_upload, configuration_item_upload, inventory_item_upload, material_master_upload
+from core.models import AltSubUpload, ConfigurationItemUpload, GroupWbs, InventoryUpload, MaterialMasterUpload, Program, WbsElement
+import json
+import platform
+import subprocess
+import tempfile
+import time
+import tracemalloc
+import numpy as np
+import pandas as pd
+
+'''
+Throughput benchmark of the upload pipelines, run against a throwaway
+copy of the configured database (the same one `manage.py test` builds):
+
+    python manage.py benchmark_uploads --rows 10000 100000 --output HEAD.json
+    python manage.py benchmark_uploads --rows 10000 100000 --compare HEAD.json
+
+For every size, synthetic SAP-shaped files are generated with a fixed
+seed and each pipeline is run end to end, in dependency order (material
+master, inventory, alt/sub, BOM), through these stages:
+
+    parse    parsing the CSV into its snapshot (pipelines with `parse`)
+    ingest   the first upload, into empty tables
+    noop     the same file again
+    update   the file with 1% of its rows changed
+
+Each stage records its wall time, rows/sec, number of SQL queries and
+peak Python memory. Memory is traced with tracemalloc, which makes the
+Python-heavy stages several times slower: pass `--no-memory` for
+realistic timings, and only compare runs taken with the same flags.
+Results are written as JSON with the commit they were measured on, so
+runs can be compared across commits.
+'''
+
+PLANTS = ["P100", "P200", "P300"]
+TYPES = ["MAKE", "MSUB", "PRCH"]
+UNITS = ["EA", "FT", "LB", "GAL"]
+Y_GROUP = "Y-BENCH-DF"
+WBS_ELEMENTS = [f"{Y_GROUP}-{i:04d}" for i in range(100)]
+
+
+def sap_dates(rng, n, blank=0.2):
+    days = np.datetime64("2020-01-01") + rng.integers(0, 2000, n).astype("timedelta64[D]")
+    dates = pd.Series(pd.to_datetime(days).strftime("%m/%d/%Y"))
+    return dates.where(rng.random(n) > blank, "")
+
+
+def material_names(n):
+    return pd.Series(np.arange(n)).map("MAT{:07d}".format)
+
+
+def material_master_file(rng, n):
+    return pd.DataFrame(
+        {
+            "Material": material_names(n),
+            "Material Description": pd.Series(rng.integers(0, 5000, n)).map("ASSY, PART {}".format),
+            "Plnt": rng.choice(PLANTS, n),
+            "Matl Type": rng.choice(TYPES, n),
+            "Base Unit of Measure": rng.choice(UNITS, n),
+            "Procurement Type": rng.choice(["E", "F"], n),
+            "GR Processing Time": rng.integers(0, 10, n),
+            "Planned Deliv. Time": rng.integers(0, 120, n),
+            "Storage conditions": rng.choice(["", "01", "02"], n),
+            "Base Drawing": pd.Series(rng.integers(0, 1000, n)).map("DWG-{:05d}".format),
+            "Electrical Flag": rng.choice(["", "X"], n),
+        }
+    )
+
+
+def inventory_item_file(rng, n):
+    quantities = {column: rng.integers(0, 5000, n) * (rng.random(n) > 0.7) for column in inventory_item_upload.QUANTITIES}
+    return pd.DataFrame(
+        {
+            "Material": material_names(n).sample(frac=1, replace=True, random_state=rng.integers(1 << 31)).to_numpy(),
+            "Plnt": rng.choice(PLANTS, n),
+            "SLoc": pd.Series(rng.integers(0, 40, n)).map("S{:03d}".format),
+            "Matl Type": rng.choice(TYPES, n),
+            "WBS Element": pd.Series(rng.choice(WBS_ELEMENTS + [""], n)),
+            "Batch": pd.Series(np.arange(n)).map("B{:09d}".format),
+            "Lot Date Code": rng.choice(["", "2201", "2207", "2301"], n),
+            "BUn": rng.choice(UNITS, n),
+            **{column: pd.Series(values).map("{:,}".format) for column, values in quantities.items()},
+            "SLED/BBD": sap_dates(rng, n),
+            "Discard Date": sap_dates(rng, n, blank=0.9),
+        }
+    )
+
+
+def alt_sub_file(rng, n, model_code):
+    materials = material_names(n)
+    return pd.DataFrame(
+        {
+            "Plnt": rng.choice(PLANTS, n),
+            "Model": model_code,
+            "Type Code": rng.choice(["1", "2"], n),
+            "Primary Material": materials.sample(frac=1, replace=True, random_state=rng.integers(1 << 31)).to_numpy(),
+            "Replacement Part": materials.sample(frac=1, replace=True, random_state=rng.integers(1 << 31)).to_numpy(),
+            "Next Higher Assembly": "",
+            "Alternate or Substitute Code": rng.choice(["A", "S"], n),
+            "Sub Code": pd.Series(np.arange(n)).map(str),
+            "WBS Element": rng.choice(WBS_ELEMENTS, n),
+            "RevLev": rng.choice(["", "A", "B"], n),
+            "Reason For Change": rng.choice(["OBSOLETE", "SHORTAGE", "ENG CHANGE"], n),
+            "Item Text Line 1": "",
+            "Created by": rng.choice(["JSMITH", "ADOE"], n),
+            "Created": sap_dates(rng, n, blank=0),
+            "Date": "",
+        }
+    )
+
+
+def bom_levels(rng, n, depth=8):
+    # every line is at most one level below the line before it
+    steps = rng.random(n)
+    drops = rng.integers(1, depth, n)
+    levels = np.empty(n, dtype=int)
+    level = 0
+    for i in range(n):
+        level = level + 1 if level < depth and (level == 0 or steps[i] < 0.6) else min(drops[i], level)
+        levels[i] = level
+    return levels
+
+
+def configuration_item_file(rng, n):
+    levels = bom_levels(rng, n)
+    return pd.DataFrame(
+        {
+            "Level": ["." * (level - 1) + str(level) for level in levels],
+            "WBS Element": np.array(WBS_ELEMENTS)[np.arange(n) * len(WBS_ELEMENTS) // n],
+            "Material": material_names(n).sample(frac=1, replace=True, random_state=rng.integers(1 << 31)).to_numpy(),
+            "Item Type": rng.choice(TYPES, n),
+            "Material Description": pd.Series(rng.integers(0, 5000, n)).map("ASSY, PART {}".format),
+            "Req Qty": rng.integers(1, 20, n),
+            "Req Date": sap_dates(rng, n),
+            "Net Order": pd.Series(np.arange(n)).map("N{:09d}".format),
+            "Replenishment": rng.choice(["ON-HAND QTY", "PURCH REQ", "PROD ORDER"], n),
+            "PO Delivery": sap_dates(rng, n, blank=0.6),
+        }
+    )
+
+
+# Pipelines in the order they are loaded, with the column changed in 1% of rows for "update"
+PIPELINES = {
+    "material_master": (MaterialMasterUpload, material_master_upload, material_master_file, "Material Description"),
+    "inventory_item": (InventoryUpload, inventory_item_upload, inventory_item_file, "Unrestricted"),
+    "alt_sub": (AltSubUpload, alt_sub_upload, alt_sub_file, "Reason For Change"),
+    "configuration_item": (ConfigurationItemUpload, configuration_item_upload, configuration_item_file, "Req Qty"),
+}
+
+
+class Stage:
+    '''
+    Measures the wall time, queries and peak memory of the block.
+    '''
+
+    def __init__(self, memory):
+        self.memory = memory
+        self.queries = 0
+
+    def count(self, execute, sql, params, many, context):
+        self.queries += 1
+        return execute(sql, params, many, context)
+
+    def __enter__(self):
+        if self.memory:
+            tracemalloc.reset_peak()
+        self.wrapper = connection.execute_wrapper(self.count)
+        self.wrapper.__enter__()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.seconds = time.perf_counter() - self.start
+        self.wrapper.__exit__(*exc)
+        self.peak = tracemalloc.get_traced_memory()[1] if self.memory else None
+
+
+class Command(BaseCommand):
+    help = "Benchmarks the upload pipelines end to end on synthetic SAP files"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", nargs="+", type=int, default=[10_000, 100_000, 1_000_000], help="file sizes to benchmark")
+        parser.add_argument("--pipelines", nargs="+", choices=PIPELINES, default=list(PIPELINES), help="pipelines to run (material_master is always loaded first)")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--no-memory", action="store_true", help="don't trace memory (faster, but no peak memory)")
+        parser.add_argument("--output", help="write the results to this JSON file")
+        parser.add_argument("--compare", help="compare rows/sec with an earlier JSON result file")
+
+    def handle(self, *args, **options):
+        memory = not options["no_memory"]
+        pipelines = ["material_master", *[name for name in options["pipelines"] if name != "material_master"]]
+
+        with tempfile.TemporaryDirectory() as tmp:
+            # ################################################################################
+            # Throwaway database and media root
+            if connection.vendor == "sqlite":
+                connection.settings_dict["TEST"]["NAME"] = str(Path(tmp) / "benchmark.sqlite3")
+            old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+
+            if memory:
+                tracemalloc.start()
+
+            try:
+                with override_settings(MEDIA_ROOT=str(Path(tmp) / "media")):
+                    results = [
+                        result
+                        for rows in options["rows"]
+                        for result in self.run_size(rows, pipelines, options["seed"], Path(tmp), memory)
+                    ]
+            finally:
+                tracemalloc.stop()
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        report = {
+            "commit": git_commit(),
+            "created": timezone.now().isoformat(),
+            "python": platform.python_version(),
+            "database": connection.vendor,
+            "results": results,
+        }
+
+        if options["output"]:
+            Path(options["output"]).write_text(json.dumps(report, indent=2))
+
+        if options["compare"]:
+            self.compare(json.loads(Path(options["compare"]).read_text()), report)
+
+    def run_size(self, rows, pipelines, seed, tmp, memory):
+        rng = np.random.default_rng(seed)
+        user = get_user_model().objects.create(username=f"benchmark-{rows}")
+        program = Program.objects.create(name=f"Benchmark {rows}", model_code=f"BM{rows}")
+        group_wbs = GroupWbs.objects.create(program=program, program_type=GroupWbs.ProgramTypeChoices.DELIVERABLE_FLIGHT, name=Y_GROUP)
+        WbsElement.objects.bulk_create([WbsElement(group_wbs=group_wbs, name=name) for name in WBS_ELEMENTS])
+
+        for name in pipelines:
+            model, pipeline, generate, changed_column = PIPELINES[name]
+            df = generate(rng, rows, program.model_code) if name == "alt_sub" else generate(rng, rows)
+
+            changed = df.copy()
+            mask = rng.random(rows) < 0.01
+            changed.loc[mask, changed_column] = changed.loc[mask, changed_column].astype(str) + "9"
+
+            original_path, changed_path = tmp / f"{name}-{rows}.csv", tmp / f"{name}-{rows}-changed.csv"
+            df.to_csv(original_path, index=False)
+            changed.to_csv(changed_path, index=False)
+
+            upload = self.create_upload(model, program, user, original_path)
+            if hasattr(pipeline, "parse"):
+                yield self.measure(name, rows, "parse", memory, pipeline.parse, upload)
+            yield self.measure(name, rows, "ingest", memory, run_job, upload, pipeline.ingest)
+            yield self.measure(name, rows, "noop", memory, run_job, self.create_upload(model, program, user, original_path), pipeline.ingest)
+            yield self.measure(name, rows, "update", memory, run_job, self.create_upload(model, program, user, changed_path), pipeline.ingest)
+
+        # start every size from empty tables; dependents first, as materials are protected
+        for model, *_ in reversed(PIPELINES.values()):
+            model.objects.all().delete()
+        program.delete()
+        user.delete()
+
+    def create_upload(self, model, program, user, path):
+        fields = {"program": program} if model is ConfigurationItemUpload else {"sector": program, "uploaded_by": user}
+        with path.open("rb") as data_file:
+            return model.objects.create(data_file=File(data_file, name=path.name), **fields)
+
+    def measure(self, name, rows, stage_name, memory, function, *args):
+        with Stage(memory) as stage:
+            function(*args)
+
+        result = {
+            "pipeline": name,
+            "rows": rows,
+            "stage": stage_name,
+            "seconds": round(stage.seconds, 3),
+            "rows_per_sec": round(rows / stage.seconds) if stage.seconds else None,
+            "queries": stage.queries,
+            "peak_mb": round(stage.peak / 2**20, 1) if stage.peak is not None else None,
+        }
+
+        peak = f"{result['peak_mb']:>9} MB" if memory else ""
+        self.stdout.write(
+            f"{name:<20} {rows:>9} {stage_name:<7} {result['seconds']:>9.2f}s {result['rows_per_sec'] or 0:>10} rows/s {stage.queries:>7} queries {peak}"
+        )
+        return result
+
+    def compare(self, baseline, report):
+        self.stdout.write(f"\nrows/sec vs {baseline['commit'] or 'baseline'}:")
+        previous = {(r["pipeline"], r["rows"], r["stage"]): r for r in baseline["results"]}
+
+        for result in report["results"]:
+            before = previous.get((result["pipeline"], result["rows"], result["stage"]))
+            if before and before["rows_per_sec"] and result["rows_per_sec"]:
+                change = result["rows_per_sec"] / before["rows_per_sec"] - 1
+                style = self.style.SUCCESS if change >= 0 else self.style.ERROR
+                self.stdout.write(style(f"{result['pipeline']:<20} {result['rows']:>9} {result['stage']:<7} {change:>+8.1%}"))
+
+
+def run_job(upload, ingest):
+    jobs.run(type(upload), upload.pk, ingest)
+    upload.refresh_from_db()
+
+    if upload.status != upload.StatusChoices.SUCCEEDED:
+        raise CommandError(f"{type(upload).__name__} {upload.pk} failed: {upload.errors}")
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
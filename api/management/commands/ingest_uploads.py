@@ -0,0 +1,61 @@
+from pathlib import Path
+from django.contrib.auth import get_user_model
+from django.core.files import File
+from django.core.management.base import BaseCommand, CommandError
+from api.uploads import batch
+from api.v1.resources import alt_sub_upload, inventory_item_upload, material_master_upload
+from core.models import AltSubUpload, InventoryUpload, MaterialMasterUpload, Program
+
+# Upload kinds, in the order their files are applied within a batch
+KINDS = {
+    "material_master": (MaterialMasterUpload, material_master_upload),
+    "inventory_item": (InventoryUpload, inventory_item_upload),
+    "alt_sub": (AltSubUpload, alt_sub_upload),
+}
+
+
+class Command(BaseCommand):
+    help = "Ingests several upload files at once, parsing them in parallel (see api.uploads.batch)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("files", nargs="+", metavar="KIND:SECTOR:PATH", help=f"KIND is one of {', '.join(KINDS)}; SECTOR is a program id")
+        parser.add_argument("--user", required=True, help="username recorded as the uploader")
+        parser.add_argument("--processes", type=int, help="number of parsing processes (default UPLOAD_PROCESSES)")
+
+    def handle(self, *args, **options):
+        try:
+            user = get_user_model().objects.get(username=options["user"])
+        except get_user_model().DoesNotExist:
+            raise CommandError(f"Unknown user {options['user']}")
+
+        files = []
+        for spec in options["files"]:
+            kind, sector, path = spec.split(":", 2) if spec.count(":") >= 2 else (spec, None, None)
+            if kind not in KINDS:
+                raise CommandError(f"Invalid file {spec}: expected KIND:SECTOR:PATH with KIND in {', '.join(KINDS)}")
+            if not Program.objects.filter(pk=sector).exists():
+                raise CommandError(f"Unknown sector {sector}")
+            if not Path(path).is_file():
+                raise CommandError(f"No such file {path}")
+            files.append((kind, sector, Path(path)))
+
+        # materials first, so that the inventory and alt/subs can reference them
+        files.sort(key=lambda file: list(KINDS).index(file[0]))
+
+        uploads = []
+        for kind, sector, path in files:
+            model, pipeline = KINDS[kind]
+            with path.open("rb") as data_file:
+                upload = model.objects.create(sector_id=sector, uploaded_by=user, data_file=File(data_file, name=path.name))
+            uploads.append((upload, pipeline.parse, pipeline.ingest))
+
+        batch.ingest(uploads, options["processes"])
+
+        for upload, _, _ in uploads:
+            upload.refresh_from_db()
+            self.stdout.write(
+                f"{type(upload).__name__} {upload.pk} ({upload.data_file.name}): {upload.get_status_display()}, "
+                f"{upload.rows_read} read, {upload.rows_added} added, {upload.rows_deleted} deleted in {upload.duration:.1f}s"
+            )
+            if upload.errors:
+                self.stderr.write(f"  {upload.errors}")
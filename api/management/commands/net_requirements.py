@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand, CommandError
+from api import netting
+from core.models import Program
+
+
+class Command(BaseCommand):
+    help = "Nets a program's BOM requirements against its on-hand inventory and substitutes (see api.netting)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("program", type=int, help="program id")
+        parser.add_argument("--all", action="store_true", help="list every material and date, not only the shortages")
+        parser.add_argument("--output", help="write the rows to this CSV file instead of the console")
+
+    def handle(self, *args, **options):
+        if not Program.objects.filter(pk=options["program"]).exists():
+            raise CommandError(f"Unknown program {options['program']}")
+
+        df = netting.shortages(options["program"], everything=options["all"])
+
+        if options["output"]:
+            df.to_csv(options["output"], index=False)
+            self.stdout.write(f"{len(df)} rows written to {options['output']}")
+        else:
+            self.stdout.write(df.to_string(index=False) if len(df) else "No shortages")
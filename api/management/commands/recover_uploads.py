@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+from api.uploads import jobs
+
+
+class Command(BaseCommand):
+    help = "Marks the uploads left queued or running by a stopped server as failed (see api.uploads.jobs); run it before starting the server"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--stale-after", type=int, help="seconds without progress before an upload counts as abandoned (default UPLOAD_STALE_AFTER)")
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"{jobs.recover(options['stale_after'])} interrupted uploads marked failed")
@@ -0,0 +1,120 @@
+from django.db.models import F, Sum
+from core.models import AltSub, ConfigurationItem, ProgramInventory
+import numpy as np
+import pandas as pd
+
+'''
+Material requirements netting of a program, on whole-program arrays.
+
+The BOM upload stores the exploded BOM: every line of every level is a
+`ConfigurationItem` with its own `req_qty` and `req_date`. The demand
+is those lines, less the MAKE assemblies, which are built from their
+children rather than drawn from stock, summed per material and date.
+It is netted in date order against the program's on-hand inventory
+(`ProgramInventory` over its group WBS):
+
+    required      the quantity needed on that date
+    from_stock    covered by the material's own on-hand inventory
+    from_subs     covered by the stock its substitutes have left once
+                  their own demand is netted (see `AltSub`)
+    shortage      what is still missing
+
+Substitutes are tried in `sub_code` order, one round per rank, and the
+stock of a substitute goes to the earliest shortages first, whichever
+primary they are for.
+'''
+
+COLUMNS = ["material", "req_date", "required", "from_stock", "from_subs", "shortage"]
+
+
+def demand(program_id):
+    items = (
+        ConfigurationItem.objects.filter(wbs_element__group_wbs__program_id=program_id, req_qty__gt=0)
+        .exclude(configuration_type=ConfigurationItem.ConfigurationTypeChoices.MAKE)
+        .values_list("name", "req_date", "req_qty")
+    )
+    # typed, so that a program without demand nets to an empty frame
+    return pd.DataFrame(list(items), columns=["material", "req_date", "req_qty"]).astype({"req_qty": "float64"})
+
+
+def supply(program_id):
+    on_hand = (
+        ProgramInventory.objects.filter(group_wbs__program_id=program_id, on_hand_inventory__gt=0)
+        .values_list("material_master_id")
+        .annotate(Sum("on_hand_inventory"))
+        .order_by()
+    )
+    return pd.Series(dict(on_hand), name="on_hand", dtype="float64")
+
+
+def substitutes(program_id):
+    pairs = AltSub.objects.filter(model_id=program_id).exclude(replacement_part=F("primary_material")).order_by("primary_material", "sub_code", "replacement_part")
+    subs = pd.DataFrame(list(pairs.values_list("primary_material_id", "replacement_part_id")), columns=["primary", "replacement"]).drop_duplicates()
+    return subs.assign(rank=subs.groupby("primary").cumcount().astype("int64"))
+
+
+def allocate(need, key, available):
+    '''
+    Share of each `need` covered by `available[key]`, handing it out in
+    row order within each key.
+    '''
+
+    stock = key.map(available).fillna(0.0).to_numpy()
+    after = need.groupby(key.to_numpy()).cumsum().to_numpy()
+    before = after - need.to_numpy()
+    return np.minimum(after, stock) - np.minimum(before, stock)
+
+
+def net(demand, supply, substitutes):
+    '''
+    Nets `demand` (material, req_date, req_qty rows) against `supply`
+    (on-hand quantity per material) and then `substitutes` (primary,
+    replacement, rank rows). Returns one row per material and date.
+    '''
+
+    df = (
+        demand.groupby(["material", "req_date"], dropna=False)["req_qty"]
+        .sum()
+        .rename("required")
+        .reset_index()
+        .sort_values(["material", "req_date"], na_position="last", ignore_index=True)
+    )
+
+    df["from_stock"] = allocate(df["required"], df["material"], supply)
+    df["from_subs"] = 0.0
+    df["shortage"] = df["required"] - df["from_stock"]
+
+    # stock left once each material's own demand is covered
+    leftover = supply.sub(df.groupby("material")["from_stock"].sum(), fill_value=0.0).clip(lower=0.0)
+
+    ranks = substitutes["rank"].max() + 1 if len(substitutes) else 0
+
+    for rank in range(ranks):
+        replacement = df["material"].map(substitutes[substitutes["rank"] == rank].set_index("primary")["replacement"])
+        short = df[(df["shortage"] > 0) & replacement.notna()].assign(replacement=replacement)
+        if short.empty:
+            continue
+
+        short = short.sort_values(["req_date", "material"], na_position="last")
+        covered = pd.Series(allocate(short["shortage"], short["replacement"], leftover), index=short.index)
+
+        df.loc[short.index, "from_subs"] += covered
+        df.loc[short.index, "shortage"] -= covered
+        leftover = leftover.sub(covered.groupby(short["replacement"]).sum(), fill_value=0.0)
+
+    return df[COLUMNS]
+
+
+def shortages(program_id, everything=False):
+    '''
+    The netting of a program: the rows with a shortage, or every row.
+    '''
+
+    df = net(demand(program_id), supply(program_id), substitutes(program_id))
+    if not everything:
+        df = df[df["shortage"] > 0]
+    return df.reset_index(drop=True)
+
+
+def records(df):
+    return df.astype(object).where(df.notna(), None).to_dict("records")
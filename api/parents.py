@@ -0,0 +1,37 @@
+from django.db.models.signals import m2m_changed
+from core.models import ConfigurationItem
+
+'''
+Keeps the resolved `parent` of configuration items current when their
+parent edges are edited through the API, the admin or the ORM. The BOM
+upload writes the `parents` through table directly, which sends no
+signal, and resolves the parents of its items itself.
+
+    item.parents.add(a)       the parent of `item` is resolved again
+    a.children.remove(item)   the same, through the reverse side
+    a.children.clear()        every item whose parent was `a`
+'''
+
+Edges = ConfigurationItem.parents.through
+
+
+def edges_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if not action.startswith("post_"):
+        return
+
+    if not reverse:
+        items = ConfigurationItem.objects.filter(pk=instance.pk)
+    elif pk_set is not None:
+        items = ConfigurationItem.objects.filter(pk__in=pk_set)
+    else:
+        # `post_clear` of the reverse side: the children are no longer known
+        items = ConfigurationItem.objects.filter(parent_id=instance.pk)
+    items.resolve_parents()
+
+
+def connect():
+    '''
+    Connects the receiver; called once by `ApiConfig.ready`.
+    '''
+
+    m2m_changed.connect(edges_changed, sender=Edges, dispatch_uid="api.parents.edges")
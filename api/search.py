@@ -0,0 +1,162 @@
+from django.db import connection
+from django.db.models import Q
+from django.db.models.signals import post_delete, post_save
+from django.db.models.expressions import RawSQL
+from api.uploads.resolver import param_batches
+from core.models import MaterialMaster
+
+'''
+Part search over the material master, its inventory and its alt/subs.
+
+On SQLite, `core_partsearch` is an FTS5 table with the trigram
+tokenizer (see migration 0013), so any substring of three characters or
+more of a part number or nomenclature is an index lookup, ranked with
+bm25. It holds one row per material, with the material's id as rowid:
+
+    name, nomenclature, base_drawing    from `MaterialMaster`
+    related                             the parts it substitutes or is
+                                        substituted by, its next higher
+                                        assemblies, and the WBS elements
+                                        and batches of its inventory
+
+The upload pipelines `refresh` the rows of the materials they touch in
+their own transaction; materials saved or deleted one at a time (API,
+admin) are refreshed by the receivers of `connect`. Other databases have no such table and `search`
+falls back to `icontains` over the material master.
+'''
+
+TABLE = "core_partsearch"
+
+# bm25 weights of name, nomenclature, base_drawing and related
+WEIGHTS = (10.0, 4.0, 4.0, 1.0)
+
+# trigram tokens match substrings of at least this length
+MIN_TERM_LENGTH = 3
+
+RELATED = """
+    SELECT group_concat(part, ' ') FROM (
+        SELECT replacement_part_id AS part FROM core_altsub WHERE primary_material_id = m.name
+        UNION SELECT primary_material_id FROM core_altsub WHERE replacement_part_id = m.name
+        UNION SELECT next_higher_assembly FROM core_altsub WHERE primary_material_id = m.name AND next_higher_assembly IS NOT NULL
+        UNION SELECT wbs FROM core_inventoryitem WHERE material_master_id = m.name AND wbs IS NOT NULL
+        UNION SELECT batch FROM core_inventoryitem WHERE material_master_id = m.name
+    )
+"""
+
+
+def enabled():
+    return connection.vendor == "sqlite"
+
+
+def refresh(names):
+    '''
+    Rewrites the search rows of the materials named `names`.
+    '''
+
+    if not enabled():
+        return
+
+    with connection.cursor() as cursor:
+        for batch in param_batches(sorted(names)):
+            placeholders = ", ".join(["%s"] * len(batch))
+            cursor.execute(f"DELETE FROM {TABLE} WHERE rowid IN (SELECT id FROM core_materialmaster WHERE name IN ({placeholders}))", batch)
+            cursor.execute(
+                f"""
+                INSERT INTO {TABLE} (rowid, name, nomenclature, base_drawing, related)
+                SELECT m.id, m.name, coalesce(m.nomenclature, ''), coalesce(m.base_drawing, ''), coalesce(({RELATED}), '')
+                FROM core_materialmaster m WHERE m.name IN ({placeholders})
+                """,
+                batch,
+            )
+
+
+def saved(sender, instance, **kwargs):
+    refresh([instance.name])
+
+
+def deleted(sender, instance, **kwargs):
+    if enabled():
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {TABLE} WHERE rowid = %s", [instance.pk])
+
+
+def connect():
+    '''
+    Connects the receivers; called once by `ApiConfig.ready`.
+    '''
+
+    post_save.connect(saved, sender=MaterialMaster, dispatch_uid="api.search.saved")
+    post_delete.connect(deleted, sender=MaterialMaster, dispatch_uid="api.search.deleted")
+
+
+def match_expression(text):
+    '''
+    FTS5 query matching every term of `text` of at least
+    `MIN_TERM_LENGTH` characters, each as a quoted substring.
+    '''
+
+    terms = [term for term in text.split() if len(term) >= MIN_TERM_LENGTH]
+    return " ".join('"' + term.replace('"', '""') + '"' for term in terms)
+
+
+def short_terms(text):
+    '''
+    SQL condition and parameters checking the terms of `text` too short
+    for the trigram index against the matched rows.
+    '''
+
+    terms = [term for term in text.split() if len(term) < MIN_TERM_LENGTH]
+    condition = "".join(" AND instr(lower(name || ' ' || nomenclature || ' ' || base_drawing || ' ' || related), %s)" for _ in terms)
+    return condition, [term.lower() for term in terms]
+
+
+def search(text, limit=50):
+    '''
+    Up to `limit` materials matching `text`, best first, as
+    `(id, name, nomenclature, base_drawing, score)` rows. Lower scores
+    rank higher (bm25); the fallback scores every row 0. Every match is
+    scored, so terms that match most of the table are the slow case.
+    '''
+
+    if not enabled():
+        terms = Q()
+        for term in text.split():
+            terms &= Q(name__icontains=term) | Q(nomenclature__icontains=term) | Q(base_drawing__icontains=term)
+        materials = MaterialMaster.objects.filter(terms).order_by("name").values_list("id", "name", "nomenclature", "base_drawing")[:limit]
+        return [(*material, 0.0) for material in materials]
+
+    expression = match_expression(text)
+    if not expression:
+        return []
+    condition, params = short_terms(text)
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            SELECT m.id, m.name, m.nomenclature, m.base_drawing, found.score
+            FROM (
+                SELECT rowid, bm25({TABLE}, %s, %s, %s, %s) AS score FROM {TABLE}
+                WHERE {TABLE} MATCH %s{condition}
+                ORDER BY score LIMIT %s
+            ) found
+            JOIN core_materialmaster m ON m.id = found.rowid
+            ORDER BY found.score, m.name
+            """,
+            [*WEIGHTS, expression, *params, limit],
+        )
+        return cursor.fetchall()
+
+
+def filter(queryset, text):
+    '''
+    The materials of `queryset` matching `text`, unranked.
+    '''
+
+    if not enabled():
+        return queryset.filter(Q(name__icontains=text) | Q(nomenclature__icontains=text) | Q(base_drawing__icontains=text))
+
+    expression = match_expression(text)
+    if not expression:
+        return queryset.none()
+    condition, params = short_terms(text)
+    return queryset.filter(pk__in=RawSQL(f"SELECT rowid FROM {TABLE} WHERE {TABLE} MATCH %s{condition}", [expression, *params]))
@@ -0,0 +1,126 @@
+from functools import lru_cache
+from api import versions
+from core.models import AltSub
+import threading
+import numpy as np
+import pandas as pd
+
+'''
+Process-level graph of the alt/subs: an edge from each `primary_material`
+to its `replacement_part`, labelled with the alt/sub's plant and program.
+It is stored in CSR form (see `SubstitutionGraph`), so a lookup walks
+numpy slices instead of querying `primary_altsub_items` level by level,
+and answers are memoized until the graph is replaced.
+
+    substitutes.graph().substitutes("MAT-1", plant="P100", program=3)
+
+The graph is built on first use and rebuilt once the alt/subs change:
+each process compares the version of `AltSub` stored in the database,
+which the alt/sub upload and any other write bump (see `api.versions`),
+with the version its graph was built at.
+'''
+
+# Number of memoized lookups per graph
+LOOKUP_CACHE_SIZE = 100_000
+
+_graph = None
+_lock = threading.Lock()
+
+
+class SubstitutionGraph:
+    '''
+    `materials[i]` is the name of node `i`; the edges leaving it are
+    `targets[offsets[i]:offsets[i + 1]]`, with the plant code and the
+    program of each edge in `plants` and `programs`.
+    '''
+
+    def __init__(self, materials, offsets, targets, plants, programs, plant_codes, version=None):
+        self.materials = materials
+        self.index = {material: i for i, material in enumerate(materials)}
+        self.offsets = offsets
+        self.targets = targets
+        self.plants = plants
+        self.programs = programs
+        self.plant_codes = plant_codes
+        self.version = version
+        self.lookup = lru_cache(maxsize=LOOKUP_CACHE_SIZE)(self._lookup)
+
+    @classmethod
+    def build(cls, version=None):
+        edges = pd.DataFrame(
+            list(AltSub.objects.values_list("primary_material_id", "replacement_part_id", "plant", "model_id").distinct()),
+            columns=["primary", "replacement", "plant", "program"],
+        )
+        edges = edges[edges["primary"] != edges["replacement"]]
+
+        codes, materials = pd.factorize(pd.concat([edges["primary"], edges["replacement"]]), sort=True)
+        primary, replacement = codes[: len(edges)], codes[len(edges) :]
+        plants, plant_names = pd.factorize(edges["plant"])
+
+        order = np.argsort(primary, kind="stable")
+        offsets = np.searchsorted(primary[order], np.arange(len(materials) + 1)).astype(np.int32)
+
+        return cls(
+            materials=materials.to_numpy(dtype=object),
+            offsets=offsets,
+            targets=replacement[order].astype(np.int32),
+            plants=plants[order].astype(np.int32),
+            programs=edges["program"].to_numpy()[order].astype(np.int32),
+            plant_codes={plant: code for code, plant in enumerate(plant_names)},
+            version=version,
+        )
+
+    def substitutes(self, material, plant=None, program=None):
+        '''
+        `(material, depth)` of every substitute reachable from `material`
+        through the alt/subs of `plant` and `program` (any when None),
+        nearest first.
+        '''
+
+        return self.lookup(material, plant, None if program is None else int(program))
+
+    def _lookup(self, material, plant, program):
+        start = self.index.get(material)
+        plant = self.plant_codes.get(plant, -1) if plant is not None else None
+        if start is None or plant == -1:
+            return ()
+
+        depths = {start: 0}
+        frontier = [start]
+        depth = 0
+
+        while frontier:
+            depth += 1
+            reached = []
+            for node in frontier:
+                edges = slice(self.offsets[node], self.offsets[node + 1])
+                keep = np.ones(edges.stop - edges.start, dtype=bool)
+                if plant is not None:
+                    keep &= self.plants[edges] == plant
+                if program is not None:
+                    keep &= self.programs[edges] == program
+                for target in self.targets[edges][keep].tolist():
+                    if target not in depths:
+                        depths[target] = depth
+                        reached.append(target)
+            frontier = reached
+
+        del depths[start]
+        return tuple(sorted(((self.materials[node], depth) for node, depth in depths.items()), key=lambda pair: (pair[1], pair[0])))
+
+
+def graph():
+    '''
+    The process's graph, rebuilt if the alt/subs have changed since it
+    was built.
+    '''
+
+    global _graph
+
+    (version,) = versions.get([AltSub])
+    if _graph is None or _graph.version != version:
+        with _lock:
+            if _graph is None or _graph.version != version:
+                _graph = SubstitutionGraph.build(version)
+    return _graph
+
@@ -1,3 +1,1116 @@
-from django.test import TestCase
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import connection, transaction
+from django.db.models import Sum
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+from api import dashboard, netting, search, substitutes, versions
+from api.uploads import batch, closure, history, jobs
+from api.uploads.diff import Staging, contains
+from api.uploads.resolver import Resolver, param_batches, validate
+from api.uploads.snapshots import Snapshot
+from api.uploads.reader import as_tuples
+from api.viewsets import Filter, boolean, choice, date, positive
+from api.v1.resources import configuration_item_upload, material_master_upload, wbs_element
+from core.models import (
+    AltSub,
+    AltSubUpload,
+    ConfigurationItem,
+    ConfigurationItemClosure,
+    ConfigurationItemUpload,
+    GroupWbs,
+    InventoryItem,
+    InventoryUpload,
+    MaterialMaster,
+    MaterialMasterUpload,
+    ModelVersion,
+    Program,
+    ProgramInventory,
+    Sector,
+    StagedRow,
+    WbsElement,
+    fingerprint,
+    format_to_percent,
+)
+import datetime
+import io
+import json
+from pathlib import Path
+import shutil
+import tempfile
+import numpy as np
+import pandas as pd
 
-# Create your tests here.
+User = get_user_model()
+
+OTHER_PROCESS = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "other-process"}}
+
+
+def make_program(name="Program", model_code="PRG"):
+    program = Program.objects.create(name=name, model_code=model_code)
+    group_wbs = GroupWbs.objects.create(program=program, program_type=GroupWbs.ProgramTypeChoices.DELIVERABLE_FLIGHT, name="Y-ABCDE-DF")
+    wbs_element = WbsElement.objects.create(group_wbs=group_wbs, name="Y-ABCDE-DF-0001")
+    return program, group_wbs, wbs_element
+
+
+def make_materials(*names):
+    return [MaterialMaster.objects.create(name=name, plant="P100", base_unit_of_measure="EA", procurement_type="F") for name in names]
+
+
+def make_altsub(program, primary, replacement, plant="P100", sub_code="1", upload=None):
+    return AltSub.objects.create(
+        plant=plant,
+        model=program,
+        type_code="NA",
+        primary_material_id=primary,
+        replacement_part_id=replacement,
+        alternate_or_substitute_code="S",
+        sub_code=sub_code,
+        upload=upload,
+    )
+
+
+def make_item(wbs_element, name, **fields):
+    fields = {"configuration_type": ConfigurationItem.ConfigurationTypeChoices.PRCH, "net_order": "", "replenishment": "", **fields}
+    return ConfigurationItem.objects.create(wbs_element=wbs_element, name=name, **fields)
+
+
+def csv_file(name, *lines):
+    return SimpleUploadedFile(name, "\n".join(lines).encode() + b"\n", content_type="text/csv")
+
+
+MATERIAL_COLUMNS = "Material,Material Description,Plnt,Matl Type,Base Unit of Measure,Procurement Type,GR Processing Time,Planned Deliv. Time,Storage conditions,Base Drawing,Electrical Flag"
+
+
+def material_file(*materials):
+    return csv_file("materials.csv", MATERIAL_COLUMNS, *(f"{name},Widget {name},P100,PRCH,EA,F,1,2,,," for name in materials))
+
+
+class ApiTestCase(TestCase):
+    def setUp(self):
+        # versions roll back with each test, so pages cached by an earlier one could match
+        cache.clear()
+        self.user = User.objects.create_superuser("planner", "planner@example.com", "password")
+        self.client.force_login(self.user)
+
+
+####################################################################################################
+# Filters (api.viewsets)
+class FilterTests(SimpleTestCase):
+    def test_lookups(self):
+        self.assertEqual(Filter("plant").lookups("P100"), {"plant": "P100"})
+        self.assertEqual(Filter("wbs", "prefix").lookups("Y-AB"), {"wbs__gte": "Y-AB", "wbs__lt": "Y-AB\U0010ffff"})
+        self.assertEqual(Filter("type", "in", int).lookups("3, 5,"), {"type__in": [3, 5]})
+        self.assertEqual(Filter("day", "range", date).lookups("2024-01-01,"), {"day__gte": datetime.date(2024, 1, 1)})
+        self.assertEqual(Filter("day", "range", date).lookups(",2024-01-31"), {"day__lte": datetime.date(2024, 1, 31)})
+        self.assertEqual(Filter("superseded_by", "set", boolean).lookups("True"), {"superseded_by__isnull": False})
+        self.assertEqual(Filter("name", "contains").lookups("wid"), {"name__icontains": "wid"})
+
+    def test_invalid_values(self):
+        for filter, value in [(Filter("id", type=int), "1.5"), (Filter("pct", type=float), "abc"), (Filter("flag", type=boolean), "maybe"), (Filter("page", type=positive), "0"), (Filter("ltn", type=choice("LTN", "n/a")), "ltn")]:
+            with self.assertRaises(ValidationError) as raised:
+                filter.parse(value)
+            self.assertEqual(raised.exception.detail, {filter.field: [f'Invalid value: "{value}"']})
+
+        with self.assertRaises(ValueError):
+            Filter("name", "like")
+
+
+class FilterEndpointTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.program, _, self.wbs_element = make_program()
+
+    def test_invalid_parameters_are_rejected(self):
+        for url, params in [
+            ("configuration_items", {"kit_ready_min": "abc"}),
+            ("configuration_items", {"kit_ready_max": "50%"}),
+            ("configuration_items", {"max_depth": "deep"}),
+            ("configuration_items", {"descendants_of": "1", "max_depth": "deep"}),
+            ("configuration_items", {"ancestors_of": "x"}),
+            ("configuration_items", {"late_to_need": "late"}),
+            ("configuration_items/late_to_need_counts", {"late_to_need": "N/A"}),
+            ("colors", {"is_primary": "maybe"}),
+            ("program_users", {"program": "abc"}),
+            ("users", {"available_for_programs": "abc"}),
+        ]:
+            self.assertEqual(self.client.get(f"/api/v1/{url}/", params).status_code, 400, (url, params))
+
+    def test_typed_filters(self):
+        make_item(self.wbs_element, "A")
+        make_program("Other", "OTH")
+
+        self.assertEqual(self.client.get("/api/v1/configuration_items/", {"kit_ready_min": "0", "kit_ready_max": "100.0", "max_depth": "2"}).status_code, 200)
+        self.assertEqual([program["id"] for program in self.client.get("/api/v1/programs/", {"model_code": "prg"}).json()["results"]], [self.program.pk])
+        self.assertEqual(len(self.client.get("/api/v1/programs/", {"group_wbs": "abcde"}).json()["results"]), 2)
+
+
+####################################################################################################
+# Response cache (api.versions)
+@override_settings(RESPONSE_CACHE=True)
+class VersionTests(ApiTestCase):
+    def test_bump_is_persisted(self):
+        before = versions.get([Sector, "other"])
+        versions.bump(Sector, Sector)
+
+        self.assertEqual(versions.get([Sector, "other"]), (before[0] + 1, before[1]))
+        self.assertEqual(ModelVersion.objects.get(name="core.sector").version, before[0] + 1)
+
+    def test_bump_rolls_back_with_the_transaction(self):
+        before = versions.get([Sector])
+
+        with transaction.atomic():
+            versions.bump(Sector)
+            transaction.set_rollback(True)
+
+        self.assertEqual(versions.get([Sector]), before)
+
+    def test_saves_bump_their_model(self):
+        before = versions.get([Sector])
+        Sector.objects.create(name="Space")
+        self.assertEqual(versions.get([Sector]), (before[0] + 1,))
+
+    def test_list_is_cached_until_its_model_changes(self):
+        sector = Sector.objects.create(name="Space")
+        self.assertEqual(self.client.get("/api/v1/sectors/").json()["results"][0]["name"], "Space")
+
+        # writes that send no signal are only seen once their model is bumped
+        Sector.objects.filter(pk=sector.pk).update(name="Air")
+        self.assertEqual(self.client.get("/api/v1/sectors/").json()["results"][0]["name"], "Space")
+
+        versions.bump(Sector)
+        self.assertEqual(self.client.get("/api/v1/sectors/").json()["results"][0]["name"], "Air")
+
+    def test_other_processes_invalidate_the_cache(self):
+        sector = Sector.objects.create(name="Space")
+        self.assertEqual(self.client.get("/api/v1/sectors/").json()["results"][0]["name"], "Space")
+
+        # another worker, or an ingest command, has a cache of its own and only shares the database
+        with override_settings(CACHES=OTHER_PROCESS):
+            Sector.objects.filter(pk=sector.pk).update(name="Air")
+            versions.bump(Sector)
+
+        self.assertEqual(self.client.get("/api/v1/sectors/").json()["results"][0]["name"], "Air")
+
+
+####################################################################################################
+# Configuration item annotations (core.models)
+class LateToNeedTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.program, _, self.wbs_element = make_program()
+        jan, feb = datetime.date(2024, 1, 1), datetime.date(2024, 2, 1)
+        make_item(self.wbs_element, "LATE", req_date=jan, po_delivery=feb)
+        make_item(self.wbs_element, "EARLY", req_date=feb, po_delivery=jan)
+        make_item(self.wbs_element, "STOCKED", replenishment=ConfigurationItem.ON_HAND)
+        make_item(self.wbs_element, "OPEN")
+        make_item(self.wbs_element, "MADE", configuration_type=ConfigurationItem.ConfigurationTypeChoices.MAKE, req_date=jan, po_delivery=feb)
+        # without the annotation, the property computes the value itself
+        self.expected = {item.name: item.is_late_to_need for item in ConfigurationItem.objects.all()}
+
+    def test_annotation_matches_property(self):
+        self.assertEqual({item.name: item.late_to_need for item in ConfigurationItem.objects.with_late_to_need()}, self.expected)
+        self.assertEqual(self.expected, {"LATE": "LTN", "EARLY": None, "STOCKED": "ON TIME", "OPEN": None, "MADE": None})
+
+    def test_counts_match_property(self):
+        [row] = ConfigurationItem.objects.late_to_need_counts()
+        values = list(self.expected.values())
+        self.assertEqual((row["ltn"], row["on_time"], row["na"]), (values.count(ConfigurationItem.LTN), values.count(ConfigurationItem.ON_TIME), values.count(None)))
+
+        counts = self.client.get("/api/v1/configuration_items/late_to_need_counts/").json()
+        self.assertEqual(counts["programs"], [{"id": self.program.pk, "LTN": 1, "ON TIME": 1, "n/a": 3}])
+
+    def test_filter(self):
+        for value, names in [("LTN", ["LATE"]), ("ON TIME", ["STOCKED"]), ("n/a", ["EARLY", "OPEN", "MADE"])]:
+            results = self.client.get("/api/v1/configuration_items/", {"late_to_need": value}).json()["results"]
+            self.assertEqual(sorted(item["name"] for item in results), sorted(names), value)
+
+
+class KitReadinessTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        _, _, self.wbs_element = make_program()
+        items = {name: make_item(self.wbs_element, name) for name in ["HALF", "FULL", "EMPTY"]}
+        for parent, name, replenishment in [("HALF", "H1", ConfigurationItem.ON_HAND), ("HALF", "H2", ""), ("FULL", "F1", ConfigurationItem.ON_HAND)]:
+            make_item(self.wbs_element, name, replenishment=replenishment).parents.add(items[parent])
+
+    def test_annotations_match_properties(self):
+        annotated = {item.pk: item for item in ConfigurationItem.objects.with_kit_readiness()}
+        for item in ConfigurationItem.objects.all():
+            counts = annotated[item.pk]
+            self.assertEqual(
+                (counts.parent_count, counts.child_count, counts.on_hand_count, format_to_percent(counts.kit_ready_percentage / 100, 0)),
+                (item.total_parent_items, item.total_children_items, item.total_parts_in_inventory, item.calculate_kit_ready_percentage),
+                item.name,
+            )
+
+    def names(self, **params):
+        return [item["name"] for item in self.client.get("/api/v1/configuration_items/", params).json()["results"]]
+
+    def test_ordering_without_projection(self):
+        self.assertEqual(self.names(ordering="-kit_ready_percentage,name")[:3], ["FULL", "HALF", "EMPTY"])
+        self.assertEqual(self.names(ordering="-child_count,name")[:3], ["HALF", "FULL", "EMPTY"])
+
+    def test_filters(self):
+        self.assertEqual(self.names(kit_ready_min="50", ordering="name"), ["FULL", "HALF"])
+        self.assertEqual(self.names(kit_ready_min="1", kit_ready_max="99", ordering="name"), ["HALF"])
+
+
+####################################################################################################
+# Program dashboards (api.dashboard)
+class DashboardTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.program, _, self.wbs_element = make_program()
+        make_item(self.wbs_element, "MAT-1", req_date=datetime.date(2024, 1, 1), po_delivery=datetime.date(2024, 2, 1))
+
+    def get_dashboard(self):
+        return self.client.get(f"/api/v1/programs/{self.program.pk}/dashboard/").json()
+
+    def test_rollup(self):
+        dashboard = self.get_dashboard()
+        self.assertEqual((dashboard["items"], dashboard[ConfigurationItem.LTN]), (1, 1))
+        self.assertEqual(dashboard["group_wbs"][0]["wbs_elements"][0]["items"], 1)
+
+    def test_upload_in_another_process_invalidates_it(self):
+        self.assertEqual(self.get_dashboard()["items"], 1)
+
+        # bulk writes send no signal: the pipelines invalidate the dashboard themselves
+        ConfigurationItem.objects.bulk_create([ConfigurationItem(wbs_element=self.wbs_element, name="MAT-2", net_order="", replenishment="")])
+        self.assertEqual(self.get_dashboard()["items"], 1)
+
+        with override_settings(CACHES=OTHER_PROCESS):
+            dashboard.invalidate(self.program.pk)
+
+        self.assertEqual(self.get_dashboard()["items"], 2)
+
+    def test_saves_invalidate_it(self):
+        self.assertEqual(self.get_dashboard()["items"], 1)
+        make_item(self.wbs_element, "MAT-2")
+        self.assertEqual(self.get_dashboard()["items"], 2)
+
+    def test_edits_and_deletes_invalidate_it(self):
+        item = make_item(self.wbs_element, "MAT-2", replenishment=ConfigurationItem.ON_HAND)
+        parent = ConfigurationItem.objects.get(name="MAT-1")
+        self.assertEqual(self.get_dashboard()["children"], 0)
+
+        item.parents.add(parent)
+        self.assertEqual(self.get_dashboard()["children"], 1)
+
+        self.client.delete(f"/api/v1/configuration_items/{item.pk}/")
+        self.assertEqual((self.get_dashboard()["items"], self.get_dashboard()["children"]), (1, 0))
+
+    def test_other_programs_stay_cached(self):
+        other, _, wbs_element = make_program("Other", "OTH")
+        dashboard.rollup(other.pk)
+
+        make_item(self.wbs_element, "MAT-2")
+        with self.assertNumQueries(1):
+            dashboard.rollup(other.pk)
+
+        make_item(wbs_element, "MAT-3")
+        self.assertEqual(dashboard.rollup(other.pk)["items"], 1)
+
+
+####################################################################################################
+# Substitution graph (api.substitutes)
+class SubstitutionGraphTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        # graphs of earlier tests were built at versions that have since rolled back
+        substitutes._graph = None
+        self.program, _, _ = make_program()
+        make_materials("A", "B", "C", "D", "E")
+        make_altsub(self.program, "A", "B")
+        make_altsub(self.program, "B", "C")
+        make_altsub(self.program, "A", "D", plant="P200")
+
+    def test_substitutes(self):
+        graph = substitutes.graph()
+        self.assertEqual(graph.substitutes("A"), (("B", 1), ("D", 1), ("C", 2)))
+        self.assertEqual(graph.substitutes("A", plant="P100"), (("B", 1), ("C", 2)))
+        self.assertEqual(graph.substitutes("A", program=self.program.pk + 1), ())
+        self.assertEqual(graph.substitutes("C"), ())
+        self.assertEqual(graph.substitutes("unknown"), ())
+
+    def test_rebuilt_when_another_process_changes_the_alt_subs(self):
+        graph = substitutes.graph()
+        self.assertIs(substitutes.graph(), graph)
+
+        # an alt/sub upload run by `ingest_uploads`: bulk writes, and a bump in the database only
+        with override_settings(CACHES=OTHER_PROCESS):
+            AltSub.objects.bulk_create([AltSub(plant="P100", model=self.program, type_code="NA", primary_material_id="C", replacement_part_id="E", sub_code="1")])
+            versions.bump(AltSub)
+
+        self.assertIsNot(substitutes.graph(), graph)
+        self.assertEqual(substitutes.graph().substitutes("A", plant="P100"), (("B", 1), ("C", 2), ("E", 3)))
+
+    def test_endpoint(self):
+        response = self.client.get("/api/v1/alt_subs/substitutes/", {"material": "B"})
+        self.assertEqual(response.json(), {"material": "B", "substitutes": [{"material": "C", "depth": 1}]})
+
+
+####################################################################################################
+# Requirements netting (api.netting)
+def demand(*rows):
+    return pd.DataFrame(list(rows), columns=["material", "req_date", "req_qty"]).astype({"req_qty": "float64"})
+
+
+def supply(**on_hand):
+    return pd.Series(on_hand, name="on_hand", dtype="float64")
+
+
+def subs(*rows):
+    return pd.DataFrame(list(rows), columns=["primary", "replacement", "rank"]).astype({"rank": "int64"})
+
+
+JAN, FEB, MAR = datetime.date(2024, 1, 1), datetime.date(2024, 2, 1), datetime.date(2024, 3, 1)
+
+
+class NettingTests(SimpleTestCase):
+    def net(self, demand, supply, substitutes=subs()):
+        df = netting.net(demand, supply, substitutes)
+        return [tuple(row) for row in df.itertuples(index=False, name=None)]
+
+    def test_stock_goes_to_the_earliest_dates(self):
+        rows = self.net(demand(("X", FEB, 4), ("X", JAN, 3), ("X", JAN, 1), ("X", MAR, 2)), supply(X=6))
+        self.assertEqual(rows, [("X", JAN, 4, 4, 0, 0), ("X", FEB, 4, 2, 0, 2), ("X", MAR, 2, 0, 0, 2)])
+
+    def test_substitutes_are_tried_in_rank_order(self):
+        rows = self.net(demand(("P", JAN, 5)), supply(S1=1, S2=10), subs(("P", "S2", 1), ("P", "S1", 0)))
+        self.assertEqual(rows, [("P", JAN, 5, 0, 5, 0)])
+
+        rows = self.net(demand(("P", JAN, 5), ("S1", JAN, 1)), supply(S1=1, S2=3), subs(("P", "S1", 0), ("P", "S2", 1)))
+        self.assertEqual(rows, [("P", JAN, 5, 0, 3, 2), ("S1", JAN, 1, 1, 0, 0)])
+
+    def test_substitute_stock_goes_to_the_earliest_shortages(self):
+        rows = self.net(demand(("P1", FEB, 2), ("P2", JAN, 2)), supply(S=3), subs(("P1", "S", 0), ("P2", "S", 0)))
+        self.assertEqual(rows, [("P1", FEB, 2, 0, 1, 1), ("P2", JAN, 2, 0, 2, 0)])
+
+    def test_empty(self):
+        self.assertEqual(self.net(demand(), supply()), [])
+        self.assertEqual(self.net(demand(), supply(X=1), subs(("X", "Y", 0))), [])
+
+
+class ShortageTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.program, self.group_wbs, self.wbs_element = make_program()
+
+    def test_program_without_demand(self):
+        self.assertTrue(netting.shortages(self.program.pk).empty)
+        self.assertEqual(self.client.get(f"/api/v1/programs/{self.program.pk}/shortages/").json(), [])
+
+        out = io.StringIO()
+        call_command("net_requirements", self.program.pk, stdout=out)
+        self.assertEqual(out.getvalue().strip(), "No shortages")
+
+    def test_program(self):
+        make_materials("A", "B")
+        make_altsub(self.program, "A", "B")
+        make_item(self.wbs_element, "A", req_qty=5, req_date=JAN)
+        make_item(self.wbs_element, "ASSY", req_qty=1, req_date=JAN, configuration_type=ConfigurationItem.ConfigurationTypeChoices.MAKE)
+        ProgramInventory.objects.create(group_wbs=self.group_wbs, material_master_id="A", on_hand_inventory=1)
+        ProgramInventory.objects.create(group_wbs=self.group_wbs, material_master_id="B", on_hand_inventory=2)
+
+        shortages = self.client.get(f"/api/v1/programs/{self.program.pk}/shortages/").json()
+        self.assertEqual(shortages, [{"material": "A", "req_date": "2024-01-01", "required": 5.0, "from_stock": 1.0, "from_subs": 2.0, "shortage": 2.0}])
+
+
+####################################################################################################
+# Part search (api.search)
+class SearchTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        # saved one at a time, so the receivers of `search.connect` index them
+        make_materials("WID-1", "WID-2", "WID-3")
+
+    def results(self, **params):
+        response = self.client.get("/api/v1/material_masters/search/", params)
+        self.assertEqual(response.status_code, 200, response.content)
+        return [row["name"] for row in response.json()]
+
+    def test_limit_is_clamped(self):
+        self.assertEqual(self.results(q="WID"), ["WID-1", "WID-2", "WID-3"])
+        self.assertEqual(len(self.results(q="WID", limit=2)), 2)
+        for limit in [0, -1]:
+            self.assertEqual(len(self.results(q="WID", limit=limit)), 1)
+        self.assertEqual(self.client.get("/api/v1/material_masters/search/", {"q": "WID", "limit": "x"}).status_code, 400)
+
+    def test_saves_and_deletes_refresh_it(self):
+        material = MaterialMaster.objects.get(name="WID-2")
+        material.nomenclature = "Gasket"
+        material.save()
+        self.assertEqual(self.results(q="gasket"), ["WID-2"])
+        self.assertEqual([row["name"] for row in self.client.get("/api/v1/material_masters/", {"q": "gasket"}).json()["results"]], ["WID-2"])
+
+        material.delete()
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT count(*) FROM {search.TABLE}")
+            self.assertEqual(cursor.fetchone()[0], 2)
+
+    def test_limit_is_checked_on_the_list(self):
+        self.assertEqual(self.client.get("/api/v1/material_masters/", {"q": "WID", "limit": "x"}).status_code, 400)
+
+
+####################################################################################################
+# Upload endpoints (api.v1.resources.*_upload)
+ALT_SUB_COLUMNS = "Plnt,Model,Type Code,Primary Material,Replacement Part,Next Higher Assembly,Alternate or Substitute Code,Sub Code,WBS Element,RevLev,Reason For Change,Item Text Line 1,Created by,Created"
+
+
+def alt_sub_file(*pairs):
+    return csv_file("altsubs.csv", ALT_SUB_COLUMNS, *(f"P100,SEC,NA,{primary},{replacement},,S,1,,,,,,01/31/2024" for primary, replacement in pairs))
+
+
+BOM_COLUMNS = "Level,WBS Element,Material,Item Type,Material Description,Req Qty,Req Date,Net Order,Replenishment,PO Delivery"
+
+
+INVENTORY_COLUMNS = "Material,Plnt,SLoc,Matl Type,WBS Element,Batch,Lot Date Code,BUn,Unrestricted,In Quality Insp.,Restricted-Use,Blocked,SLED/BBD,Discard Date"
+
+
+def inventory_file(*lines):
+    return csv_file("inventory.csv", INVENTORY_COLUMNS, *lines)
+
+
+def bom_file(*lines):
+    return csv_file("bom.csv", BOM_COLUMNS, *(",".join(map(str, line)) for line in lines))
+
+
+class UploadTestCase(ApiTestCase):
+    UPLOADS = {
+        "material_master_uploads": MaterialMasterUpload,
+        "inventory_item_uploads": InventoryUpload,
+        "alt_sub_uploads": AltSubUpload,
+        "configuration_item_uploads": ConfigurationItemUpload,
+    }
+
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings = override_settings(MEDIA_ROOT=media_root, UPLOAD_WORKERS=0)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.sector, _, _ = make_program("Sector", "SEC")
+
+    def upload(self, endpoint, data_file, **params):
+        query = "&".join(f"{param}={value}" for param, value in params.items())
+        owner = "program" if endpoint == "configuration_item_uploads" else "sector"
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(f"/api/v1/{endpoint}/?{query}", {owner: self.sector.pk, "data_file": data_file})
+
+    def ingested(self, endpoint, data_file):
+        response = self.upload(endpoint, data_file)
+        self.assertEqual(response.status_code, 201, response.content)
+        upload = type(self).UPLOADS[endpoint].objects.get(pk=response.json()["id"])
+        self.assertEqual(upload.status, upload.StatusChoices.SUCCEEDED, upload.errors)
+        return upload
+
+
+class UploadParameterTests(UploadTestCase):
+    def test_dry_run(self):
+        for value in ["1", "true", "True", "yes"]:
+            response = self.upload("material_master_uploads", material_file("MAT-1", "MAT-2"), dry_run=value)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual((response.json()["added"], response.json()["rows_read"]), (2, 2))
+
+        for value in ["0", "false", "no"]:
+            response = self.upload("material_master_uploads", material_file("MAT-1"), dry_run=value)
+            self.assertEqual(response.status_code, 201)
+
+        self.assertEqual(self.upload("material_master_uploads", material_file("MAT-1"), dry_run="maybe").status_code, 400)
+
+    def test_page(self):
+        self.assertEqual(self.upload("material_master_uploads", material_file("MAT-1"), dry_run=1, page=2).json()["additions"], [])
+        for page in ["x", "0", "-1"]:
+            self.assertEqual(self.upload("material_master_uploads", material_file("MAT-1"), dry_run=1, page=page).status_code, 400)
+
+    def test_superseded(self):
+        self.upload("material_master_uploads", material_file("MAT-1"))
+        self.upload("material_master_uploads", material_file("MAT-1", "MAT-2"))
+
+        for endpoint in ["material_master_uploads", "inventory_item_uploads", "alt_sub_uploads", "configuration_item_uploads"]:
+            self.assertEqual(self.client.get(f"/api/v1/{endpoint}/", {"superseded": "abc"}).status_code, 400)
+
+        self.assertEqual(len(self.client.get("/api/v1/material_master_uploads/", {"superseded": "true"}).json()["results"]), 1)
+        self.assertEqual(len(self.client.get("/api/v1/material_master_uploads/", {"superseded": "false"}).json()["results"]), 1)
+
+
+class UploadColumnTests(UploadTestCase):
+    FILES = {
+        "material_master_uploads": ("materials.csv", "Material Description,Plnt", "Widget,P100"),
+        "inventory_item_uploads": ("inventory.csv", "Material,Plnt,SLoc", "MAT-1,P100,0001"),
+        "alt_sub_uploads": ("altsubs.csv", "Plnt,Model,Primary Material", "P100,SEC,MAT-1"),
+    }
+
+    def test_missing_columns_are_rejected_up_front(self):
+        for endpoint, lines in self.FILES.items():
+            for params in [{}, {"dry_run": 1}]:
+                response = self.upload(endpoint, csv_file(*lines), **params)
+                self.assertEqual(response.status_code, 400, (endpoint, params))
+                self.assertIn("Missing column(s):", response.json()["data_file"][0])
+
+        response = self.upload("material_master_uploads", csv_file("materials.csv", "Material Description,Plnt", "Widget,P100"))
+        self.assertEqual(response.json(), {"data_file": ["Missing column(s): Material, Matl Type, GR Processing Time, Planned Deliv. Time"]})
+
+        response = self.client.post("/api/v1/configuration_item_uploads/", {"program": self.sector.pk, "data_file": csv_file("bom.csv", "Material", "MAT-1")})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("Missing column(s): Level, WBS Element", response.json()["data_file"][0])
+        self.assertFalse(MaterialMasterUpload.objects.exists())
+
+    def test_ingest_reports_missing_columns(self):
+        upload = MaterialMasterUpload.objects.create(sector=self.sector, uploaded_by=self.user, data_file=csv_file("materials.csv", "Plnt", "P100"))
+        jobs.run(MaterialMasterUpload, upload.pk, material_master_upload.ingest)
+
+        upload.refresh_from_db()
+        self.assertEqual(upload.status, MaterialMasterUpload.StatusChoices.FAILED)
+        self.assertEqual(upload.errors, ["Missing column(s): Material, Matl Type, GR Processing Time, Planned Deliv. Time"])
+
+
+class UploadBlankCellTests(UploadTestCase):
+    def test_inventory(self):
+        make_materials("MAT-1", "MAT-2")
+        self.ingested("inventory_item_uploads", inventory_file("MAT-1,,,PRCH,Y-ABCDE-DF-0001,,,,5,0,0,0,01/31/2025,", "MAT-2,P100,0001,PRCH,,B1,,EA,1,,,,,"))
+
+        self.assertEqual(
+            sorted(InventoryItem.objects.values_list("material_master_id", "plant", "storage_location", "batch", "base_unit_of_measure", "on_hand_inventory")),
+            [("MAT-1", "", "", "", "", 5.0), ("MAT-2", "P100", "0001", "B1", "EA", 1.0)],
+        )
+
+    def test_alt_sub(self):
+        make_materials("A", "B", "C")
+        self.ingested("alt_sub_uploads", csv_file("altsubs.csv", "Plnt,Model,Primary Material,Replacement Part,Alternate or Substitute Code,Sub Code,Created", "P100,SEC,A,B,S,1,01/31/2024", ",SEC,A,C,,,"))
+
+        self.assertEqual(
+            sorted(AltSub.objects.values_list("replacement_part_id", "plant", "type_code", "alternate_or_substitute_code", "sub_code", "created_date")),
+            [("B", "P100", "NA", "S", "1", datetime.date(2024, 1, 31)), ("C", "", "NA", "", "", None)],
+        )
+
+    def test_material_master(self):
+        self.ingested("material_master_uploads", csv_file("materials.csv", "Material,Matl Type,GR Processing Time,Planned Deliv. Time,Base Unit of Measure", "MAT-1,PRCH,1,2,", "MAT-2,PRCH,,,EA"))
+
+        self.assertEqual(
+            sorted(MaterialMaster.objects.values_list("name", "plant", "base_unit_of_measure", "procurement_type", "goods_receipt_time")),
+            [("MAT-1", "", "", "", 1), ("MAT-2", "", "EA", "", None)],
+        )
+
+
+class DashboardUploadTests(UploadTestCase):
+    def test_other_programs_stay_cached(self):
+        other, _, wbs_element = make_program("Other", "OTH")
+        make_item(wbs_element, "MAT-1")
+        self.assertEqual(dashboard.rollup(other.pk)["items"], 1)
+
+        make_materials("A")
+        self.ingested("configuration_item_uploads", bom_file((1, "Y-ABCDE-DF-0001", "A", "PRCH", "Part", 1, "01/31/2024", "", "", "")))
+        self.assertEqual(dashboard.rollup(self.sector.pk)["items"], 1)
+
+        # only the version of its counter is read
+        with self.assertNumQueries(1):
+            self.assertEqual(dashboard.rollup(other.pk)["items"], 1)
+
+
+class ProgramInventoryTests(UploadTestCase):
+    def totals(self):
+        return {(row.group_wbs_id, row.material_master_id): row.on_hand_inventory for row in ProgramInventory.objects.all()}
+
+    def expected(self, group_wbs, material):
+        return InventoryItem.objects.filter(program_group_wbs=group_wbs, material_master_id=material).aggregate(Sum("on_hand_inventory"))["on_hand_inventory__sum"]
+
+    def test_rebuilds_the_group_wbs_of_the_upload(self):
+        make_materials("A", "B")
+        group_wbs = GroupWbs.objects.get(program=self.sector)
+        other = GroupWbs.objects.create(program=Program.objects.create(name="Other", model_code="OTH"), program_type=GroupWbs.ProgramTypeChoices.DELIVERABLE_FLIGHT, name="Y-FGHIJ-DF")
+        lines = ["A,P100,,PRCH,Y-ABCDE-DF-0001,B1,,EA,5,1,0,0,,", "A,P100,,PRCH,Y-ABCDE-DF-0002,B2,,EA,2,,,,,", "B,P100,,PRCH,Y-FGHIJ-DF-0001,,,EA,3,,,,,"]
+
+        self.ingested("inventory_item_uploads", inventory_file(*lines))
+        self.assertEqual(self.totals(), {(group_wbs.pk, "A"): 8.0, (other.pk, "B"): 3.0})
+        self.assertEqual(self.totals(), {key: self.expected(*key) for key in self.totals()})
+
+        # only the group WBS of the rows added or deleted are rebuilt
+        ProgramInventory.objects.filter(group_wbs=other).update(on_hand_inventory=99)
+        self.ingested("inventory_item_uploads", inventory_file(lines[0].replace(",5,", ",7,"), *lines[1:]))
+        self.assertEqual(self.totals(), {(group_wbs.pk, "A"): 10.0, (other.pk, "B"): 99})
+        self.assertEqual(self.totals()[group_wbs.pk, "A"], self.expected(group_wbs, "A"))
+
+        self.ingested("inventory_item_uploads", inventory_file(*lines[1:]))
+        self.assertEqual(self.totals(), {(group_wbs.pk, "A"): 2.0, (other.pk, "B"): 99})
+
+
+class MaterialMasterUpsertTests(UploadTestCase):
+    def test_changed_materials_are_updated(self):
+        first = self.ingested("material_master_uploads", material_file("MAT-1", "MAT-2"))
+        pks = dict(MaterialMaster.objects.values_list("name", "pk"))
+
+        changed = csv_file("materials.csv", MATERIAL_COLUMNS, "MAT-1,Gadget,P200,MAKE,EA,E,3,4,,,", "MAT-2,Widget MAT-2,P100,PRCH,EA,F,1,2,,,", "MAT-3,New,P100,PRCH,EA,F,,,,,")
+        upload = self.ingested("material_master_uploads", changed)
+
+        self.assertEqual((upload.rows_read, upload.rows_added), (3, 2))
+        self.assertEqual(dict(MaterialMaster.objects.filter(name__in=pks).values_list("name", "pk")), pks)
+        material = MaterialMaster.objects.get(name="MAT-1")
+        self.assertEqual((material.nomenclature, material.plant, material.material_type, material.procurement_type, material.goods_receipt_time), ("Gadget", "P200", MaterialMaster.MaterialMasterTypeChoices.MAKE, "E", 3))
+        self.assertEqual(material.upload, upload)
+        self.assertEqual(material.fingerprint, fingerprint(material.get_fingerprint_values()))
+        self.assertEqual(MaterialMaster.objects.get(name="MAT-2").upload, first)
+
+
+class UploadHistoryTests(UploadTestCase):
+    def setUp(self):
+        super().setUp()
+        make_materials("A", "B", "C", "D")
+
+    def altsubs(self):
+        return sorted(AltSub.objects.values_list("primary_material_id", "replacement_part_id"))
+
+    def test_previous_upload(self):
+        finished = self.ingested("alt_sub_uploads", alt_sub_file(("A", "B")))
+        legacy = AltSubUpload.objects.create(sector=self.sector, uploaded_by=self.user, status=AltSubUpload.StatusChoices.SUCCEEDED)
+        upload = AltSubUpload.objects.create(sector=self.sector, uploaded_by=self.user)
+
+        self.assertEqual(history.previous(upload, AltSubUpload.objects.all()), finished)
+        AltSubUpload.objects.filter(pk=finished.pk).update(status=AltSubUpload.StatusChoices.FAILED)
+        self.assertEqual(history.previous(upload, AltSubUpload.objects.all()), legacy)
+
+    def test_same_file_is_skipped(self):
+        first = self.ingested("alt_sub_uploads", alt_sub_file(("A", "B"), ("A", "C")))
+        second = self.ingested("alt_sub_uploads", alt_sub_file(("A", "B"), ("A", "C")))
+
+        self.assertEqual(list(second.stages), ["checksum"])
+        first.refresh_from_db()
+        self.assertEqual(first.superseded_by, second)
+
+    def test_same_file_is_applied_when_the_rows_changed(self):
+        self.ingested("alt_sub_uploads", alt_sub_file(("A", "B"), ("A", "C")))
+
+        altsub = AltSub.objects.get(replacement_part_id="C")
+        altsub.replacement_part_id = "D"
+        altsub.save()
+
+        upload = self.ingested("alt_sub_uploads", alt_sub_file(("A", "B"), ("A", "C")))
+        self.assertEqual((upload.rows_added, upload.rows_deleted), (1, 1))
+        self.assertEqual(self.altsubs(), [("A", "B"), ("A", "C")])
+
+    def test_rows_missing_from_the_manifest_are_deleted(self):
+        first = self.ingested("alt_sub_uploads", alt_sub_file(("A", "B")))
+
+        # e.g. written by a concurrent upload to the same sector
+        make_altsub(self.sector, "C", "D", upload=first)
+
+        self.ingested("alt_sub_uploads", alt_sub_file(("A", "B"), ("A", "C")))
+        self.assertEqual(self.altsubs(), [("A", "B"), ("A", "C")])
+
+    def test_bom_is_applied_when_the_items_changed(self):
+        lines = [(1, "Y-ABCDE-DF-0001", "A", "MAKE", "Assembly", 1, "01/31/2024", "", "", ""), (2, "Y-ABCDE-DF-0001", "B", "PRCH", "Part", 2, "01/15/2024", "", "", "")]
+        self.ingested("configuration_item_uploads", bom_file(*lines))
+        self.assertEqual(list(self.ingested("configuration_item_uploads", bom_file(*lines)).stages), ["checksum"])
+
+        item = ConfigurationItem.objects.get(name="B")
+        item.req_qty = 5
+        item.save()
+
+        upload = self.ingested("configuration_item_uploads", bom_file(*lines))
+        self.assertIn("load", upload.stages)
+        self.assertEqual(ConfigurationItem.objects.get(name="B").req_qty, 2)
+        self.assertEqual(list(ConfigurationItem.objects.get(name="B").parents.values_list("name", flat=True)), ["A"])
+
+
+class UploadJobTests(UploadTestCase):
+    def test_interrupted_jobs_are_failed(self):
+        statuses = MaterialMasterUpload.StatusChoices
+        queued, running, done, active = (MaterialMasterUpload.objects.create(sector=self.sector, uploaded_by=self.user, status=status) for status in [statuses.QUEUED, statuses.RUNNING, statuses.SUCCEEDED, statuses.RUNNING])
+        bom = ConfigurationItemUpload.objects.create(program=self.sector, status=ConfigurationItemUpload.StatusChoices.RUNNING)
+        stale = timezone.now() - datetime.timedelta(seconds=settings.UPLOAD_STALE_AFTER + 1)
+        for model, uploads in [(MaterialMasterUpload, [queued, running, done]), (ConfigurationItemUpload, [bom])]:
+            model.objects.filter(pk__in=[upload.pk for upload in uploads]).update(heartbeat=stale)
+
+        # `active` is still being processed, e.g. by another instance
+        active.update_job(rows_read=1)
+        stdout = io.StringIO()
+        call_command("recover_uploads", stdout=stdout)
+        self.assertEqual(stdout.getvalue(), "3 interrupted uploads marked failed\n")
+
+        for upload, status in [(queued, statuses.FAILED), (running, statuses.FAILED), (done, statuses.SUCCEEDED), (active, statuses.RUNNING), (bom, statuses.FAILED)]:
+            upload.refresh_from_db()
+            self.assertEqual(upload.status, status)
+        self.assertEqual(queued.errors, [jobs.INTERRUPTED])
+        self.assertIsNotNone(queued.finished)
+        self.assertIsNone(done.errors)
+
+    def test_stale_after(self):
+        upload = MaterialMasterUpload.objects.create(sector=self.sector, uploaded_by=self.user, status=MaterialMasterUpload.StatusChoices.RUNNING)
+        self.assertEqual(jobs.recover(), 0)
+        self.assertEqual(jobs.recover(stale_after=0), 1)
+        upload.refresh_from_db()
+        self.assertEqual(upload.status, MaterialMasterUpload.StatusChoices.FAILED)
+
+    def test_one_worker_on_sqlite(self):
+        with override_settings(UPLOAD_WORKERS=4):
+            self.assertEqual(jobs.workers(), 1)
+        self.assertEqual(jobs.workers(), 0)
+
+    def test_stage_records_queries_and_rows(self):
+        upload = MaterialMasterUpload.objects.create(sector=self.sector, uploaded_by=self.user)
+        with jobs.stage(upload, "read"):
+            list(MaterialMaster.objects.all())
+            list(AltSub.objects.all())
+            upload.update_job(rows_read=5)
+
+        upload.refresh_from_db()
+        self.assertEqual({field: value for field, value in upload.stages["read"].items() if field != "seconds"}, {"queries": 3, "rows_read": 5, "rows_added": 0, "rows_deleted": 0})
+        self.assertGreaterEqual(upload.stages["read"]["seconds"], 0)
+
+    def test_stages_summary(self):
+        make_materials("A", "B", "C")
+        first = self.ingested("alt_sub_uploads", alt_sub_file(("A", "B")))
+        second = self.ingested("alt_sub_uploads", alt_sub_file(("A", "B"), ("A", "C")))
+        stages = [upload.stages for upload in AltSubUpload.objects.filter(pk__in=[first.pk, second.pk])]
+
+        summary = self.client.get("/api/v1/alt_sub_uploads/stages/").json()
+        self.assertEqual(set(summary), {"checksum", "stage", "delete", "add", "search"})
+        for name, totals in summary.items():
+            runs = [upload_stages[name] for upload_stages in stages if name in upload_stages]
+            self.assertEqual(totals["uploads"], len(runs), name)
+            self.assertEqual(totals["max_queries"], max(run["queries"] for run in runs), name)
+            self.assertEqual(totals["mean_queries"], round(sum(run["queries"] for run in runs) / len(runs), 1), name)
+            self.assertEqual(totals["total_seconds"], round(sum(run["seconds"] for run in runs), 3), name)
+        self.assertEqual((summary["stage"]["rows_read"], summary["add"]["rows_added"]), (3, 2))
+        self.assertGreater(summary["add"]["max_queries"], 0)
+
+        # the request's filters pick the uploads summarised
+        current = self.client.get("/api/v1/alt_sub_uploads/stages/", {"superseded": "false"}).json()
+        self.assertEqual((current["add"]["uploads"], current["add"]["rows_added"]), (1, 1))
+
+    def test_final_counts_are_saved(self):
+        upload = self.ingested("material_master_uploads", material_file("MAT-1", "MAT-2"))
+        upload.refresh_from_db()
+        self.assertEqual((upload.rows_read, upload.rows_added), (2, 2))
+        self.assertEqual(list(upload.stages), ["checksum", "stage", "upsert", "search"])
+
+
+class BatchIngestTests(UploadTestCase):
+    def test_ingest_uploads(self):
+        folder = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, folder, ignore_errors=True)
+        files = {
+            "alt_sub": alt_sub_file(("A", "B")),
+            "inventory_item": inventory_file("A,P100,,PRCH,Y-ABCDE-DF-0001,B1,,EA,5,1,,,,", "B,P100,,PRCH,,,,EA,2,,,,,"),
+            "material_master": material_file("A", "B"),
+        }
+        for kind, data_file in files.items():
+            (folder / f"{kind}.csv").write_bytes(data_file.read())
+
+        # given out of order: the materials are still applied first. The
+        # workers cannot see the in-memory test database, so each file is
+        # parsed again by its `ingest` (see `test_parsed_files`)
+        stdout = io.StringIO()
+        with self.assertLogs("api.uploads.batch", "WARNING") as logs:
+            call_command("ingest_uploads", *(f"{kind}:{self.sector.pk}:{folder / kind}.csv" for kind in files), user=self.user.username, processes=2, stdout=stdout, stderr=io.StringIO())
+        self.assertEqual(len(logs.output), 3)
+
+        self.assertEqual(sorted(MaterialMaster.objects.values_list("name", flat=True)), ["A", "B"])
+        self.assertEqual(sorted(InventoryItem.objects.values_list("material_master_id", "on_hand_inventory")), [("A", 6.0), ("B", 2.0)])
+        self.assertEqual(list(AltSub.objects.values_list("primary_material_id", "replacement_part_id")), [("A", "B")])
+
+        for model in [MaterialMasterUpload, InventoryUpload, AltSubUpload]:
+            upload = model.objects.get()
+            self.assertEqual((upload.status, upload.uploaded_by), (model.StatusChoices.SUCCEEDED, self.user), upload.errors)
+        self.assertEqual([line.split()[0] for line in stdout.getvalue().splitlines()], ["MaterialMasterUpload", "InventoryUpload", "AltSubUpload"])
+
+    def test_parsed_files(self):
+        upload = MaterialMasterUpload.objects.create(sector=self.sector, uploaded_by=self.user, data_file=material_file("A", "B"))
+        self.assertIsNone(batch.parse_upload(MaterialMasterUpload, upload.pk, material_master_upload.parse))
+        self.assertTrue(Snapshot(upload).exists(material_master_upload.COLUMNS.keys()))
+
+        jobs.run(MaterialMasterUpload, upload.pk, material_master_upload.ingest)
+        upload.refresh_from_db()
+        self.assertEqual((upload.status, upload.rows_added), (MaterialMasterUpload.StatusChoices.SUCCEEDED, 2))
+
+        self.assertEqual(batch.parse_upload(MaterialMasterUpload, 0, material_master_upload.parse), "DoesNotExist: MaterialMasterUpload matching query does not exist.")
+
+    def test_unknown_sector(self):
+        with self.assertRaisesMessage(CommandError, "Unknown sector 0"):
+            call_command("ingest_uploads", "alt_sub:0:altsubs.csv", user=self.user.username)
+
+
+####################################################################################################
+# Upload building blocks (api.uploads)
+class StagingTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.program, _, _ = make_program()
+        make_materials("A", "B", "C", "D")
+        self.kept = make_altsub(self.program, "A", "B")
+        self.dropped = make_altsub(self.program, "A", "C")
+        self.existing = AltSub.objects.all()
+
+    def stage(self, known=None):
+        staging = Staging(known=known)
+        self.addCleanup(staging.clear)
+        row = self.kept.get_fingerprint_values()
+        staging.stage([row, ["new"]])
+        staging.stage([row, ["new"], ["newer"]])
+        return staging
+
+    def check(self, staging):
+        self.assertEqual(staging.rows, 5)
+        self.assertEqual(list(staging.deletions(self.existing)), [self.dropped])
+        self.assertEqual([[row.data for row in rows] for rows in staging.additions(self.existing, batch_size=1)], [[["new"]], [["newer"]]])
+        self.assertEqual(len(staging.fingerprints), 3)
+
+    def test_diff(self):
+        staging = self.stage()
+        self.check(staging)
+        self.assertEqual(staging.staged_rows.count(), 3)
+
+    def test_diff_against_known_fingerprints(self):
+        known = history.fingerprints(self.existing)
+        staging = self.stage(known)
+        self.check(staging)
+        # only the rows the database lacks are written
+        self.assertEqual(staging.staged_rows.count(), 2)
+
+        staging.clear()
+        self.assertFalse(StagedRow.objects.exists())
+
+    def test_unknown_fingerprints(self):
+        AltSub.objects.filter(pk=self.kept.pk).update(fingerprint="")
+        self.assertIsNone(history.fingerprints(self.existing))
+
+    def test_contains(self):
+        values = np.array([b"b", b"d"], dtype="S32")
+        self.assertEqual(contains(values, np.array([b"a", b"b", b"c", b"d", b"e"], dtype="S32")).tolist(), [False, True, False, True, False])
+        self.assertEqual(contains(values[:0], np.array([b"a"], dtype="S32")).tolist(), [False])
+
+
+class ResolverTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.materials = {material.name: material.pk for material in make_materials("A", "B", "C")}
+
+    def test_resolve(self):
+        resolver = Resolver(MaterialMaster, "name", max_size=2)
+
+        with self.assertNumQueries(1):
+            self.assertEqual(resolver.resolve(["A", "B", "X", None]), {"A": self.materials["A"], "B": self.materials["B"]})
+
+        # cached and unresolved keys are not queried again
+        with self.assertNumQueries(0):
+            self.assertEqual(resolver.resolve(["A", "X"]), {"A": self.materials["A"]})
+
+        # "C" evicts the least recently used key, "B"
+        resolver.resolve(["C"])
+        self.assertEqual(list(resolver.cache), ["A", "C"])
+        with self.assertNumQueries(1):
+            resolver.resolve(["B"])
+
+    def test_queryset_scopes_the_keys(self):
+        resolver = Resolver(MaterialMaster, "name", queryset=MaterialMaster.objects.exclude(name="A"))
+        self.assertEqual(resolver.resolve(["A", "B"]), {"B": self.materials["B"]})
+        self.assertEqual(resolver.unresolved, {"A"})
+
+    def test_validate(self):
+        resolver = Resolver(MaterialMaster, "name")
+        resolver.resolve(["A", "Y", "X"])
+        validate(Resolver(Program, "model_code"))
+
+        with self.assertRaises(ValidationError) as raised:
+            validate(resolver, sample_size=1)
+        self.assertEqual(raised.exception.detail, {"MaterialMaster.name": ["2 unknown value(s): X"]})
+
+    def test_param_batches(self):
+        limit = connection.features.max_query_params
+        values = list(range(limit * 2 + 1))
+        self.assertEqual([len(batch) for batch in param_batches(values)], [limit, limit, 1])
+        self.assertEqual(list(param_batches([])), [])
+
+
+class BomBatchTests(UploadTestCase):
+    LEVELS = [("A", 1), ("B", 2), ("C", 3), ("D", 2), ("E", 3), ("F", 1), ("G", 2)]
+
+    def test_parent_keys_across_batches(self):
+        ancestors = {}
+        parents = []
+        for start in range(0, len(self.LEVELS), 2):
+            names, levels = zip(*self.LEVELS[start : start + 2])
+            parents += configuration_item_upload.parent_keys(np.array(levels), list(names), ancestors)
+
+        self.assertEqual(parents, [None, "A", "B", "A", "D", None, "F"])
+        self.assertEqual(ancestors, {1: "F", 2: "G", 3: "E"})
+
+    def test_edges_across_batches(self):
+        make_materials(*(name for name, _ in self.LEVELS))
+        lines = [(level, "Y-ABCDE-DF-0001", name, "PRCH", "Part", 1, "01/31/2024", "", "", "") for name, level in self.LEVELS]
+
+        with override_settings(UPLOAD_CHUNK_SIZE=2):
+            self.ingested("configuration_item_uploads", bom_file(*lines))
+
+        edges = ConfigurationItem.parents.through.objects.values_list("from_configurationitem__name", "to_configurationitem__name")
+        self.assertEqual(sorted(edges), [("B", "A"), ("C", "B"), ("D", "A"), ("E", "D"), ("G", "F")])
+        closure = ConfigurationItemClosure.objects.filter(descendant__name="E").values_list("ancestor__name", "depth")
+        self.assertEqual(sorted(closure), [("A", 2), ("D", 1)])
+
+
+class ClosureTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        _, _, wbs_element = make_program()
+        self.items = {name: make_item(wbs_element, name) for name in "ABCDE"}
+
+    def link(self, child, *parents):
+        self.items[child].parents.add(*(self.items[parent] for parent in parents))
+
+    def closure(self):
+        return sorted(ConfigurationItemClosure.objects.values_list("descendant__name", "ancestor__name", "depth"))
+
+    def test_rebuild(self):
+        # A > B > C > D, with a shortcut A > D
+        self.link("B", "A")
+        self.link("C", "B")
+        self.link("D", "C", "A")
+
+        self.assertEqual(closure.rebuild(ConfigurationItem.objects.all()), 6)
+        self.assertEqual(self.closure(), [("B", "A", 1), ("C", "A", 2), ("C", "B", 1), ("D", "A", 1), ("D", "B", 2), ("D", "C", 1)])
+
+    def test_rebuild_moves_the_items_below(self):
+        self.link("B", "A")
+        self.link("C", "B")
+        closure.rebuild(ConfigurationItem.objects.all())
+
+        # B moves under E: only B is rebuilt, C follows it
+        self.items["B"].parents.set([self.items["E"]])
+        closure.rebuild(ConfigurationItem.objects.filter(name="B"))
+        self.assertEqual(self.closure(), [("B", "E", 1), ("C", "B", 1), ("C", "E", 2)])
+
+    def test_cycles_stop(self):
+        self.link("A", "B")
+        self.link("B", "A")
+
+        closure.rebuild(ConfigurationItem.objects.all())
+        self.assertEqual(self.closure(), [("A", "A", 2), ("A", "B", 1), ("B", "A", 1), ("B", "B", 2)])
+
+
+class ParentTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        _, _, wbs_element = make_program()
+        # the parent of ITEM is whichever of its parents replenishes its net order
+        self.item = make_item(wbs_element, "ITEM", net_order="ASSY")
+        self.assembly = make_item(wbs_element, "ASSEMBLY", replenishment="ASSY")
+        self.kit = make_item(wbs_element, "KIT", replenishment="KIT")
+
+    def parent(self):
+        return ConfigurationItem.objects.get(pk=self.item.pk).parent
+
+    def test_resolve_parents(self):
+        # written like the BOM upload does, without signals
+        Edges = ConfigurationItem.parents.through
+        Edges.objects.bulk_create([Edges(from_configurationitem=self.item, to_configurationitem=parent) for parent in (self.kit, self.assembly)])
+        self.assertIsNone(self.parent())
+
+        with self.assertNumQueries(1):
+            self.assertEqual(ConfigurationItem.objects.resolve_parents(), 3)
+        self.assertEqual(self.parent(), self.assembly)
+
+        self.assembly.replenishment = "OTHER"
+        self.assembly.save()
+        ConfigurationItem.objects.filter(pk=self.item.pk).resolve_parents()
+        self.assertIsNone(self.parent())
+
+    def test_edge_edits(self):
+        self.item.parents.add(self.kit)
+        self.assertIsNone(self.parent())
+
+        self.item.parents.add(self.assembly)
+        self.assertEqual(self.parent(), self.assembly)
+
+        self.assembly.children.remove(self.item)
+        self.assertIsNone(self.parent())
+
+        self.assembly.children.add(self.item)
+        self.assertEqual(self.parent(), self.assembly)
+
+        self.assembly.children.clear()
+        self.assertIsNone(self.parent())
+
+        self.item.parents.set([self.assembly])
+        self.item.parents.clear()
+        self.assertIsNone(self.parent())
+
+
+class SnapshotTests(UploadTestCase):
+    COLUMNS = ["name", "plant", "count", "quantity", "day", "empty"]
+
+    def frames(self):
+        yield pd.DataFrame(
+            {
+                "name": ["A", None, "A"],
+                "plant": ["P1", "P2", "P2"],
+                "count": pd.array([1, None, 3], dtype="Int64"),
+                "quantity": [1.5, None, 2.0],
+                "day": [datetime.date(2024, 1, 31), None, datetime.date(2024, 2, 1)],
+                "empty": [None, None, None],
+            }
+        )
+        yield pd.DataFrame({"name": ["B"], "plant": ["P1"], "count": pd.array([2], dtype="Int64"), "quantity": [0.0], "day": [None], "empty": [None]})
+
+    def test_round_trip(self):
+        upload = MaterialMasterUpload.objects.create(sector=self.sector, uploaded_by=self.user, data_file=material_file("MAT-1"))
+
+        with Snapshot(upload) as snapshot:
+            recorded = [as_tuples(df, self.COLUMNS) for df in snapshot.record(self.frames(), self.COLUMNS)]
+        self.assertEqual(recorded[0][1], (None, "P2", None, None, None, None))
+
+        snapshot = Snapshot(upload)
+        self.assertTrue(snapshot.exists(self.COLUMNS))
+        self.assertFalse(snapshot.exists([*self.COLUMNS, "new"]))
+
+        frames = list(snapshot.frames(self.COLUMNS))
+        self.assertEqual([as_tuples(df, self.COLUMNS) for df in frames], recorded)
+        # strings are categoricals over the mapped codes
+        self.assertEqual(frames[0]["name"].dtype, "category")
+        self.assertEqual(list(frames[0]["name"].cat.categories), ["A"])
+
+        self.assertEqual([list(df.columns) for df in snapshot.frames(["plant", "name"])], [["plant", "name"], ["plant", "name"]])
+
+
+####################################################################################################
+# BOM tree transport (api.v1.resources.wbs_element)
+class BomTreeTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        _, _, self.wbs_element = make_program()
+        _, _, other = make_program("Other", "OTH")
+        items = {name: make_item(self.wbs_element, name, req_qty=1) for name in "ABCD"}
+        outside = make_item(other, "X")
+
+        # A > B > D and A > C > D, with C also under an item of another WBS element
+        items["B"].parents.add(items["A"])
+        items["C"].parents.add(items["A"], outside)
+        items["D"].parents.add(items["B"], items["C"])
+
+    def tree(self, chunk_size):
+        return json.loads("".join(wbs_element.bom_tree(self.wbs_element, chunk_size=chunk_size)))
+
+    def test_chunks(self):
+        tree = self.tree(chunk_size=1)
+
+        self.assertEqual([chunk["name"] for chunk in tree["chunks"]], [["A"], ["B"], ["C"], ["D"]])
+        self.assertEqual(tree["chunks"][0]["req_qty"], [1.0])
+        self.assertEqual((tree["size"], tree["child_offsets"], tree["children"], tree["roots"]), (4, [0, 2, 3, 4, 4], [1, 2, 3, 3], [0]))
+
+        merged = self.tree(chunk_size=10_000)
+        self.assertEqual(len(merged["chunks"]), 1)
+        self.assertEqual(merged["chunks"][0]["name"], ["A", "B", "C", "D"])
+        self.assertEqual({key: value for key, value in merged.items() if key != "chunks"}, {key: value for key, value in tree.items() if key != "chunks"})
+
+    def test_endpoint(self):
+        response = self.client.get(f"/api/v1/wbs_elements/{self.wbs_element.pk}/", {"projection": "bom_tree"})
+        self.assertEqual(json.loads(b"".join(response.streaming_content))["size"], 4)
+
+    def test_empty(self):
+        ConfigurationItem.objects.filter(wbs_element=self.wbs_element).delete()
+        self.assertEqual(self.tree(chunk_size=2), {"id": self.wbs_element.pk, "name": self.wbs_element.name, "chunks": [], "size": 0, "child_offsets": [0], "children": [], "roots": []})
@@ -0,0 +1,81 @@
+from concurrent.futures import ProcessPoolExecutor
+from django.conf import settings
+import django
+import logging
+import multiprocessing
+import os
+
+logger = logging.getLogger(__name__)
+
+'''
+Monthly data lands as one file per kind and sector, all at once. A batch
+ingest parses every file in a pool of `settings.UPLOAD_PROCESSES` worker
+processes, each one recording the file's snapshot (see
+`api.uploads.snapshots`), while this process applies the files to the
+database one at a time, in the order given, as soon as each is parsed:
+
+    batch.ingest([
+        (material_upload, material_master_upload.parse, material_master_upload.ingest),
+        (inventory_upload, inventory_item_upload.parse, inventory_item_upload.ingest),
+        ...
+    ])
+
+Only parsing, the CPU-bound part, runs in parallel. Writes stay serial,
+so uploads for the same sector land in order (materials before the
+inventory that references them) and the database sees a single writer.
+
+A file that fails to parse leaves no snapshot behind, so its `ingest`
+parses it again and records the error on the upload as usual.
+
+Workers start from the settings module, so the database and media
+settings of this process (e.g. a test database) are passed on to them.
+'''
+
+# Settings the workers take from this process
+WORKER_SETTINGS = ["DATABASES", "MEDIA_ROOT"]
+
+
+def setup_worker(overrides):
+    for name, value in overrides.items():
+        setattr(settings, name, value)
+    django.setup()
+
+
+def parse_upload(model, pk, parse):
+    try:
+        parse(model.objects.get(pk=pk))
+
+    # exceptions don't always survive pickling; the error is reported by `ingest`
+    except Exception as e:
+        return f"{type(e).__name__}: {e}"
+
+
+def ingest(uploads, processes=None):
+    '''
+    Parses the `(upload, parse, ingest)` jobs in worker processes and
+    runs each `ingest` here, in order, once its file is parsed. Uploads
+    must already be committed.
+    '''
+
+    # not imported at the top: workers import this module to set Django up
+    from . import jobs
+
+    if not uploads:
+        return
+
+    processes = processes or settings.UPLOAD_PROCESSES or os.cpu_count()
+
+    # spawned workers set Django up from scratch instead of inheriting open connections
+    context = multiprocessing.get_context("spawn")
+
+    overrides = {name: getattr(settings, name) for name in WORKER_SETTINGS}
+
+    with ProcessPoolExecutor(min(processes, len(uploads)), mp_context=context, initializer=setup_worker, initargs=(overrides,)) as executor:
+        futures = [executor.submit(parse_upload, type(upload), upload.pk, parse) for upload, parse, _ in uploads]
+
+        for (upload, _, ingest), future in zip(uploads, futures):
+            error = future.result()
+            if error:
+                logger.warning(f"{type(upload).__name__} {upload.pk} failed to parse: {error}")
+
+            jobs.run(type(upload), upload.pk, ingest)
@@ -0,0 +1,100 @@
+from api.uploads.diff import bulk_batch_size
+from api.uploads.resolver import param_batches
+from core.models import ConfigurationItem, ConfigurationItemClosure
+import pandas as pd
+
+'''
+`ConfigurationItemClosure` holds every ancestor/descendant pair of the
+BOM, so "all assemblies above this part" and "every part beneath this
+item" are single indexed queries instead of one query per level.
+
+A BOM upload only changes the parent edges of the items in its file, so
+it only rebuilds the closure rows of those items and of everything
+below them, old and new:
+
+    with transaction.atomic():
+        ...                                   # edges written
+        closure.rebuild(ConfigurationItem.objects.filter(upload=upload))
+
+Ancestors are found level by level with one query per level over the
+`parents` through table, keeping the shortest depth of each pair, which
+also stops at cycles.
+'''
+
+Edges = ConfigurationItem.parents.through
+CHILD, PARENT = "from_configurationitem_id", "to_configurationitem_id"
+
+
+def edges(column, ids):
+    '''
+    `(child, parent)` pairs of the edges whose `column` is in `ids`.
+    '''
+
+    for batch in param_batches(ids):
+        yield from Edges.objects.filter(**{f"{column}__in": batch}).values_list(CHILD, PARENT)
+
+
+def descendants(ids):
+    '''
+    `ids` and every item below them, in the closure table (before the
+    rebuild) or through the current edges.
+    '''
+
+    found = set(ids)
+    for batch in param_batches(ids):
+        found.update(ConfigurationItemClosure.objects.filter(ancestor_id__in=batch).values_list("descendant_id", flat=True))
+
+    frontier = set(ids)
+    while frontier:
+        frontier = {child for child, _ in edges(PARENT, frontier)} - found
+        found |= frontier
+
+    return found
+
+
+def ancestors(ids):
+    '''
+    DataFrame of `descendant`, `ancestor` and `depth` for every ancestor
+    of `ids`, at the depth of its shortest path.
+    '''
+
+    found = pd.DataFrame({"descendant": pd.Series(dtype="int64"), "ancestor": pd.Series(dtype="int64"), "depth": pd.Series(dtype="int64")})
+    paths = pd.DataFrame({"descendant": list(ids), "node": list(ids)})
+    depth = 0
+
+    while len(paths):
+        depth += 1
+        parents = pd.DataFrame(list(edges(CHILD, paths["node"].unique().tolist())), columns=["node", "ancestor"], dtype="int64")
+        step = paths.merge(parents, on="node")[["descendant", "ancestor"]].drop_duplicates()
+
+        # pairs already reached by a shorter path are done
+        step = step.merge(found[["descendant", "ancestor"]], how="left", indicator=True)
+        step = step[step["_merge"] == "left_only"].drop(columns="_merge")
+
+        found = pd.concat([found, step.assign(depth=depth)], ignore_index=True)
+        paths = step.rename(columns={"ancestor": "node"})
+
+    return found
+
+
+def rebuild(items):
+    '''
+    Replaces the closure rows of the `items` queryset and of every item
+    below them. Returns the number of rows written.
+    '''
+
+    ids = descendants(items.values_list("pk", flat=True))
+
+    for batch in param_batches(ids):
+        ConfigurationItemClosure.objects.filter(descendant_id__in=batch).delete()
+
+    rows = ancestors(ids)
+    batch_size = bulk_batch_size(["ancestor", "descendant", "depth"])
+
+    for start in range(0, len(rows), batch_size):
+        ConfigurationItemClosure.objects.bulk_create(
+            ConfigurationItemClosure(ancestor_id=ancestor, descendant_id=descendant, depth=depth)
+            for descendant, ancestor, depth in rows.iloc[start : start + batch_size].values.tolist()
+        )
+
+    return len(rows)
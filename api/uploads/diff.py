@@ -0,0 +1,176 @@
+import uuid
+from contextlib import contextmanager
+from django.conf import settings
+from django.db import connection, transaction
+from core.models import StagedRow, fingerprint
+import numpy as np
+
+'''
+Uploads are reconciled with the database in SQL rather than in Python.
+Every normalised row of the file is staged with its content fingerprint,
+and the rows to add and delete come from set-based queries between the
+staging table and the fingerprints already stored on the target model:
+
+    staging = Staging()
+    staging.stage(rows)                    # once per batch of the file
+    staging.deletions(existing).delete()   # one DELETE
+    for rows in staging.additions(existing):
+        ...                                # bulk_create, one batch at a time
+    staging.clear()
+
+Duplicate rows in the file collapse onto one staged row through the
+`unique_staged_rows` constraint.
+
+When the fingerprints of the rows already in the database are `known`
+(read with `api.uploads.history.fingerprints`), only
+the rows missing from it are staged, along with the known fingerprints
+missing from the file, so a nearly identical file stages a handful of
+rows instead of all of them.
+
+A dry run stages the file the same way inside `dry_run()`, reads the
+counts and a page of rows with `Staging.preview`, and rolls everything
+back.
+'''
+
+
+@contextmanager
+def dry_run():
+    '''
+    Rolls back everything written inside the block, staged rows included.
+    '''
+
+    with transaction.atomic():
+        yield
+        transaction.set_rollback(True)
+
+
+def bulk_batch_size(fields):
+    '''
+    Rows per bulk INSERT/UPDATE statement for the current backend: as many
+    as SQLite's bound-parameter limit allows, otherwise
+    `settings.UPLOAD_BULK_BATCH_SIZE`.
+    '''
+
+    max_query_params = connection.features.max_query_params
+    if max_query_params:
+        return max(max_query_params // len(fields), 1)
+    return settings.UPLOAD_BULK_BATCH_SIZE
+
+
+class Staging:
+    def __init__(self, known=None):
+        self.batch = uuid.uuid4()
+        self.batch_size = bulk_batch_size(["batch", "row", "fingerprint", "data"])
+        self.rows = 0
+        self.known = known
+        self.stale_batch = None
+        self.seen = []
+
+    def stage(self, rows):
+        staged_rows = [
+            StagedRow(batch=self.batch, row=self.rows + i, fingerprint=fingerprint(row), data=row)
+            for i, row in enumerate(rows)
+        ]
+        fingerprints = np.fromiter((staged.fingerprint for staged in staged_rows), dtype="S32", count=len(staged_rows))
+        # only the distinct fingerprints of each batch are kept, as a compact array
+        self.seen.append(np.unique(fingerprints))
+        self.rows += len(staged_rows)
+
+        if self.known is not None:
+            staged_rows = [staged for staged, known in zip(staged_rows, contains(self.known, fingerprints)) if not known]
+
+        StagedRow.objects.bulk_create(staged_rows, batch_size=self.batch_size, ignore_conflicts=True)
+
+    @property
+    def fingerprints(self):
+        '''
+        Sorted unique fingerprints of every row staged so far, whether or
+        not it was written to the staging table: the file's manifest.
+        '''
+
+        return np.unique(np.concatenate(self.seen)) if self.seen else np.array([], dtype="S32")
+
+    @property
+    def staged_rows(self):
+        return StagedRow.objects.filter(batch=self.batch)
+
+    def deletions(self, existing):
+        '''
+        Rows of the `existing` queryset whose fingerprint is not in the file.
+        '''
+
+        if self.known is None:
+            return existing.exclude(fingerprint__in=self.staged_rows.values("fingerprint"))
+
+        if self.stale_batch is None:
+            self.stale_batch = uuid.uuid4()
+            stale = np.setdiff1d(self.known, self.fingerprints, assume_unique=True)
+            StagedRow.objects.bulk_create(
+                [StagedRow(batch=self.stale_batch, row=i, fingerprint=value.decode(), data=[]) for i, value in enumerate(stale)],
+                batch_size=self.batch_size,
+            )
+
+        return existing.filter(fingerprint__in=StagedRow.objects.filter(batch=self.stale_batch).values("fingerprint"))
+
+    def pending(self, existing):
+        '''
+        Staged rows whose fingerprint is not in the `existing` queryset.
+        '''
+
+        return self.staged_rows.exclude(fingerprint__in=existing.values("fingerprint")).order_by("row")
+
+    def additions(self, existing, batch_size):
+        '''
+        Yields lists of at most `batch_size` staged rows whose fingerprint
+        is not in the `existing` queryset, in file order. Each batch is a
+        fresh keyset query, so rows inserted from an earlier batch are
+        never returned twice.
+        '''
+
+        pending = self.pending(existing)
+        last_row = -1
+
+        while True:
+            staged_rows = list(pending.filter(row__gt=last_row)[:batch_size])
+            if not staged_rows:
+                return
+
+            yield staged_rows
+            last_row = staged_rows[-1].row
+
+    def preview(self, existing, columns, fields, page=1, page_size=None, deletes=True):
+        '''
+        Counts of the rows to add and delete, with page `page` of each.
+        Staged rows are keyed by the file's `columns`, and existing rows
+        (read with `fields`, in the same order) are keyed the same way.
+        '''
+
+        page_size = page_size or settings.REST_FRAMEWORK["PAGE_SIZE"]
+        start, end = (page - 1) * page_size, page * page_size
+
+        additions = self.pending(existing)
+        deletions = self.deletions(existing).order_by("pk") if deletes else existing.none()
+
+        return {
+            "rows_read": self.rows,
+            "added": additions.count(),
+            "deleted": deletions.count(),
+            "page": page,
+            "additions": [dict(zip(columns, staged.data)) for staged in additions[start:end]],
+            "deletions": [dict(zip(columns, row)) for row in deletions.values_list(*fields)[start:end]],
+        }
+
+    def clear(self):
+        StagedRow.objects.filter(batch__in=[self.batch, self.stale_batch]).delete()
+
+
+def contains(values, keys):
+    '''
+    Boolean mask of the `keys` found in the sorted array `values`.
+    '''
+
+    if not len(values):
+        return np.zeros(len(keys), dtype=bool)
+
+    index = np.searchsorted(values, keys).clip(max=len(values) - 1)
+    return values[index] == keys
@@ -0,0 +1,132 @@
+from pathlib import Path
+from django.conf import settings
+from django.db.models import F
+from api.uploads.diff import contains
+import hashlib
+import numpy as np
+import shutil
+
+'''
+Planners often upload the same SAP export again, or one that only
+differs by a few rows. Every ingest records the file's `checksum`, and
+on success a manifest of its row fingerprints next to the file
+(`<data_file>.rows.npy`), then marks the upload it replaced as
+`superseded_by` the new one:
+
+    items = AltSub.objects.filter(upload__sector_id=upload.sector_id)
+    previous = history.previous(upload, AltSubUpload.objects.filter(sector_id=upload.sector_id))
+    current = history.fingerprints(items)
+    if history.unchanged(upload, previous, current):
+        return                                        # same file, same rows
+    staging = Staging(known=current)
+    ...
+    history.supersede(previous, upload, staging.fingerprints)
+
+The database can drift from the last upload (admin edits, or another
+upload to the same sector), so the diff is always against the
+fingerprints `current`ly stored on the rows, and a file is only skipped
+when it is the same as the previous upload's and the rows still match
+that upload's manifest. `Staging` then only has to stage the rows of
+the file that aren't in the database. Rows without a fingerprint (loaded
+before they were recorded) make the whole file staged as before.
+'''
+
+
+def checksum(data_file):
+    digest = hashlib.blake2b(digest_size=16)
+
+    data_file.open("rb")
+    try:
+        for chunk in data_file.chunks():
+            digest.update(chunk)
+    finally:
+        data_file.close()
+
+    return digest.hexdigest()
+
+
+def manifest_path(upload):
+    try:
+        return Path(f"{upload.data_file.path}.rows.npy")
+    except (NotImplementedError, ValueError):
+        return None
+
+
+def previous(upload, uploads):
+    '''
+    The upload from `uploads` whose rows are currently in the database:
+    the last one to succeed, other than `upload` itself.
+    '''
+
+    # uploads made before the job runner succeeded without a `finished` time; they come last
+    latest = F("finished").desc(nulls_last=True)
+    return uploads.filter(status=upload.StatusChoices.SUCCEEDED).exclude(pk=upload.pk).order_by(latest, "-pk").first()
+
+
+def fingerprints(existing):
+    '''
+    The sorted unique fingerprints of the rows of `existing`, or `None`
+    if some of them have none.
+    '''
+
+    values = np.fromiter(existing.values_list("fingerprint", flat=True).iterator(chunk_size=settings.UPLOAD_CHUNK_SIZE), dtype="S32")
+    if (values == b"").any():
+        return None
+    return np.unique(values)
+
+
+def manifest(upload):
+    '''
+    The sorted row fingerprints of `upload`'s file, or `None` if they
+    weren't recorded.
+    '''
+
+    path = upload and manifest_path(upload)
+    if path and path.exists():
+        return np.load(path)
+
+
+def unchanged(upload, previous, current, exact=True):
+    '''
+    Records the checksum of `upload`'s file. When it is the same file as
+    `previous` and the `current` fingerprints in the database still match
+    the manifest of `previous`, supersedes `previous` straight away and
+    returns `True`. With `exact=False` (pipelines that never delete) the
+    database only has to still hold every row of the manifest.
+    '''
+
+    upload.update_job(checksum=checksum(upload.data_file))
+
+    if previous is None or previous.checksum != upload.checksum:
+        return False
+
+    rows = manifest(previous)
+    if rows is None or current is None:
+        return False
+    if exact and not np.array_equal(rows, current):
+        return False
+    if not exact and not contains(current, rows).all():
+        return False
+
+    source, target = manifest_path(previous), manifest_path(upload)
+    if source and target and source.exists():
+        shutil.copyfile(source, target)
+
+    upload.update_job(rows_read=previous.rows_read)
+    previous.update_job(superseded_by=upload)
+    return True
+
+
+def supersede(previous, upload, fingerprints=None):
+    '''
+    Marks `previous` as replaced by the freshly ingested `upload`, and
+    records the manifest of its row `fingerprints` if given.
+    '''
+
+    path = manifest_path(upload)
+    if path and fingerprints is not None:
+        with path.open("wb") as f:
+            np.save(f, fingerprints)
+
+    if previous is not None:
+        previous.update_job(superseded_by=upload)
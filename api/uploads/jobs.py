@@ -0,0 +1,311 @@
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.utils import timezone
+from rest_framework import serializers
+from rest_framework.decorators import action
+from rest_framework.response import Response
+from api.uploads.reader import check_columns
+from api.viewsets import Filter, boolean, positive
+import datetime
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+'''
+Uploads are processed on a pool of `settings.UPLOAD_WORKERS` threads in
+the web process, so no broker is needed and the POST returns as soon as
+the file is stored. The upload record (see `core.models.UploadJob`)
+carries the job status and progress counters, which the `*_uploads`
+endpoints expose for polling.
+
+With `UPLOAD_WORKERS = 0` the job runs inline when the request's
+transaction commits, which is handy for management commands and tests.
+SQLite allows a single writer, so it never gets more than one worker:
+concurrent ingests would only fail with "database is locked". That cap
+is per process: on SQLite, run a single web process (one gunicorn
+worker, one instance), or uploads sent to different processes can still
+collide.
+
+Progress written while the pipeline holds a transaction open would only
+be visible once it commits, so it goes through a connection of its own
+(see `Progress`), except on SQLite, where a second writer would wait for
+the transaction anyway.
+
+Jobs live in the memory of the server that accepted them: those left
+queued or running when it stopped are marked failed by `recover`, which
+`manage.py recover_uploads` runs before the server starts (see the
+Procfile). Other instances may still be processing their own jobs, so
+only the jobs whose `heartbeat` (stamped on every `update_job`) is older
+than `settings.UPLOAD_STALE_AFTER` are taken for abandoned. A job still
+waiting in a queue, or in a stage that writes no progress, for longer
+than that is failed too, so keep it well above the longest stage.
+
+Pipelines wrap each of their stages in `stage(upload, name)`, which
+stores the stage's duration, query count and the rows it read, added
+and deleted in `upload.stages`. The `stages/` route of an upload
+endpoint (see `StageSummary`) aggregates them across uploads.
+
+The upload endpoints share their job plumbing from here: the `Status`
+serializer (`status_serializer`), the `Create` serializer that queues
+the job (`CreateUpload`) and the `?dry_run=1` preview (`DryRun`).
+'''
+
+# Row counters of `UploadJob` recorded per stage
+ROW_COUNTS = ["rows_read", "rows_added", "rows_deleted"]
+
+# `UploadJob` fields the upload endpoints expose for polling
+JOB_FIELDS = [
+    "status",
+    "get_status_display",
+    *ROW_COUNTS,
+    "started",
+    "finished",
+    "duration",
+    "errors",
+    "stages",
+]
+
+# Error recorded on the jobs `recover` marks failed
+INTERRUPTED = "The server stopped before the upload was processed. Please upload the file again."
+
+_executor = None
+_progress_executor = None
+
+
+def workers():
+    if connection.vendor == "sqlite":
+        return min(settings.UPLOAD_WORKERS, 1)
+    return settings.UPLOAD_WORKERS
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=workers(), thread_name_prefix="upload")
+    return _executor
+
+
+def get_progress_executor():
+    global _progress_executor
+    if _progress_executor is None:
+        _progress_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="upload-progress")
+    return _progress_executor
+
+
+class Progress:
+    '''
+    Writes the job fields of an upload being processed. Inside the
+    transactions the pipeline opens (deeper than `depth`, the atomic
+    blocks around the job itself), they are written by a separate thread,
+    whose connection commits them right away.
+    '''
+
+    def __init__(self, depth):
+        self.depth = depth
+
+    def write(self, model, pk, fields):
+        if atomic_depth() > self.depth and connection.vendor != "sqlite":
+            get_progress_executor().submit(write_fields, model, pk, fields).result()
+        else:
+            model.objects.filter(pk=pk).update(**fields)
+
+
+def atomic_depth():
+    # number of `transaction.atomic` blocks the connection is in
+    return connection.in_atomic_block + len(connection.savepoint_ids)
+
+
+def write_fields(model, pk, fields):
+    close_old_connections()
+    model.objects.filter(pk=pk).update(**fields)
+
+
+def enqueue(upload, ingest):
+    '''
+    Schedules `ingest(upload)` once the transaction that created
+    `upload` has committed, so the worker can see the record.
+    '''
+
+    model, pk = type(upload), upload.pk
+
+    if workers():
+        transaction.on_commit(lambda: get_executor().submit(run, model, pk, ingest, in_worker=True))
+    else:
+        transaction.on_commit(lambda: run(model, pk, ingest))
+
+
+def run(model, pk, ingest, in_worker=False):
+    try:
+        upload = model.objects.get(pk=pk)
+        upload.progress = Progress(atomic_depth())
+        upload.update_job(status=model.StatusChoices.RUNNING, started=timezone.now(), finished=None, errors=None, stages={})
+
+        try:
+            ingest(upload)
+
+        except serializers.ValidationError as e:
+            upload.update_job(status=model.StatusChoices.FAILED, finished=timezone.now(), errors=e.detail, **counters(upload))
+
+        except Exception as e:
+            logger.exception(f"{model.__name__} {pk} failed")
+            upload.update_job(status=model.StatusChoices.FAILED, finished=timezone.now(), errors=[str(e)], **counters(upload))
+
+        else:
+            upload.update_job(status=model.StatusChoices.SUCCEEDED, finished=timezone.now(), **counters(upload))
+
+    finally:
+        # worker threads get their own connection; don't leak it
+        if in_worker:
+            connection.close()
+
+
+def counters(upload):
+    # the final values, whichever connection wrote the progress
+    return {"stages": upload.stages, **{field: getattr(upload, field) for field in ROW_COUNTS}}
+
+
+def recover(stale_after=None):
+    '''
+    Marks the uploads left queued or running with no heartbeat for
+    `stale_after` seconds (default `settings.UPLOAD_STALE_AFTER`) as
+    failed, and returns how many there were.
+    '''
+
+    from core.models import UploadJob
+
+    stale_after = settings.UPLOAD_STALE_AFTER if stale_after is None else stale_after
+    cutoff = timezone.now() - datetime.timedelta(seconds=stale_after)
+
+    recovered = 0
+    for model in UploadJob.__subclasses__():
+        recovered += model.objects.filter(status__in=[model.StatusChoices.QUEUED, model.StatusChoices.RUNNING], heartbeat__lte=cutoff).update(
+            status=model.StatusChoices.FAILED,
+            finished=timezone.now(),
+            errors=[INTERRUPTED],
+        )
+    return recovered
+
+
+@contextmanager
+def stage(upload, name):
+    '''
+    Records the duration, query count and row counts of the block as
+    `upload.stages[name]`. Nothing is recorded if the block fails.
+    '''
+
+    queries = 0
+
+    def count(execute, sql, params, many, context):
+        nonlocal queries
+        queries += 1
+        return execute(sql, params, many, context)
+
+    before = [getattr(upload, field) for field in ROW_COUNTS]
+    start = time.perf_counter()
+
+    with connection.execute_wrapper(count):
+        yield
+
+    timing = {"seconds": round(time.perf_counter() - start, 3), "queries": queries}
+    timing.update((field, getattr(upload, field) - value) for field, value in zip(ROW_COUNTS, before))
+    upload.update_job(stages={**upload.stages, name: timing})
+
+
+def summarise(stages):
+    '''
+    Aggregates the `stages` of several uploads: per stage, the number of
+    uploads that ran it, the mean and max of its duration and queries,
+    and its total row counts and throughput.
+    '''
+
+    summary = {}
+
+    for upload_stages in stages:
+        for name, timing in (upload_stages or {}).items():
+            totals = summary.setdefault(name, {"uploads": 0, "seconds": [], "queries": [], **{field: 0 for field in ROW_COUNTS}})
+            totals["uploads"] += 1
+            totals["seconds"].append(timing["seconds"])
+            totals["queries"].append(timing["queries"])
+            for field in ROW_COUNTS:
+                totals[field] += timing.get(field, 0)
+
+    for totals in summary.values():
+        seconds, queries = totals.pop("seconds"), totals.pop("queries")
+        rows = max(totals[field] for field in ROW_COUNTS)
+        totals.update(
+            total_seconds=round(sum(seconds), 3),
+            mean_seconds=round(sum(seconds) / len(seconds), 3),
+            max_seconds=max(seconds),
+            mean_queries=round(sum(queries) / len(queries), 1),
+            max_queries=max(queries),
+            rows_per_second=round(rows / sum(seconds)) if sum(seconds) else None,
+        )
+
+    return summary
+
+
+class StageSummary:
+    '''
+    Viewset mixin adding `stages/`: the stage timings of the uploads
+    matching the request's filters, aggregated with `summarise`.
+    '''
+
+    @action(detail=False)
+    def stages(self, request):
+        uploads = self.filter_queryset(self.get_queryset())
+        return Response(summarise(uploads.values_list("stages", flat=True)))
+
+
+class DryRun:
+    '''
+    Viewset mixin: `?dry_run=1` on create previews the upload with the
+    viewset's `preview(upload, page)` instead of saving it.
+    '''
+
+    preview = None
+
+    def create(self, request, *args, **kwargs):
+        if Filter("dry_run", type=boolean).parse(request.query_params.get("dry_run", "false")):
+            serializer = self.get_serializer(data=request.data)
+            serializer.is_valid(raise_exception=True)
+            upload = self.queryset.model(**serializer.validated_data)
+            return Response(type(self).preview(upload, Filter("page", type=positive).parse(request.query_params.get("page", "1"))))
+
+        return super().create(request, *args, **kwargs)
+
+
+class CreateUpload(serializers.ModelSerializer):
+    '''
+    Saves an upload whose file has the `columns` it requires, and processes
+    it with `ingest` in the background once the upload is saved.
+    '''
+
+    columns = []
+    ingest = None
+
+    def validate_data_file(self, data_file):
+        if data_file:
+            check_columns(data_file, self.columns)
+        return data_file
+
+    @transaction.atomic
+    def create(self, validated_data):
+        upload = super().create(validated_data)
+        enqueue(upload, type(self).ingest)
+        return upload
+
+
+def status_serializer(job_model):
+    '''
+    The serializer of the job fields of `job_model` uploads.
+    '''
+
+    class Status(serializers.ModelSerializer):
+        class Meta:
+            model = job_model
+            fields = ["id", *JOB_FIELDS]
+
+    return Status
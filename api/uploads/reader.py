@@ -0,0 +1,134 @@
+from django.conf import settings
+from rest_framework import serializers
+import pandas as pd
+
+'''
+Uploaded SAP exports can run to millions of rows, so they are never
+loaded into a single DataFrame. `read_chunks` yields the file in
+batches of `settings.UPLOAD_CHUNK_SIZE` rows; each pipeline normalises
+a batch with vectorized operations and hands it to the diff and insert
+stages before the next batch is read.
+'''
+
+
+def read_chunks(data_file, chunksize=None, **kwargs):
+    chunksize = chunksize or settings.UPLOAD_CHUNK_SIZE
+
+    data_file.open("rb")
+    try:
+        with pd.read_csv(data_file, encoding_errors="ignore", dtype=str, chunksize=chunksize, **kwargs) as reader:
+            yield from reader
+    finally:
+        data_file.close()
+
+
+def header(data_file):
+    '''
+    Column names of `data_file`. A file that is already open (e.g. one
+    being uploaded) is left open and rewound.
+    '''
+
+    def read():
+        try:
+            return list(pd.read_csv(data_file, encoding_errors="ignore", dtype=str, nrows=0).columns)
+        except pd.errors.EmptyDataError:
+            return []
+
+    if not data_file.closed:
+        data_file.seek(0)
+        try:
+            return read()
+        finally:
+            data_file.seek(0)
+
+    data_file.open("rb")
+    try:
+        return read()
+    finally:
+        data_file.close()
+
+
+def check_columns(data_file, required):
+    '''
+    Raises a `ValidationError` naming the `required` columns missing from
+    `data_file`, before any of it is parsed.
+    '''
+
+    columns = set(header(data_file))
+    missing = [column for column in required if column not in columns]
+    if missing:
+        raise serializers.ValidationError(f"Missing column(s): {', '.join(missing)}")
+
+
+def fill_blanks(df, values):
+    '''
+    Fills the blank cells of each column of `values` (a `{column: value}`
+    dict) with its value, adding the column if the file lacks it, so
+    NOT NULL text fields are stored as e.g. "" rather than failing.
+    '''
+
+    return df.assign(**{column: df[column].fillna(value) if column in df else value for column, value in values.items()})
+
+
+def parse_dates(column, format="%m/%d/%Y"):
+    '''
+    Vectorized replacement for `.apply(lambda x: x.date())`:
+    unparseable values become `None` rather than `NaT`.
+    '''
+
+    parsed = pd.to_datetime(column, format=format, errors="coerce")
+    return parsed.dt.date.where(parsed.notna(), None)
+
+
+def as_tuples(df, columns):
+    '''
+    Returns the rows of `df` as plain tuples in `columns` order,
+    with missing values as `None`.
+    '''
+
+    frame = df.reindex(columns=columns)
+    frame = frame.astype(object).where(frame.notna(), None)
+    return list(frame.itertuples(index=False, name=None))
+
+
+def parse_numbers(column):
+    '''
+    Quantities as floats, ignoring thousands separators; anything else
+    becomes `NaN`.
+    '''
+
+    return pd.to_numeric(column.str.replace(",", "", regex=False), errors="coerce").astype(float)
+
+
+def parse_integers(column):
+    '''
+    Whole numbers as nullable integers; anything else becomes `None`.
+    '''
+
+    parsed = pd.to_numeric(column, errors="coerce")
+    return parsed.where(parsed % 1 == 0).astype("Int64")
+
+
+def check_choices(column, invalid, label):
+    '''
+    Raises a `ValidationError` listing the `invalid` values of `column`
+    collected by `map_choices`, e.g. "Invalid material type(s): X, Y".
+    '''
+
+    if invalid:
+        raise serializers.ValidationError({column: [f"Invalid {label}(s): {', '.join(sorted(invalid))}"]})
+
+
+def map_choices(column, choices):
+    '''
+    Maps the labels (or values) of an `IntegerChoices` class to their
+    values in one pass. Returns the mapped column and the set of values
+    that aren't valid choices, so pipelines can report them together.
+    '''
+
+    lookup = {label: value for value, label in choices.choices}
+    lookup.update({str(value): value for value in choices.values})
+
+    mapped = column.str.strip().map(lookup)
+    invalid = set(column[column.notna() & mapped.isna()])
+    return mapped.astype("Int64"), invalid
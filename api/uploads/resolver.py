@@ -0,0 +1,88 @@
+from collections import OrderedDict
+from django.conf import settings
+from django.db import connection
+from rest_framework import serializers
+
+'''
+Upload files reference other tables by natural key (`Program.model_code`,
+`MaterialMaster.name`, `GroupWbs.name`), optionally scoped by a
+`queryset` (e.g. the upload's program). A `Resolver` looks up every key
+of a batch in one query per model and keeps the results in a bounded
+LRU map, so a key is only queried again once it has been evicted.
+
+Keys that don't exist are collected in `unresolved`; pipelines call
+`validate` once the file has been read, before writing anything, so a
+bad reference is reported as a 400 instead of failing mid-transaction.
+'''
+
+
+def param_batches(values):
+    '''
+    Splits `values` into lists small enough for an `__in` lookup on the
+    current backend (SQLite caps the number of bound parameters).
+    '''
+
+    values = list(values)
+    step = connection.features.max_query_params or len(values) or 1
+    for i in range(0, len(values), step):
+        yield values[i : i + step]
+
+
+class Resolver:
+    def __init__(self, model, field, max_size=None, queryset=None):
+        self.model = model
+        self.field = field
+        self.queryset = queryset if queryset is not None else model.objects.all()
+        self.max_size = max_size or settings.UPLOAD_RESOLVER_CACHE_SIZE
+        self.cache = OrderedDict()
+        self.unresolved = set()
+
+    @property
+    def label(self):
+        return f"{self.model.__name__}.{self.field}"
+
+    def resolve(self, keys):
+        '''
+        Returns a `{key: pk}` dict for the existing `keys`.
+        '''
+
+        keys = {key for key in keys if key is not None}
+        resolved = {}
+
+        for key in keys:
+            if key in self.cache:
+                self.cache.move_to_end(key)
+                resolved[key] = self.cache[key]
+
+        missing = list(keys - resolved.keys() - self.unresolved)
+
+        for batch in param_batches(missing):
+            rows = self.queryset.filter(**{f"{self.field}__in": batch}).values_list(self.field, "pk")
+            for key, pk in rows:
+                resolved.setdefault(key, pk)
+
+        for key in missing:
+            if key in resolved:
+                self.cache[key] = resolved[key]
+            else:
+                self.unresolved.add(key)
+
+        while len(self.cache) > self.max_size:
+            self.cache.popitem(last=False)
+
+        return resolved
+
+
+def validate(*resolvers, sample_size=100):
+    '''
+    Raises a `ValidationError` listing the unresolved keys of each resolver.
+    '''
+
+    errors = {}
+    for resolver in resolvers:
+        if resolver.unresolved:
+            unresolved = sorted(map(str, resolver.unresolved))
+            errors[resolver.label] = [f"{len(unresolved)} unknown value(s): {', '.join(unresolved[:sample_size])}"]
+
+    if errors:
+        raise serializers.ValidationError(errors)
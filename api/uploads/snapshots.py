@@ -0,0 +1,200 @@
+from pathlib import Path
+from django.conf import settings
+import json
+import shutil
+import numpy as np
+import pandas as pd
+
+'''
+Parsing and normalising an SAP export is the most expensive part of an
+upload, so the normalised rows are kept next to the original file as a
+columnar snapshot:
+
+    <data_file>.columns/manifest.json
+    <data_file>.columns/<segment>/<column index>.npy
+    <data_file>.columns/<segment>/<column index>.nulls.npy
+    <data_file>.columns/<segment>/<column index>.categories.npy
+
+Each segment holds one batch of rows. Columns are plain numpy arrays
+(datetime64 dates, int64/float64 numbers, with a separate null mask
+where needed) loaded with `mmap_mode="r"`, so a later stage reads only
+the columns it asks for and numeric columns are never copied. Strings
+are stored as categorical codes with their distinct values, and read
+back as a `pd.Categorical` over the mapped codes: only the distinct
+values become Python strings, not every cell.
+
+    with Snapshot(upload) as snapshot:
+        for df in snapshot.read((normalise(chunk) for chunk in read_chunks(...)), COLUMNS):
+            ...
+
+A recorded snapshot is only kept if the block exits without an error,
+so an invalid file never leaves a snapshot behind. `parse` records one
+ahead of the ingest (see `api.uploads.batch`).
+'''
+
+
+def parse(upload, frames, columns):
+    '''
+    Records the snapshot of `upload` from the generator `frames`, unless
+    it already has one, without writing to the database.
+    '''
+
+    with Snapshot(upload) as snapshot:
+        if not snapshot.exists(columns):
+            for _ in snapshot.record(frames, columns):
+                pass
+
+
+class Snapshot:
+    def __init__(self, upload):
+        self.path = None
+        self.recording = False
+
+        # dry runs aren't saved, and remote storages have no local path
+        if settings.UPLOAD_SNAPSHOTS and upload.pk:
+            try:
+                self.path = Path(f"{upload.data_file.path}.columns")
+            except NotImplementedError:
+                pass
+
+    @property
+    def temp_path(self):
+        return self.path.with_name(f"{self.path.name}.tmp")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.recording:
+            if exc_type is None:
+                self.delete()
+                self.temp_path.rename(self.path)
+            else:
+                shutil.rmtree(self.temp_path, ignore_errors=True)
+            self.recording = False
+
+    def exists(self, columns=None):
+        '''
+        Whether the snapshot was recorded, with all of `columns` if given
+        (a snapshot recorded by an older version of the pipeline may not).
+        '''
+
+        if self.path is None or not (self.path / "manifest.json").exists():
+            return False
+        return columns is None or set(columns) <= set(self.manifest()["columns"])
+
+    def manifest(self):
+        return json.loads((self.path / "manifest.json").read_text())
+
+    def delete(self):
+        if self.path is not None:
+            shutil.rmtree(self.path, ignore_errors=True)
+
+    def read(self, frames, columns):
+        '''
+        The recorded frames with `columns` if there are, otherwise the
+        generator `frames`, recorded as they are read.
+        '''
+
+        if self.exists(columns):
+            return self.frames(columns)
+        return self.record(frames, columns)
+
+    # ################################################################################
+    # Writing
+    def record(self, frames, columns):
+        '''
+        Yields `frames` narrowed to `columns`, writing each one as a segment.
+        '''
+
+        frames = (df.reindex(columns=columns) for df in frames)
+
+        if self.path is None:
+            yield from frames
+            return
+
+        shutil.rmtree(self.temp_path, ignore_errors=True)
+        self.temp_path.mkdir(parents=True)
+        self.recording = True
+        manifest = {"columns": list(columns), "segments": []}
+
+        for segment, df in enumerate(frames):
+            manifest["segments"].append(write_segment(self.temp_path / str(segment), df))
+            yield df
+
+        (self.temp_path / "manifest.json").write_text(json.dumps(manifest))
+
+    # ################################################################################
+    # Reading
+    def frames(self, columns=None):
+        '''
+        Yields one DataFrame per segment with only `columns` (default all).
+        '''
+
+        manifest = self.manifest()
+        columns = list(columns or manifest["columns"])
+        indexes = [manifest["columns"].index(column) for column in columns]
+
+        for segment, kinds in enumerate(manifest["segments"]):
+            path = self.path / str(segment)
+            yield pd.DataFrame({column: read_column(path, i, kinds[i]) for column, i in zip(columns, indexes)})
+
+
+def write_segment(path, df):
+    path.mkdir()
+    kinds = []
+
+    for i, column in enumerate(df.columns):
+        values, nulls, kind = encode(df[column])
+        write_column(path, i, values)
+        if nulls is not None:
+            np.save(path / f"{i}.nulls.npy", nulls)
+        kinds.append(kind)
+
+    return kinds
+
+
+def encode(column):
+    nulls = column.isna().to_numpy()
+
+    if pd.api.types.is_float_dtype(column):
+        return column.to_numpy(dtype=float), None, "float"
+
+    if pd.api.types.is_integer_dtype(column):
+        return column.to_numpy(dtype=np.int64, na_value=0), nulls, "int"
+
+    if pd.api.types.infer_dtype(column, skipna=True) == "date":
+        return column.to_numpy(dtype="datetime64[D]"), None, "date"
+
+    # codes of -1 are nulls
+    categorical = pd.Categorical(column.astype(str).where(~nulls, None))
+    return categorical, None, "category"
+
+
+def write_column(path, i, values):
+    if isinstance(values, pd.Categorical):
+        np.save(path / f"{i}.categories.npy", values.categories.to_numpy(dtype=str))
+        values = values.codes
+    np.save(path / f"{i}.npy", values)
+
+
+def read_column(path, i, kind):
+    values = np.load(path / f"{i}.npy", mmap_mode="r")
+
+    if kind == "float":
+        return values
+
+    if kind == "category":
+        categories = np.load(path / f"{i}.categories.npy").astype(object)
+        return pd.Categorical.from_codes(values, categories=categories)
+
+    if kind == "date":
+        return pd.Series(values.astype(object), dtype=object)
+
+    nulls = np.load(path / f"{i}.nulls.npy", mmap_mode="r")
+
+    if kind == "int":
+        return pd.arrays.IntegerArray(np.asarray(values), np.asarray(nulls))
+
+    # fixed-width strings, as recorded before categorical columns
+    return pd.Series(values, dtype=object).where(~nulls, None)
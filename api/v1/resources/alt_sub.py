@@ -1,6 +1,9 @@
 from rest_framework import serializers
+from rest_framework.decorators import action
+from rest_framework.response import Response
 from core.models import AltSub
-from api.viewsets import ProjectionsAndFilters
+from api.viewsets import Filter, ProjectionsAndFilters
+from api import substitutes
 
 
 class Serializers:
@@ -41,7 +44,7 @@ class Serializers:
     }
 
 
-class ViewSet(ProjectionsAndFilters):
+class Viewset(ProjectionsAndFilters):
     queryset = AltSub.objects.all()
     serializers = Serializers
     serializer_class = Serializers.Detail
@@ -49,9 +52,21 @@ class ViewSet(ProjectionsAndFilters):
     ordering = ["primary_material"]
 
     filters = {
-        "plant": lambda q, v, _: q.filter(plant_icontains=v),
-        "model": lambda q, v, _: q.filter(model_icontains=v),
-        "type_code": lambda q, v, _: q.filter(type_code_icontains=v),
-        "primary_material": lambda q, v, _: q.filter(primary_material__name__icontains=v),
-        "replacement_part": lambda q, v, _: q.filter(replacement_part__name__icontains=v),
+        "plant": Filter("plant"),
+        "model": Filter("model__model_code"),
+        "type_code": Filter("type_code"),
+        "primary_material": Filter("primary_material_id", "prefix"),
+        "replacement_part": Filter("replacement_part_id", "prefix"),
+        "material": Filter("primary_material_id"),
+        "program": Filter("model_id", type=int),
     }
+
+    # every substitute of `?material=`, through chains of alt/subs, optionally limited to a `plant` and `program`
+    @action(detail=False)
+    def substitutes(self, request):
+        material = request.query_params.get("material")
+        if not material:
+            raise serializers.ValidationError({"material": ["This parameter is required."]})
+
+        found = substitutes.graph().substitutes(material, request.query_params.get("plant"), request.query_params.get("program"))
+        return Response({"material": material, "substitutes": [{"material": name, "depth": depth} for name, depth in found]})
@@ -1,16 +1,231 @@
 from django.contrib.auth import get_user_model
 from rest_framework import serializers
-from api.viewsets import ProjectionsAndFilters
+from api.viewsets import Filter, ProjectionsAndFilters, boolean
 from django.db import transaction
-from django.shortcuts import HttpResponse
-from core.models import AltSub, AltSubUpload, Program
+from core.models import AltSub, AltSubUpload, MaterialMaster, Program
+from django.conf import settings
+from api.uploads.reader import read_chunks, check_columns, fill_blanks, parse_dates, as_tuples
+from api.uploads.diff import Staging, bulk_batch_size, dry_run
+from api.uploads.resolver import Resolver, validate
+from api.uploads.snapshots import Snapshot
+from api.uploads import history, jobs, snapshots
+from api import search, versions
 import pandas as pd
 
 User = get_user_model()
 
 
-class NoFileError(Exception):
-    pass
+# Columns of the SAP alt/sub export, in the order they are fingerprinted
+COLUMNS = [
+    "Plnt",
+    "Model",
+    "Type Code",
+    "Primary Material",
+    "Replacement Part",
+    "Next Higher Assembly",
+    "Alternate or Substitute Code",
+    "Sub Code",
+    "WBS Element",
+    "RevLev",
+    "Reason For Change",
+    "Item Text Line 1",
+    "Created by",
+    "Created",
+]
+
+# `AltSub` fields matching `COLUMNS`
+FIELDS = [
+    "plant",
+    "model__model_code",
+    "type_code",
+    "primary_material_id",
+    "replacement_part_id",
+    "next_higher_assembly",
+    "alternate_or_substitute_code",
+    "sub_code",
+    "wbs_element",
+    "revision_level",
+    "reason_for_change",
+    "item_text_line",
+    "created_by",
+    "created_date",
+]
+
+# Columns a file must have; the others are blank when missing
+REQUIRED = ["Model", "Primary Material", "Replacement Part", "Created"]
+
+# Values of blank cells; NOT NULL text columns default to ""
+FILL_VALUES = {
+    "Plnt": "",
+    "Alternate or Substitute Code": "",
+    "Sub Code": "",
+    "Next Higher Assembly": "None",
+    "Type Code": "NA",
+    "WBS Element": "None",
+    "RevLev": "None",
+    "Item Text Line 1": "None",
+    "Model": "None",
+    "Created by": "None",
+}
+
+
+def normalise(df):
+    df = df.drop(["Date"], axis=1, errors="ignore")
+    df["Created"] = parse_dates(df["Created"])
+    return fill_blanks(df, FILL_VALUES)
+
+
+def read_file(upload, chunksize):
+    check_columns(upload.data_file, REQUIRED)
+    for chunk in read_chunks(upload.data_file, chunksize):
+        yield normalise(chunk)
+
+
+def parse(upload, chunksize=None):
+    '''
+    Records the snapshot of `upload.data_file` ahead of `ingest` (see
+    `api.uploads.snapshots.parse`). Batch ingests run this in a process
+    pool (see `api.uploads.batch`).
+    '''
+
+    snapshots.parse(upload, read_file(upload, chunksize or settings.UPLOAD_CHUNK_SIZE), COLUMNS)
+
+
+def stage_file(upload, staging, chunksize):
+    '''
+    Stages `upload.data_file` one batch at a time, resolving the programs
+    and materials it references along the way. Returns the program
+    resolver once every reference is known to exist.
+
+    The file is only parsed once: later runs read the normalised rows
+    back from its snapshot (see `api.uploads.snapshots`).
+    '''
+
+    programs = Resolver(Program, "model_code")
+    materials = Resolver(MaterialMaster, "name")
+
+    with Snapshot(upload) as snapshot:
+        for df in snapshot.read(read_file(upload, chunksize), COLUMNS):
+            programs.resolve(df["Model"].dropna().unique())
+            materials.resolve(pd.unique(df[["Primary Material", "Replacement Part"]].stack().astype(object)))
+            staging.stage(as_tuples(df, COLUMNS))
+            upload.update_job(rows_read=upload.rows_read + len(df))
+
+        validate(programs, materials)
+
+    return programs
+
+
+def ingest(upload, chunksize=None):
+    '''
+    Reconciles the sector's alt/subs with `upload.data_file`.
+
+    Once the file is staged, the stale rows are deleted and the new rows
+    inserted with set-based queries on the rows' fingerprints (see
+    `api.uploads.diff`). The same file as the sector's last upload is
+    skipped while the database still matches it, and otherwise only the
+    rows missing from the database are staged (see `api.uploads.history`). When the alt/subs changed, the
+    substitution graph is rebuilt (see `api.substitutes`) and the part
+    search of their materials refreshed (see `api.search`).
+    '''
+
+    chunksize = chunksize or settings.UPLOAD_CHUNK_SIZE
+    altsub_items = AltSub.objects.filter(upload__sector_id=upload.sector_id)
+
+    with jobs.stage(upload, "checksum"):
+        previous = history.previous(upload, AltSubUpload.objects.filter(sector_id=upload.sector_id))
+        current = history.fingerprints(altsub_items)
+        unchanged = history.unchanged(upload, previous, current)
+    if unchanged:
+        return
+
+    staging = Staging(known=current)
+
+    try:
+        # ################################################################################
+        # Staging the file upload, one batch at a time
+        with jobs.stage(upload, "stage"):
+            programs = stage_file(upload, staging, chunksize)
+
+        with transaction.atomic():
+            # ################################################################################
+            # Delete items from database
+            with jobs.stage(upload, "delete"):
+                stale = staging.deletions(altsub_items)
+                parts = set()
+                for primary, replacement in stale.values_list("primary_material_id", "replacement_part_id").distinct():
+                    parts.update((primary, replacement))
+                deleted, _ = stale.delete()
+                upload.update_job(rows_deleted=deleted)
+
+            # ################################################################################
+            # Add items to database
+            with jobs.stage(upload, "add"):
+                added = 0
+                for staged_rows in staging.additions(altsub_items, chunksize):
+                    add_items(upload, staged_rows, programs)
+                    for staged in staged_rows:
+                        parts.update(staged.data[3:5])
+                    added += len(staged_rows)
+                    upload.update_job(rows_added=added)
+
+            # the substitution graph of every process is rebuilt from the new version (see `api.substitutes`)
+            if deleted or added:
+                versions.bump(AltSub)
+
+            # ################################################################################
+            # Refresh the part search of both sides of the alt/subs added or deleted
+            with jobs.stage(upload, "search"):
+                search.refresh(parts)
+
+        history.supersede(previous, upload, staging.fingerprints)
+
+    finally:
+        staging.clear()
+
+
+def preview(upload, page=1):
+    '''
+    Dry run of `ingest` for an unsaved `upload`: the rows it would add and
+    delete, without writing anything.
+    '''
+
+    with dry_run():
+        staging = Staging()
+        stage_file(upload, staging, settings.UPLOAD_CHUNK_SIZE)
+        altsub_items = AltSub.objects.filter(upload__sector_id=upload.sector_id)
+        return staging.preview(altsub_items, COLUMNS, FIELDS, page)
+
+
+def add_items(upload, staged_rows, programs):
+    program_ids = programs.resolve({staged.data[1] for staged in staged_rows})
+
+    new_altsub_items = []
+    for staged in staged_rows:
+        (plant, model, typecd, prim_mat, rep_part, nha, altsubcd, subcd, wbs, revlev, res_chng, itemtxt, createdby, creatd) = staged.data
+
+        new_altsub_items.append(
+            AltSub(
+                plant=plant,
+                model_id=program_ids[model],
+                type_code=typecd,
+                primary_material_id=prim_mat,
+                replacement_part_id=rep_part,
+                next_higher_assembly=nha,
+                alternate_or_substitute_code=altsubcd,
+                sub_code=subcd,
+                wbs_element=wbs,
+                revision_level=revlev,
+                reason_for_change=res_chng,
+                item_text_line=itemtxt,
+                created_by=createdby,
+                created_date=creatd,
+                upload=upload,
+                fingerprint=staged.fingerprint,
+            )
+        )
+
+    AltSub.objects.bulk_create(new_altsub_items, batch_size=bulk_batch_size(COLUMNS + ["upload", "fingerprint"]))
 
 
 class Serializers:
@@ -31,10 +246,17 @@ class Serializers:
                 "data_file",
                 "created",
                 "uploaded_by",
+                *jobs.JOB_FIELDS,
+                "checksum",
+                "superseded_by",
             ]
 
-    class Create(serializers.ModelSerializer):
+    Status = jobs.status_serializer(AltSubUpload)
+
+    class Create(jobs.CreateUpload):
         uploaded_by = serializers.HiddenField(default=serializers.CurrentUserDefault())
+        columns = REQUIRED
+        ingest = staticmethod(ingest)
 
         class Meta:
             model = AltSubUpload
@@ -43,159 +265,30 @@ class Serializers:
                 "sector",
                 "data_file",
                 "uploaded_by",
+                "status",
             ]
-
-        def is_valid(self, raise_exception=False):
-            return super().is_valid(raise_exception)
-
-        def create(self, validated_data):
-            new_alt_sub_upload = super().create(validated_data)
-
-            # Loading file from request method POST
-            try:
-                df = pd.read_csv(new_alt_sub_upload.data_file, encoding_errors="ignore", dtype=str)
-                df.drop(["Date"], axis=1, inplace=True, errors="ignore")
-                df["Created"] = pd.to_datetime(df["Created"], format="%m/%d/%Y", errors="coerce").apply(lambda x: x.date())
-                df["Created"] = df["Created"].fillna("None")
-                df["Next Higher Assembly"] = df["Next Higher Assembly"].fillna("None")
-                df["Type Code"] = df["Type Code"].fillna("NA")
-                df["WBS Element"] = df["WBS Element"].fillna("None")
-                df["RevLev"] = df["RevLev"].fillna("None")
-                df["Item Text Line 1"] = df["Item Text Line 1"].fillna("None")
-                df["Model"] = df["Model"].fillna("None")
-                df["Created by"] = df["Created by"].fillna("None")
-                rows = df.to_dict("records")
-
-                # ################################################################################
-                # Building set with existing database entries
-                with transaction.atomic():
-                    altsub_items = AltSub.objects.filter(upload__sector_id=new_alt_sub_upload.sector_id)
-                    db = set(
-                        (
-                            item.plant,
-                            item.model,
-                            item.type_code,
-                            item.primary_material,
-                            item.replacement_part,
-                            item.next_higher_assembly,
-                            item.alternate_or_substitute_code,
-                            item.sub_code,
-                            item.wbs_element,
-                            item.revision_level,
-                            item.reason_for_change,
-                            item.item_text_line,
-                            item.created_by,
-                            item.created_date,
-                        )
-                        for item in altsub_items
-                    )
-
-                # ################################################################################
-                # Creating set with data from file upload
-                file_data_set = set(
-                    (
-                        row["Plnt"],
-                        row["Model"],
-                        row["Type Code"],
-                        row["Primary Material"],
-                        row["Replacement Part"],
-                        row["Next Higher Assembly"],
-                        row["Alternate or Substitute Code"],
-                        row["Sub Code"],
-                        row["WBS Element"],
-                        row["RevLev"],
-                        row["Reason For Change"],
-                        row["Item Text Line 1"],
-                        row["Created by"],
-                        row["Created"] if row["Created"] != "None" else None,
-                    )
-                    for row in rows
-                )
-
-                # ################################################################################
-                # Delete items from database
-                items_to_delete = db - file_data_set
-                print(f"Items to Delete: {len(items_to_delete)}")
-
-                for (plant, model, typecd, prim_mat, rep_part, nha, altsubcd, subcd, wbs, revlev, res_chng, itemtxt, createdby, creatd) in items_to_delete:
-                    AltSub.objects.filter(plant=plant).filter(model=model).filter(type_code=typecd).filter(primary_material_id=prim_mat).filter(
-                        replacement_part_id=rep_part
-                    ).delete()
-
-                # ################################################################################
-                # Add items to database - Create list of dictionaries for the new items to add
-                items_to_add = file_data_set - db
-                print(f"Items to Add: {len(items_to_add)}")
-                items_to_add_list_dict = []
-
-                for (plant, model, typecd, prim_mat, rep_part, nha, altsubcd, subcd, wbs, revlev, res_chng, itemtxt, createdby, creatd) in items_to_add:
-                    new_dict = {}
-                    new_dict["Plnt"] = (plant,)
-                    new_dict["Model"] = (model,)
-                    new_dict["Type Code"] = (typecd,)
-                    new_dict["Primary Material"] = (prim_mat,)
-                    new_dict["Replacement Part"] = (rep_part,)
-                    new_dict["Next Higher Assembly"] = (nha,)
-                    new_dict["Alternate or Substitute Code"] = (altsubcd,)
-                    new_dict["Sub Code"] = (subcd,)
-                    new_dict["WBS Element"] = (wbs,)
-                    new_dict["RevLev"] = (revlev,)
-                    new_dict["Reason For Change"] = (res_chng,)
-                    new_dict["Item Text Line 1"] = (itemtxt,)
-                    new_dict["Created by"] = (createdby,)
-                    new_dict["Created"] = creatd
-                    items_to_add_list_dict.append(new_dict)
-
-                # ################################################################################
-                # Bulk Update items to Database
-                with transaction.atomic():
-                    distinct_model_for_altsubs = {(row["Model"] if row["Model"] else None) for row in items_to_add_list_dict}
-
-                    for i, model in enumerate(distinct_model_for_altsubs):
-                        rows_for_altsubs = list(filter(lambda x: x["Model"] == model, items_to_add_list_dict))
-                        new_altsub_items = []
-
-                        for row in rows_for_altsubs:
-                            program_model = Program.objects.get(model_code=str(row["Model"]))
-
-                            new_altsub_items.append(
-                                AltSub(
-                                    plant=row["Plnt"],
-                                    model=program_model,
-                                    type_code=row["Type Code"],
-                                    primary_material_id=row["Primary Material"],
-                                    replacement_part_id=row["Replacement Part"],
-                                    next_higher_assembly=row["Next Higher Assembly"],
-                                    alternate_or_substitute_code=row["Alternate or Substitute Code"],
-                                    sub_code=row["Sub Code"],
-                                    wbs_element=row["WBS Element"],
-                                    revision_level=row["RevLev"],
-                                    reason_for_change=row["Reason for Change"],
-                                    item_text_line=row["Item Text Line 1"],
-                                    created_by=row["Created by"],
-                                    created_date=row["Cretaed"],
-                                    upload=new_alt_sub_upload,
-                                )
-                            )
-
-                        AltSub.objects.bulk_create(new_altsub_items)
-
-            except NoFileError as e:
-                return HttpResponse(str(e), status=400)
-
-            return new_alt_sub_upload
+            read_only_fields = ["status"]
 
     for_ = {
         "summary": Summary,
         "detail": Detail,
+        "status": Status,
         "POST": Create,
     }
 
 
-class ViewSet(ProjectionsAndFilters):
+class Viewset(jobs.DryRun, jobs.StageSummary, ProjectionsAndFilters):
     queryset = AltSubUpload.objects.all()
+    # job progress is written with `update_job`, which sends no signals
+    cache_responses = False
     serializers = Serializers
     serializer_class = Serializers.Detail
 
-    def create(self, request, *args, **kwargs):
-        return super().create(request, *args, **kwargs)
+    filters = {
+        "sector": Filter("sector_id", type=int),
+        "status": Filter("status", "in", int),
+        "superseded": Filter("superseded_by", "set", boolean),
+    }
+
+    # `?dry_run=1` previews the upload without saving it (see `jobs.DryRun`)
+    preview = staticmethod(preview)
@@ -1,6 +1,5 @@
-import json
 from rest_framework import serializers, viewsets
-from api.viewsets import ProjectionsAndFilters
+from api.viewsets import Filter, ProjectionsAndFilters, boolean
 from core.models import Color
 
 
@@ -49,11 +48,11 @@ class Viewset(ProjectionsAndFilters):
     ordering_fields = "__all__"
 
     filters = {
-        "name": lambda q, v, _: q.filter(name__icontains=v),
-        "is_primary": lambda q, v, _: q.filter(is_primary=json.loads(v)),
-        "red": lambda q, v, _: q.filter(red=v),
-        "green": lambda q, v, _: q.filter(green=v),
-        "blue": lambda q, v, _: q.filter(blue=v),
+        "name": Filter("name", "contains"),
+        "is_primary": Filter("is_primary", type=boolean),
+        "red": Filter("red", type=int),
+        "green": Filter("green", type=int),
+        "blue": Filter("blue", type=int),
     }
 
     def list(self, request, *args, **kwargs):
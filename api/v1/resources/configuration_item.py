@@ -0,0 +1,192 @@
+from rest_framework import serializers
+from rest_framework.decorators import action
+from rest_framework.response import Response
+from core.models import ConfigurationItem, ConfigurationItemClosure, ProgramInventory
+from api.viewsets import Filter, ProjectionsAndFilters, checked, choice, date
+from api import dashboard
+
+
+class Serializers:
+    class Summary(serializers.ModelSerializer):
+        class Meta:
+            model = ConfigurationItem
+            fields = [
+                "id",
+                "name",
+            ]
+
+    class Detail(serializers.ModelSerializer):
+        program_inventory = serializers.FloatField(read_only=True)
+        late_to_need = serializers.CharField(read_only=True)
+
+        class Meta:
+            model = ConfigurationItem
+            fields = [
+                "id",
+                "wbs_element",
+                "name",
+                "configuration_type",
+                "get_configuration_type_display",
+                "nomenclature",
+                "req_qty",
+                "req_date",
+                "net_order",
+                "replenishment",
+                "po_delivery",
+                "parent",
+                "parents",
+                "upload",
+                "program_inventory",
+                "late_to_need",
+            ]
+
+        chain_queryset = lambda q, r: q.with_program_inventory().prefetch_related("parents")
+
+    # annotated by `ConfigurationItem.objects.with_kit_readiness()`
+    class KitReadiness(serializers.ModelSerializer):
+        parent_count = serializers.IntegerField(read_only=True)
+        child_count = serializers.IntegerField(read_only=True)
+        on_hand_count = serializers.IntegerField(read_only=True)
+        kit_ready_percentage = serializers.FloatField(read_only=True)
+
+        class Meta:
+            model = ConfigurationItem
+            fields = [
+                "id",
+                "wbs_element",
+                "name",
+                "configuration_type",
+                "get_configuration_type_display",
+                "nomenclature",
+                "replenishment",
+                "parent_count",
+                "child_count",
+                "on_hand_count",
+                "kit_ready_percentage",
+            ]
+
+        chain_queryset = lambda q, r: q.with_kit_readiness()
+
+    # nested under `wbs_element.Serializers.Detail`
+    class WithWbsElement(serializers.ModelSerializer):
+        child_count = serializers.IntegerField(read_only=True)
+        on_hand_count = serializers.IntegerField(read_only=True)
+        kit_ready_percentage = serializers.FloatField(read_only=True)
+        program_inventory = serializers.FloatField(read_only=True)
+
+        class Meta:
+            model = ConfigurationItem
+            fields = [
+                "id",
+                "name",
+                "configuration_type",
+                "nomenclature",
+                "req_qty",
+                "req_date",
+                "net_order",
+                "replenishment",
+                "po_delivery",
+                "parent",
+                "parents",
+                "child_count",
+                "on_hand_count",
+                "kit_ready_percentage",
+                "program_inventory",
+            ]
+
+    for_ = {
+        "summary": Summary,
+        "detail": Detail,
+        "kit_readiness": KitReadiness,
+    }
+
+
+MAX_DEPTH = Filter("max_depth", type=int)
+ANCESTORS_OF = Filter("descendant_links__descendant_id", type=int)
+DESCENDANTS_OF = Filter("ancestor_links__ancestor_id", type=int)
+LATE_TO_NEED = Filter("late_to_need", type=choice(ConfigurationItem.LTN, ConfigurationItem.ON_TIME, "n/a"))
+
+
+def max_depth(request):
+    value = request.query_params.get("max_depth")
+    return 2**31 - 1 if value is None else MAX_DEPTH.parse(value)
+
+
+def kit_readiness(filter):
+    return lambda q, v, r: filter(q.with_kit_readiness(), v, r)
+
+
+# annotations of `ConfigurationItem.objects.with_kit_readiness()`
+KIT_READINESS = {"parent_count", "child_count", "on_hand_count", "kit_ready_percentage"}
+
+
+def orders_by_kit_readiness(request):
+    ordering = request.query_params.get("ordering", "")
+    return any(field.strip().lstrip("-") in KIT_READINESS for field in ordering.split(","))
+
+
+def late_to_need(q, value, request):
+    value = LATE_TO_NEED.parse(value)
+    if value == "n/a":
+        return q.filter(late_to_need__isnull=True)
+    return q.filter(late_to_need=value)
+
+
+def late_to_need_totals(rows, key):
+    totals = {}
+    for row in rows:
+        counts = totals.setdefault(row[key], {"id": row[key], "LTN": 0, "ON TIME": 0, "n/a": 0})
+        counts["LTN"] += row["ltn"]
+        counts["ON TIME"] += row["on_time"]
+        counts["n/a"] += row["na"]
+    return list(totals.values())
+
+
+class Viewset(ProjectionsAndFilters):
+    queryset = ConfigurationItem.objects.with_late_to_need()
+    serializers = Serializers
+    serializer_class = Serializers.Summary
+    # any model field or annotation, e.g. `?ordering=-late_to_need` or `?ordering=kit_ready_percentage`
+    ordering_fields = "__all__"
+    cache_dependencies = [ProgramInventory, ConfigurationItemClosure]
+
+    filters = {
+        "wbs_element": Filter("wbs_element_id", type=int),
+        "name": Filter("name", "prefix"),
+        "configuration_type": Filter("configuration_type", "in", int),
+        "parent": Filter("parent_id", type=int),
+        "req_date": Filter("req_date", "range", date),
+        "po_delivery": Filter("po_delivery", "range", date),
+        "kit_ready_min": kit_readiness(Filter("kit_ready_percentage__gte", type=float)),
+        "kit_ready_max": kit_readiness(Filter("kit_ready_percentage__lte", type=float)),
+        # BOM ancestry from `ConfigurationItemClosure`, optionally limited to `max_depth` levels
+        "ancestors_of": lambda q, v, r: q.filter(**ANCESTORS_OF.lookups(v), descendant_links__depth__lte=max_depth(r)),
+        "descendants_of": lambda q, v, r: q.filter(**DESCENDANTS_OF.lookups(v), ancestor_links__depth__lte=max_depth(r)),
+        "max_depth": checked(MAX_DEPTH),
+        # "LTN", "ON TIME" or "n/a"
+        "late_to_need": late_to_need,
+    }
+
+    def get_queryset(self):
+        q = super().get_queryset()
+        # `OrderingFilter` ignores fields the queryset does not have
+        if orders_by_kit_readiness(self.request):
+            q = q.with_kit_readiness()
+        return q
+
+    def perform_destroy(self, instance):
+        # configuration items send no delete signal (see `api.dashboard`)
+        programs = dashboard.programs(ConfigurationItem, [instance.pk])
+        super().perform_destroy(instance)
+        dashboard.invalidate(*programs)
+
+    @action(detail=False)
+    def late_to_need_counts(self, request):
+        rows = list(self.filter_queryset(self.get_queryset()).late_to_need_counts())
+        return Response(
+            {
+                "programs": late_to_need_totals(rows, "wbs_element__group_wbs__program_id"),
+                "group_wbs": late_to_need_totals(rows, "wbs_element__group_wbs_id"),
+                "wbs_elements": late_to_need_totals(rows, "wbs_element_id"),
+            }
+        )
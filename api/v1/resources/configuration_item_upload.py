@@ -0,0 +1,290 @@
+from django.conf import settings
+from django.db import transaction
+from rest_framework import serializers
+from api.viewsets import Filter, ProjectionsAndFilters, boolean
+from api.uploads.reader import read_chunks, check_columns, check_choices, parse_dates, parse_numbers, parse_integers, map_choices, as_tuples
+from api.uploads.diff import bulk_batch_size
+from api.uploads.resolver import Resolver, validate, param_batches
+from api.uploads import closure, history, jobs
+from api import dashboard, versions
+from core.models import ConfigurationItem, ConfigurationItemUpload, WbsElement, fingerprint
+import itertools
+import numpy as np
+
+ConfigurationItemParent = ConfigurationItem.parents.through
+
+
+# Columns of the indented BOM export, mapped to `ConfigurationItem` fields.
+# "Level" gives each line's depth in the tree (".1", "..2", ... or 1, 2, ...).
+COLUMNS = {
+    "WBS Element": "wbs_element_id",
+    "Material": "name",
+    "Item Type": "configuration_type",
+    "Material Description": "nomenclature",
+    "Req Qty": "req_qty",
+    "Req Date": "req_date",
+    "Net Order": "net_order",
+    "Replenishment": "replenishment",
+    "PO Delivery": "po_delivery",
+}
+
+# Columns a file must have; the others are blank when missing
+REQUIRED = ["Level", *(column for column in COLUMNS if column != "Material Description")]
+
+# Fields of the `unique_configuration_item` constraint
+KEY = ["wbs_element_id", "name", "configuration_type", "net_order", "replenishment"]
+
+UPDATE_FIELDS = ["nomenclature", "req_qty", "req_date", "po_delivery", "upload"]
+
+
+def normalise(df, wbs_elements):
+    df = df.dropna(subset=["Material"])
+    df["Level"] = parse_integers(df["Level"].str.replace(".", "", regex=False)).fillna(0)
+    df["Material"] = df["Material"].str.strip()
+    df["Item Type"], invalid_types = map_choices(df["Item Type"], ConfigurationItem.ConfigurationTypeChoices)
+    df["Req Qty"] = parse_numbers(df["Req Qty"])
+    df["Req Date"] = parse_dates(df["Req Date"])
+    df["PO Delivery"] = parse_dates(df["PO Delivery"])
+    df[["Net Order", "Replenishment"]] = df[["Net Order", "Replenishment"]].fillna("")
+
+    names = df["WBS Element"].str.strip()
+    df["WBS Element"] = names.map(wbs_elements.resolve(names.dropna().unique())).astype("Int64")
+
+    return df.rename(columns=COLUMNS), invalid_types
+
+
+def parent_keys(levels, keys, ancestors):
+    '''
+    Returns the key of each line's parent: the nearest previous line one
+    level up. Lines whose parent is in an earlier batch fall back to
+    `ancestors`, the last key read at each level, which is then updated
+    for the next batch.
+
+    Parents are found one level at a time with `searchsorted` over the
+    positions of the lines one level up, rather than with a per-line stack.
+    '''
+
+    positions = np.arange(len(levels))
+    parent_positions = np.full(len(levels), -1)
+
+    for level in np.unique(levels):
+        candidates = positions[levels == level - 1]
+        rows = positions[levels == level]
+        if len(candidates):
+            i = np.searchsorted(candidates, rows) - 1
+            parent_positions[rows] = np.where(i >= 0, candidates[np.maximum(i, 0)], -1)
+
+    parents = [keys[position] if position >= 0 else ancestors.get(level - 1) for position, level in zip(parent_positions, levels)]
+
+    for level in np.unique(levels):
+        ancestors[level] = keys[positions[levels == level][-1]]
+
+    return parents
+
+
+def ingest(upload, chunksize=None):
+    '''
+    Loads the program's BOM from `upload.data_file`, one batch of lines
+    at a time, in a single transaction.
+
+    Items are keyed on `unique_configuration_item`: new ones are
+    bulk-created and existing ones bulk-updated. The parent/child edges
+    are written straight into the `parents` through table. The first
+    time this upload touches an existing item, its old parent edges are
+    dropped, so the file replaces the BOM of every WBS element it lists.
+    Items of those WBS elements missing from the file are deleted, the
+    `parent` of the remaining ones is resolved, and their ancestry is
+    rebuilt (see `api.uploads.closure`).
+
+    The same file as the program's last BOM upload is skipped while the
+    program's BOM is still as that upload left it (see `fingerprints` and
+    `api.uploads.history`).
+    '''
+
+    chunksize = chunksize or settings.UPLOAD_CHUNK_SIZE
+
+    with jobs.stage(upload, "checksum"):
+        previous = history.previous(upload, ConfigurationItemUpload.objects.filter(program_id=upload.program_id))
+        unchanged = history.unchanged(upload, previous, fingerprints(upload.program_id))
+    if unchanged:
+        return
+
+    wbs_elements = Resolver(WbsElement, "name", queryset=WbsElement.objects.filter(group_wbs__program_id=upload.program_id))
+    ancestors = {}
+    covered = set()
+    added = 0
+
+    with transaction.atomic():
+        # ################################################################################
+        # Add and update items and their parent edges, one batch at a time
+        with jobs.stage(upload, "load"):
+            check_columns(upload.data_file, REQUIRED)
+            for chunk in read_chunks(upload.data_file, chunksize):
+                df, invalid_types = normalise(chunk, wbs_elements)
+
+                check_choices("Item Type", invalid_types, "item type")
+                validate(wbs_elements)
+
+                keys = as_tuples(df, KEY)
+                parents = parent_keys(df["Level"].to_numpy(dtype=int), keys, ancestors)
+                added += load_items(upload, df, keys, parents)
+                covered.update(key[0] for key in keys)
+
+                upload.update_job(rows_read=upload.rows_read + len(chunk), rows_added=added)
+
+        # ################################################################################
+        # Delete items no longer in the BOM
+        with jobs.stage(upload, "delete"):
+            _, deleted = ConfigurationItem.objects.filter(wbs_element_id__in=covered).exclude(upload=upload).delete()
+            upload.update_job(rows_deleted=deleted.get(ConfigurationItem._meta.label, 0))
+
+        # ################################################################################
+        # Resolve the parent of each item in the file
+        with jobs.stage(upload, "parent"):
+            ConfigurationItem.objects.filter(upload=upload).resolve_parents()
+
+        # ################################################################################
+        # Rebuild the ancestry of the items in the file and below them
+        with jobs.stage(upload, "closure"):
+            closure.rebuild(ConfigurationItem.objects.filter(upload=upload))
+
+        dashboard.invalidate(upload.program_id)
+        versions.bump(ConfigurationItem.parents.through, *versions.dependents(ConfigurationItem))
+
+        # ################################################################################
+        # Record the BOM as it stands, to tell whether it changed before the next upload
+        with jobs.stage(upload, "manifest"):
+            manifest = fingerprints(upload.program_id)
+
+    history.supersede(previous, upload, manifest)
+
+
+def fingerprints(program_id):
+    '''
+    Sorted fingerprints of the program's BOM as stored: one per item
+    (with its id and resolved `parent`) and one per parent edge, so any
+    change to the items or the tree changes them.
+    '''
+
+    items = ConfigurationItem.objects.filter(wbs_element__group_wbs__program_id=program_id)
+    edges = ConfigurationItemParent.objects.filter(from_configurationitem__in=items)
+
+    rows = itertools.chain(
+        items.values_list("pk", "parent_id", *COLUMNS.values()).iterator(chunk_size=settings.UPLOAD_CHUNK_SIZE),
+        edges.values_list("from_configurationitem_id", "to_configurationitem_id").iterator(chunk_size=settings.UPLOAD_CHUNK_SIZE),
+    )
+    return np.unique(np.fromiter((fingerprint(row) for row in rows), dtype="S32"))
+
+
+def load_items(upload, df, keys, parents):
+    # an item listed more than once (under several parents) keeps its last line
+    rows = {key: dict(zip(COLUMNS.values(), row)) for key, row in zip(keys, as_tuples(df, COLUMNS.values()))}
+    existing = fetch_items(set(rows) | set(filter(None, parents)))
+
+    # replace the parent edges of items loaded by an earlier upload
+    replaced = [pk for key, (pk, upload_id) in existing.items() if key in rows and upload_id != upload.pk]
+    for batch in param_batches(replaced):
+        ConfigurationItemParent.objects.filter(from_configurationitem_id__in=batch).delete()
+
+    fields = [*COLUMNS.values(), "upload"]
+    new_items = [ConfigurationItem(upload=upload, **row) for key, row in rows.items() if key not in existing]
+    changed_items = [ConfigurationItem(pk=existing[key][0], upload=upload, **row) for key, row in rows.items() if key in existing]
+    ConfigurationItem.objects.bulk_create(new_items, batch_size=bulk_batch_size(fields))
+    ConfigurationItem.objects.bulk_update(changed_items, UPDATE_FIELDS, batch_size=bulk_batch_size(fields))
+
+    pks = {key: pk for key, (pk, _) in existing.items()}
+    pks.update({key: pk for key, (pk, _) in fetch_items([item_key for item_key in rows if item_key not in existing]).items()})
+
+    edges = {(pks[child], pks[parent]) for child, parent in zip(keys, parents) if parent in pks}
+    ConfigurationItemParent.objects.bulk_create(
+        [ConfigurationItemParent(from_configurationitem_id=child, to_configurationitem_id=parent) for child, parent in edges],
+        batch_size=bulk_batch_size(["from_configurationitem_id", "to_configurationitem_id"]),
+        ignore_conflicts=True,
+    )
+
+    return len(new_items)
+
+
+def fetch_items(keys):
+    '''
+    Returns `{key: (pk, upload_id)}` for the existing items among `keys`.
+    '''
+
+    keys = set(keys)
+    wbs_element_ids = {key[0] for key in keys}
+    items = {}
+
+    for names in param_batches({key[1] for key in keys}):
+        rows = ConfigurationItem.objects.filter(wbs_element_id__in=wbs_element_ids, name__in=names).values_list("pk", "upload_id", *KEY)
+        for pk, upload_id, *key in rows:
+            if tuple(key) in keys:
+                items[tuple(key)] = (pk, upload_id)
+
+    return items
+
+
+class Serializers:
+    class Summary(serializers.ModelSerializer):
+        class Meta:
+            model = ConfigurationItemUpload
+            fields = [
+                "id",
+                "data_file",
+            ]
+
+    class Detail(serializers.ModelSerializer):
+        class Meta:
+            model = ConfigurationItemUpload
+            fields = [
+                "id",
+                "program",
+                "data_file",
+                "created",
+                *jobs.JOB_FIELDS,
+                "checksum",
+                "superseded_by",
+            ]
+
+    Status = jobs.status_serializer(ConfigurationItemUpload)
+
+    class Create(jobs.CreateUpload):
+        columns = REQUIRED
+        ingest = staticmethod(ingest)
+
+        class Meta:
+            model = ConfigurationItemUpload
+            fields = [
+                "id",
+                "program",
+                "data_file",
+                "status",
+            ]
+            read_only_fields = ["status"]
+
+    for_ = {
+        "summary": Summary,
+        "detail": Detail,
+        "status": Status,
+        "POST": Create,
+    }
+
+
+class Viewset(jobs.StageSummary, ProjectionsAndFilters):
+    queryset = ConfigurationItemUpload.objects.all()
+    # job progress is written with `update_job`, which sends no signals
+    cache_responses = False
+    serializers = Serializers
+    serializer_class = Serializers.Detail
+
+    filters = {
+        "program": Filter("program_id", type=int),
+        "status": Filter("status", "in", int),
+        "superseded": Filter("superseded_by", "set", boolean),
+    }
+
+    def create(self, request, *args, **kwargs):
+        # BOM uploads are applied in one pass, so there is no separate diff to preview
+        if Filter("dry_run", type=boolean).parse(request.query_params.get("dry_run", "false")):
+            raise serializers.ValidationError({"dry_run": ["Dry runs are not supported for BOM uploads."]})
+
+        return super().create(request, *args, **kwargs)
@@ -1,6 +1,6 @@
 from rest_framework import serializers
 from core.models import GroupWbs
-from api.viewsets import ProjectionsAndFilters
+from api.viewsets import Filter, ProjectionsAndFilters
 
 
 class Serializers:
@@ -39,5 +39,5 @@ class Viewset(ProjectionsAndFilters):
     ordering = ["name"]
 
     filters = {
-        "name": lambda q, v, _: q.filter(name__icontains=v),
+        "name": Filter("name", "contains"),
     }
@@ -0,0 +1,62 @@
+from rest_framework import serializers
+from core.models import InventoryItem
+from api.viewsets import Filter, ProjectionsAndFilters, date
+
+
+class Serializers:
+    class Summary(serializers.ModelSerializer):
+        class Meta:
+            model = InventoryItem
+            fields = [
+                "id",
+                "material_master",
+                "plant",
+                "on_hand_inventory",
+            ]
+
+    class Detail(serializers.ModelSerializer):
+        class Meta:
+            model = InventoryItem
+            fields = [
+                "id",
+                "material_master",
+                "plant",
+                "storage_location",
+                "material_type",
+                "get_material_type_display",
+                "wbs",
+                "batch",
+                "lot_date_code",
+                "base_unit_of_measure",
+                "unrestricted_inventory",
+                "qm_lot_inventory",
+                "restricted_inventory",
+                "blocked_inventory",
+                "shelf_life_expiration_date",
+                "discard_date",
+                "on_hand_inventory",
+                "program_group_wbs",
+                "upload",
+            ]
+
+    for_ = {
+        "summary": Summary,
+        "detail": Detail,
+    }
+
+
+class Viewset(ProjectionsAndFilters):
+    queryset = InventoryItem.objects.all()
+    serializers = Serializers
+    serializer_class = Serializers.Summary
+
+    ordering = ["material_master"]
+
+    filters = {
+        "material_master": Filter("material_master_id", "prefix"),
+        "plant": Filter("plant"),
+        "wbs": Filter("wbs", "prefix"),
+        "program_group_wbs": Filter("program_group_wbs_id", type=int),
+        "material_type": Filter("material_type", "in", int),
+        "shelf_life_expiration_date": Filter("shelf_life_expiration_date", "range", date),
+    }
@@ -0,0 +1,303 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Sum
+from rest_framework import serializers
+from api.viewsets import Filter, ProjectionsAndFilters, boolean
+from api.uploads.reader import read_chunks, check_choices, check_columns, fill_blanks, parse_dates, parse_numbers, map_choices, as_tuples
+from api.uploads.diff import Staging, bulk_batch_size, dry_run
+from api.uploads.resolver import Resolver, param_batches, validate
+from api.uploads.snapshots import Snapshot
+from api.uploads import history, jobs, snapshots
+from api import dashboard, search, versions
+from core.models import GroupWbs, InventoryItem, InventoryUpload, MaterialMaster, ProgramInventory
+
+
+# Columns of the SAP inventory extract, mapped to `InventoryItem` fields
+# in the order they are fingerprinted. The last two are computed.
+COLUMNS = {
+    "Material": "material_master_id",
+    "Plnt": "plant",
+    "SLoc": "storage_location",
+    "Matl Type": "material_type",
+    "WBS Element": "wbs",
+    "Batch": "batch",
+    "Lot Date Code": "lot_date_code",
+    "BUn": "base_unit_of_measure",
+    "Unrestricted": "unrestricted_inventory",
+    "In Quality Insp.": "qm_lot_inventory",
+    "Restricted-Use": "restricted_inventory",
+    "Blocked": "blocked_inventory",
+    "SLED/BBD": "shelf_life_expiration_date",
+    "Discard Date": "discard_date",
+    "On Hand": "on_hand_inventory",
+    "Group WBS": "program_group_wbs_id",
+}
+
+# position of the group WBS in the staged rows
+GROUP_WBS = list(COLUMNS).index("Group WBS")
+
+QUANTITIES = ["Unrestricted", "In Quality Insp.", "Restricted-Use", "Blocked"]
+
+# Columns a file must have; the others are blank when missing
+REQUIRED = ["Material", "Matl Type", "WBS Element", *QUANTITIES, "SLED/BBD", "Discard Date"]
+
+# Values of the blank cells of NOT NULL text columns
+FILL_VALUES = {
+    "Plnt": "",
+    "SLoc": "",
+    "Batch": "",
+    "BUn": "",
+}
+
+# Inventory WBS elements start with the Y-Group of their `GroupWbs`
+Y_GROUP = r"^(Y-[A-Z0-9]{5}-[A-Z]{2})"
+
+
+def normalise(df, group_wbs, invalid_types):
+    df = fill_blanks(df.dropna(subset=["Material"]), FILL_VALUES)
+    df["Material"] = df["Material"].str.strip()
+    df["Matl Type"], invalid = map_choices(df["Matl Type"], InventoryItem.InventoryTypeChoices)
+    invalid_types.update(invalid)
+    df["SLED/BBD"] = parse_dates(df["SLED/BBD"])
+    df["Discard Date"] = parse_dates(df["Discard Date"])
+
+    for column in QUANTITIES:
+        df[column] = parse_numbers(df[column])
+    df["On Hand"] = df[QUANTITIES].fillna(0).sum(axis=1)
+
+    y_groups = df["WBS Element"].str.strip().str.extract(Y_GROUP, expand=False)
+    df["Group WBS"] = y_groups.map(group_wbs.resolve(y_groups.dropna().unique())).astype("Int64")
+
+    return df
+
+
+def read_file(upload, chunksize):
+    # the material types are checked once the whole file is read
+    check_columns(upload.data_file, REQUIRED)
+    group_wbs = Resolver(GroupWbs, "name")
+    invalid_types = set()
+    for chunk in read_chunks(upload.data_file, chunksize):
+        yield normalise(chunk, group_wbs, invalid_types)
+    check_choices("Matl Type", invalid_types, "material type")
+
+
+def parse(upload, chunksize=None):
+    '''
+    Records the snapshot of `upload.data_file` ahead of `ingest` (see
+    `api.uploads.snapshots.parse`). Batch ingests run this in a process
+    pool (see `api.uploads.batch`).
+    '''
+
+    snapshots.parse(upload, read_file(upload, chunksize or settings.UPLOAD_CHUNK_SIZE), COLUMNS.keys())
+
+
+def stage_file(upload, staging, chunksize):
+    '''
+    Stages `upload.data_file` one batch at a time and checks that its
+    materials and material types exist. Later runs read the normalised
+    rows back from the file's snapshot (see `api.uploads.snapshots`).
+    '''
+
+    materials = Resolver(MaterialMaster, "name")
+
+    with Snapshot(upload) as snapshot:
+        for df in snapshot.read(read_file(upload, chunksize), COLUMNS.keys()):
+            materials.resolve(df["Material"].dropna().unique())
+            staging.stage(as_tuples(df, COLUMNS.keys()))
+            upload.update_job(rows_read=upload.rows_read + len(df))
+
+        validate(materials)
+
+
+def ingest(upload, chunksize=None):
+    '''
+    Replaces the sector's inventory snapshot with `upload.data_file`.
+
+    On-hand inventory is the sum of the unrestricted, QM-lot, restricted
+    and blocked quantities, and each row's WBS is mapped to its program's
+    `GroupWbs` by Y-Group. Unchanged rows are kept; the diff is done on
+    fingerprints like the alt/sub upload (see `api.uploads.diff`), only
+    stages the rows missing from the database, and is skipped when the
+    file and the rows still match the sector's last upload (see
+    `api.uploads.history`). When the inventory
+    changed, the `ProgramInventory` rollup and the part search (see
+    `api.search`) are updated in the same transaction.
+    '''
+
+    chunksize = chunksize or settings.UPLOAD_CHUNK_SIZE
+    inventory_items = InventoryItem.objects.filter(upload__sector_id=upload.sector_id)
+
+    with jobs.stage(upload, "checksum"):
+        previous = history.previous(upload, InventoryUpload.objects.filter(sector_id=upload.sector_id))
+        current = history.fingerprints(inventory_items)
+        unchanged = history.unchanged(upload, previous, current)
+    if unchanged:
+        return
+
+    staging = Staging(known=current)
+
+    try:
+        # ################################################################################
+        # Staging the file upload, one batch at a time
+        with jobs.stage(upload, "stage"):
+            stage_file(upload, staging, chunksize)
+
+        with transaction.atomic():
+            # ################################################################################
+            # Delete items from database
+            with jobs.stage(upload, "delete"):
+                stale = staging.deletions(inventory_items)
+                parts = set(stale.values_list("material_master_id", flat=True).distinct())
+                group_wbs = set(stale.values_list("program_group_wbs_id", flat=True).distinct())
+                deleted, _ = stale.delete()
+                upload.update_job(rows_deleted=deleted)
+
+            # ################################################################################
+            # Add items to database
+            with jobs.stage(upload, "add"):
+                added = 0
+                for staged_rows in staging.additions(inventory_items, chunksize):
+                    add_items(upload, staged_rows)
+                    parts.update(staged.data[0] for staged in staged_rows)
+                    group_wbs.update(staged.data[GROUP_WBS] for staged in staged_rows)
+                    added += len(staged_rows)
+                    upload.update_job(rows_added=added)
+
+            # ################################################################################
+            # Rebuild the program inventory rollup of the group WBS added or deleted
+            if deleted or added:
+                with jobs.stage(upload, "rollup"):
+                    programs = rebuild_program_inventory(group_wbs)
+                dashboard.invalidate(upload.sector_id, *programs)
+                versions.bump(InventoryItem, ProgramInventory)
+
+            # ################################################################################
+            # Refresh the part search of the materials added or deleted
+            with jobs.stage(upload, "search"):
+                search.refresh(parts)
+
+        history.supersede(previous, upload, staging.fingerprints)
+
+    finally:
+        staging.clear()
+
+
+def preview(upload, page=1):
+    '''
+    Dry run of `ingest` for an unsaved `upload`: the rows it would add and
+    delete, without writing anything.
+    '''
+
+    with dry_run():
+        staging = Staging()
+        stage_file(upload, staging, settings.UPLOAD_CHUNK_SIZE)
+        inventory_items = InventoryItem.objects.filter(upload__sector_id=upload.sector_id)
+        return staging.preview(inventory_items, list(COLUMNS.keys()), list(COLUMNS.values()), page)
+
+
+def add_items(upload, staged_rows):
+    new_inventory_items = [
+        InventoryItem(
+            upload=upload,
+            fingerprint=staged.fingerprint,
+            **dict(zip(COLUMNS.values(), staged.data)),
+        )
+        for staged in staged_rows
+    ]
+
+    InventoryItem.objects.bulk_create(new_inventory_items, batch_size=bulk_batch_size([*COLUMNS.values(), "upload", "fingerprint"]))
+
+
+def rebuild_program_inventory(group_wbs):
+    '''
+    Replaces the `ProgramInventory` rows of the `group_wbs` ids with the
+    on-hand inventory of each of their materials, summed in one grouped
+    query per batch of ids. The rows of other group WBS are left alone.
+    Returns the programs of the group WBS.
+    '''
+
+    group_wbs = [group for group in group_wbs if group is not None]
+    programs = set()
+
+    for batch in param_batches(group_wbs):
+        totals = (
+            InventoryItem.objects.filter(program_group_wbs_id__in=batch)
+            .values_list("program_group_wbs_id", "material_master_id")
+            .annotate(Sum("on_hand_inventory"))
+            .order_by()
+        )
+
+        ProgramInventory.objects.filter(group_wbs_id__in=batch).delete()
+        ProgramInventory.objects.bulk_create(
+            [ProgramInventory(group_wbs_id=group, material_master_id=material, on_hand_inventory=on_hand) for group, material, on_hand in totals.iterator()],
+            batch_size=bulk_batch_size(["group_wbs", "material_master", "on_hand_inventory"]),
+        )
+        programs.update(GroupWbs.objects.filter(pk__in=batch).values_list("program_id", flat=True))
+
+    return programs
+
+
+class Serializers:
+    class Summary(serializers.ModelSerializer):
+        class Meta:
+            model = InventoryUpload
+            fields = [
+                "id",
+                "data_file",
+            ]
+
+    class Detail(serializers.ModelSerializer):
+        class Meta:
+            model = InventoryUpload
+            fields = [
+                "id",
+                "sector",
+                "data_file",
+                "created",
+                "uploaded_by",
+                *jobs.JOB_FIELDS,
+                "checksum",
+                "superseded_by",
+            ]
+
+    Status = jobs.status_serializer(InventoryUpload)
+
+    class Create(jobs.CreateUpload):
+        uploaded_by = serializers.HiddenField(default=serializers.CurrentUserDefault())
+        columns = REQUIRED
+        ingest = staticmethod(ingest)
+
+        class Meta:
+            model = InventoryUpload
+            fields = [
+                "id",
+                "sector",
+                "data_file",
+                "uploaded_by",
+                "status",
+            ]
+            read_only_fields = ["status"]
+
+    for_ = {
+        "summary": Summary,
+        "detail": Detail,
+        "status": Status,
+        "POST": Create,
+    }
+
+
+class Viewset(jobs.DryRun, jobs.StageSummary, ProjectionsAndFilters):
+    queryset = InventoryUpload.objects.all()
+    # job progress is written with `update_job`, which sends no signals
+    cache_responses = False
+    serializers = Serializers
+    serializer_class = Serializers.Detail
+
+    filters = {
+        "sector": Filter("sector_id", type=int),
+        "status": Filter("status", "in", int),
+        "superseded": Filter("superseded_by", "set", boolean),
+    }
+
+    # `?dry_run=1` previews the upload without saving it (see `jobs.DryRun`)
+    preview = staticmethod(preview)
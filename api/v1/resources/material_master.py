@@ -0,0 +1,77 @@
+from rest_framework import serializers
+from rest_framework.decorators import action
+from rest_framework.response import Response
+from core.models import AltSub, InventoryItem, MaterialMaster
+from api.viewsets import Filter, ProjectionsAndFilters, checked
+from api import search
+
+
+class Serializers:
+    class Summary(serializers.ModelSerializer):
+        class Meta:
+            model = MaterialMaster
+            fields = [
+                "id",
+                "name",
+                "nomenclature",
+            ]
+
+    class Detail(serializers.ModelSerializer):
+        class Meta:
+            model = MaterialMaster
+            fields = [
+                "id",
+                "name",
+                "nomenclature",
+                "plant",
+                "material_type",
+                "get_material_type_display",
+                "base_unit_of_measure",
+                "procurement_type",
+                "goods_receipt_time",
+                "planned_delivery_time",
+                "storage_condition",
+                "base_drawing",
+                "electrical_flag",
+                "upload",
+            ]
+
+    for_ = {
+        "summary": Summary,
+        "detail": Detail,
+    }
+
+
+LIMIT = Filter("limit", type=int)
+
+
+class Viewset(ProjectionsAndFilters):
+    queryset = MaterialMaster.objects.all()
+    serializers = Serializers
+    serializer_class = Serializers.Summary
+
+    ordering = ["name"]
+    # the part search of `?q=` also indexes inventory and alt/subs
+    cache_dependencies = [InventoryItem, AltSub]
+
+    filters = {
+        "name": Filter("name", "prefix"),
+        "nomenclature": Filter("nomenclature", "contains"),
+        "plant": Filter("plant"),
+        "material_type": Filter("material_type", "in", int),
+        # part search over names, nomenclature, drawings and linked parts (see `api.search`)
+        "q": lambda q, v, _: search.filter(q, v),
+        # the `search` action reads it; the permission check builds the queryset first
+        "limit": checked(LIMIT),
+    }
+
+    # the `limit` best matches of `?q=`, ranked
+    @action(detail=False)
+    def search(self, request):
+        text = request.query_params.get("q", "").strip()
+        if not text:
+            raise serializers.ValidationError({"q": ["This parameter is required."]})
+        limit = max(1, min(LIMIT.parse(request.query_params.get("limit", "50")), 500))
+
+        fields = ["id", "name", "nomenclature", "base_drawing", "score"]
+        return Response([dict(zip(fields, row)) for row in search.search(text, limit)])
@@ -0,0 +1,244 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models.fields.json import KeyTextTransform
+from rest_framework import serializers
+from api.viewsets import Filter, ProjectionsAndFilters, boolean
+from api.uploads.reader import read_chunks, check_choices, check_columns, fill_blanks, parse_integers, map_choices, as_tuples
+from api.uploads.diff import Staging, bulk_batch_size, dry_run
+from api.uploads.resolver import Resolver
+from api.uploads.snapshots import Snapshot
+from api.uploads import history, jobs, snapshots
+from api import search, versions
+from core.models import MaterialMaster, MaterialMasterUpload
+
+
+# Columns of the SAP material master export, mapped to `MaterialMaster` fields
+# in the order they are fingerprinted
+COLUMNS = {
+    "Material": "name",
+    "Material Description": "nomenclature",
+    "Plnt": "plant",
+    "Matl Type": "material_type",
+    "Base Unit of Measure": "base_unit_of_measure",
+    "Procurement Type": "procurement_type",
+    "GR Processing Time": "goods_receipt_time",
+    "Planned Deliv. Time": "planned_delivery_time",
+    "Storage conditions": "storage_condition",
+    "Base Drawing": "base_drawing",
+    "Electrical Flag": "electrical_flag",
+}
+
+# Columns a file must have; the others are blank when missing
+REQUIRED = ["Material", "Matl Type", "GR Processing Time", "Planned Deliv. Time"]
+
+# Values of the blank cells of NOT NULL text columns
+FILL_VALUES = {
+    "Plnt": "",
+    "Base Unit of Measure": "",
+    "Procurement Type": "",
+}
+
+
+def normalise(df, invalid_types):
+    df = fill_blanks(df.dropna(subset=["Material"]), FILL_VALUES)
+    df["Material"] = df["Material"].str.strip()
+    df["GR Processing Time"] = parse_integers(df["GR Processing Time"])
+    df["Planned Deliv. Time"] = parse_integers(df["Planned Deliv. Time"])
+    df["Matl Type"], invalid = map_choices(df["Matl Type"], MaterialMaster.MaterialMasterTypeChoices)
+    invalid_types.update(invalid)
+    return df
+
+
+def read_file(upload, chunksize):
+    # the material types are checked once the whole file is read
+    check_columns(upload.data_file, REQUIRED)
+    invalid_types = set()
+    for chunk in read_chunks(upload.data_file, chunksize):
+        yield normalise(chunk, invalid_types)
+    check_choices("Matl Type", invalid_types, "material type")
+
+
+def parse(upload, chunksize=None):
+    '''
+    Records the snapshot of `upload.data_file` ahead of `ingest` (see
+    `api.uploads.snapshots.parse`). Batch ingests run this in a process
+    pool (see `api.uploads.batch`).
+    '''
+
+    snapshots.parse(upload, read_file(upload, chunksize or settings.UPLOAD_CHUNK_SIZE), COLUMNS.keys())
+
+
+def stage_file(upload, staging, chunksize):
+    '''
+    Stages `upload.data_file` one batch at a time and checks its
+    material types. Later runs read the normalised rows back from the
+    file's snapshot (see `api.uploads.snapshots`).
+    '''
+
+    with Snapshot(upload) as snapshot:
+        for df in snapshot.read(read_file(upload, chunksize), COLUMNS.keys()):
+            staging.stage(as_tuples(df, COLUMNS.keys()))
+            upload.update_job(rows_read=upload.rows_read + len(df))
+
+
+def ingest(upload, chunksize=None):
+    '''
+    Upserts the material master from `upload.data_file`, keyed on the
+    unique material `name`.
+
+    Rows whose fingerprint already exists are unchanged and never touched.
+    The rest are staged and written in batches: materials that don't exist
+    yet are bulk-created, the others bulk-updated, and their part search
+    refreshed (see `api.search`). Materials missing from the file are
+    kept, since inventory and alt/subs still reference them.
+
+    The material master is shared by every sector, so the file is compared
+    with the last material upload of any sector (see `api.uploads.history`).
+    '''
+
+    chunksize = chunksize or settings.UPLOAD_CHUNK_SIZE
+
+    with jobs.stage(upload, "checksum"):
+        previous = history.previous(upload, MaterialMasterUpload.objects.all())
+        current = history.fingerprints(MaterialMaster.objects.all())
+        # materials are never deleted, so the file only has to still be in the database
+        unchanged = history.unchanged(upload, previous, current, exact=False)
+    if unchanged:
+        return
+
+    staging = Staging(known=current)
+
+    try:
+        # ################################################################################
+        # Staging the file upload, one batch at a time
+        with jobs.stage(upload, "stage"):
+            stage_file(upload, staging, chunksize)
+
+        # ################################################################################
+        # Upsert new and changed items
+        with transaction.atomic():
+            parts = set()
+            with jobs.stage(upload, "upsert"):
+                added = 0
+                for staged_rows in staging.additions(MaterialMaster.objects.all(), chunksize):
+                    added += upsert_items(upload, staged_rows)
+                    parts.update(staged.data[0] for staged in staged_rows)
+                    upload.update_job(rows_added=added)
+
+            # ################################################################################
+            # Refresh the part search of the new and changed materials
+            with jobs.stage(upload, "search"):
+                search.refresh(parts)
+
+            if parts:
+                versions.bump(MaterialMaster)
+
+        history.supersede(previous, upload, staging.fingerprints)
+
+    finally:
+        staging.clear()
+
+
+def preview(upload, page=1):
+    '''
+    Dry run of `ingest` for an unsaved `upload`: the materials it would
+    add or change, without writing anything.
+    '''
+
+    with dry_run():
+        staging = Staging()
+        stage_file(upload, staging, settings.UPLOAD_CHUNK_SIZE)
+        result = staging.preview(MaterialMaster.objects.all(), list(COLUMNS.keys()), list(COLUMNS.values()), page, deletes=False)
+
+        names = staging.pending(MaterialMaster.objects.all()).annotate(name=KeyTextTransform("0", "data"))
+        result["changed"] = names.filter(name__in=MaterialMaster.objects.values("name")).count()
+        result["added"] -= result["changed"]
+        return result
+
+
+def upsert_items(upload, staged_rows):
+    # a material listed more than once keeps its last row
+    rows = {staged.data[0]: staged for staged in staged_rows}
+    existing = Resolver(MaterialMaster, "name").resolve(rows.keys())
+
+    new_items, changed_items = [], []
+    for name, staged in rows.items():
+        item = MaterialMaster(
+            pk=existing.get(name),
+            upload=upload,
+            fingerprint=staged.fingerprint,
+            **dict(zip(COLUMNS.values(), staged.data)),
+        )
+        (changed_items if item.pk else new_items).append(item)
+
+    fields = [*COLUMNS.values(), "upload", "fingerprint"]
+    MaterialMaster.objects.bulk_create(new_items, batch_size=bulk_batch_size(fields))
+    MaterialMaster.objects.bulk_update(changed_items, fields, batch_size=bulk_batch_size(fields))
+
+    return len(rows)
+
+
+class Serializers:
+    class Summary(serializers.ModelSerializer):
+        class Meta:
+            model = MaterialMasterUpload
+            fields = [
+                "id",
+                "data_file",
+            ]
+
+    class Detail(serializers.ModelSerializer):
+        class Meta:
+            model = MaterialMasterUpload
+            fields = [
+                "id",
+                "sector",
+                "data_file",
+                "created",
+                "uploaded_by",
+                *jobs.JOB_FIELDS,
+                "checksum",
+                "superseded_by",
+            ]
+
+    Status = jobs.status_serializer(MaterialMasterUpload)
+
+    class Create(jobs.CreateUpload):
+        uploaded_by = serializers.HiddenField(default=serializers.CurrentUserDefault())
+        columns = REQUIRED
+        ingest = staticmethod(ingest)
+
+        class Meta:
+            model = MaterialMasterUpload
+            fields = [
+                "id",
+                "sector",
+                "data_file",
+                "uploaded_by",
+                "status",
+            ]
+            read_only_fields = ["status"]
+
+    for_ = {
+        "summary": Summary,
+        "detail": Detail,
+        "status": Status,
+        "POST": Create,
+    }
+
+
+class Viewset(jobs.DryRun, jobs.StageSummary, ProjectionsAndFilters):
+    queryset = MaterialMasterUpload.objects.all()
+    # job progress is written with `update_job`, which sends no signals
+    cache_responses = False
+    serializers = Serializers
+    serializer_class = Serializers.Detail
+
+    filters = {
+        "sector": Filter("sector_id", type=int),
+        "status": Filter("status", "in", int),
+        "superseded": Filter("superseded_by", "set", boolean),
+    }
+
+    # `?dry_run=1` previews the upload without saving it (see `jobs.DryRun`)
+    preview = staticmethod(preview)
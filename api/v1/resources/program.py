@@ -1,7 +1,10 @@
 from rest_framework import serializers
+from rest_framework.decorators import action
+from rest_framework.response import Response
 from core.models import Program
 from . import user, group_wbs, program_user
-from api.viewsets import ProjectionsAndFilters
+from api.viewsets import Filter, ProjectionsAndFilters
+from api import dashboard, netting
 from django.contrib.auth import get_user_model
 
 User = get_user_model()
@@ -84,7 +87,17 @@ class Viewset(ProjectionsAndFilters):
     ordering = ["name"]
 
     filters = {
-        "name": lambda q, v, _: q.filter(name__icontains=v),
-        "model_code": lambda q, v, _: q.filter(model_code__icontains=v),
-        "group_wbs": lambda q, v, _: q.filter(group_wbs_set__name__icontains=v),
+        "name": Filter("name", "contains"),
+        "model_code": Filter("model_code", "contains"),
+        "group_wbs": Filter("group_wbs_set__name", "contains"),
     }
+
+    # kit-readiness and late-to-need rollup, cached until the program's BOM or inventory changes (see `api.dashboard`)
+    @action(detail=True)
+    def dashboard(self, request, pk=None):
+        return Response(dashboard.rollup(self.get_object().pk))
+
+    # per material and date, the requirements not covered by stock or substitutes (see `api.netting`)
+    @action(detail=True)
+    def shortages(self, request, pk=None):
+        return Response(netting.records(netting.shortages(self.get_object().pk)))
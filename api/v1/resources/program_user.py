@@ -0,0 +1,47 @@
+from rest_framework import serializers
+from core.models import ProgramUser
+from api.viewsets import Filter, ProjectionsAndFilters
+from . import user
+
+
+class Serializers:
+    class Summary(serializers.ModelSerializer):
+        class Meta:
+            model = ProgramUser
+            fields = [
+                "id",
+                "user",
+                "program",
+            ]
+
+    class Detail(serializers.ModelSerializer):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            self.fields["user"] = user.Serializers.Detail()
+
+        class Meta:
+            model = ProgramUser
+            fields = [
+                "id",
+                "user",
+                "program",
+            ]
+
+        chain_queryset = lambda q, r: q.select_related("user")
+
+    for_ = {
+        "summary": Summary,
+        "detail": Detail,
+        "POST": Summary,
+    }
+
+
+class Viewset(ProjectionsAndFilters):
+    queryset = ProgramUser.objects.all()
+    serializers = Serializers
+    serializer_class = Serializers.Summary
+
+    filters = {
+        "program": Filter("program_id", type=int),
+        "user": Filter("user_id", type=int),
+    }
@@ -1,6 +1,6 @@
 from django.contrib.auth import get_user_model
 from rest_framework import serializers
-from api.viewsets import ProjectionsAndFilters
+from api.viewsets import Filter, ProjectionsAndFilters
 from core.models import Sector
 
 User = get_user_model()
@@ -26,5 +26,5 @@ class Viewset(ProjectionsAndFilters):
     serializers = Serializers
 
     filters = {
-        "name": lambda q, v, _: q.filter(name=v),
+        "name": Filter("name"),
     }
@@ -1,5 +1,5 @@
 from rest_framework import serializers
-from api.viewsets import ProjectionsAndFilters
+from api.viewsets import Filter, ProjectionsAndFilters
 from core.models import Shape
 
 
@@ -24,5 +24,5 @@ class Viewset(ProjectionsAndFilters):
     ordering_fields = ["id", "name"]
 
     filters = {
-        "name": lambda q, v, _: q.filter(name__icontains=v),
+        "name": Filter("name", "contains"),
     }
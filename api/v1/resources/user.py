@@ -1,6 +1,6 @@
 from django.db.models import OuterRef, Value as V, Exists
 from rest_framework import serializers
-from api.viewsets import ProjectionsAndFilters
+from api.viewsets import Filter, ProjectionsAndFilters
 from django.contrib.auth import get_user_model
 from core.models import ProgramUser
 from . import user
@@ -61,17 +61,18 @@ class Viewset(ProjectionsAndFilters):
     serializer_class = Serializers.Summary
     serializers = Serializers
     queryset = User.objects.all()
+    cache_dependencies = [ProgramUser]
     ordering_fields = ["id", "username", "first_name", "last_name", "get_full_name", "get_position_display", "email"]
 
     filters = {
-        "firstName": lambda q, v, _: q.filter(first_name__icontains=v),
-        "lastName": lambda q, v, _: q.filter(last_name__icontains=v),
-        "username": lambda q, v, _: q.filter(username__icontains=v),
+        "firstName": Filter("first_name", "contains"),
+        "lastName": Filter("last_name", "contains"),
+        "username": Filter("username", "contains"),
         # OuterRef is referring to the outer query when in a subquery
         # example below: OuterRef is used in the ProgramUser filter statement to refer to the User 'id' (outer query)
         "available_for_programs": lambda q, v, _: User.objects.filter(
             ~Exists(
-                ProgramUser.objects.filter(user=OuterRef("id")).filter(program=v),
+                ProgramUser.objects.filter(user=OuterRef("id")).filter(program=Filter("program", type=int).parse(v)),
             )
         ),
     }
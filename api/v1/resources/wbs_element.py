@@ -1,8 +1,105 @@
 from telnetlib import DET
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db.models import Prefetch
+from django.http import StreamingHttpResponse
 from rest_framework import serializers
-from core.models import ConfigurationItem, WbsElement
-from api.viewsets import ProjectionsAndFilters
+from core.models import ConfigurationItem, ProgramInventory, WbsElement
+from api.viewsets import Filter, ProjectionsAndFilters
+import json
+import numpy as np
+import pandas as pd
+
+# `ConfigurationItem` fields sent for each node of the BOM tree
+BOM_TREE_COLUMNS = [
+    "id",
+    "name",
+    "configuration_type",
+    "nomenclature",
+    "req_qty",
+    "req_date",
+    "net_order",
+    "replenishment",
+    "po_delivery",
+]
+
+
+def item_chunks(rows, size):
+    '''
+    Lists of about `size` of `rows`, keeping the rows of an item (one per
+    parent) together.
+    '''
+
+    chunk = []
+    for row in rows:
+        if len(chunk) >= size and row[0] != chunk[-1][0]:
+            yield chunk
+            chunk = []
+        chunk.append(row)
+    if chunk:
+        yield chunk
+
+
+def bom_tree(wbs_element, chunk_size=10_000):
+    '''
+    Yields the BOM of `wbs_element` as compact JSON, read with one query
+    and sent `chunk_size` nodes at a time:
+
+        {
+            "id": 12, "name": "...",
+            "chunks": [{"id": [7, 8], "name": ["TOP", "A"], ...}, {"id": [9], "name": ["B"], ...}],
+            "size": 3,
+            "child_offsets": [0, 2, 2, 2],    # children of node i are
+            "children": [1, 2],               # children[child_offsets[i]:child_offsets[i + 1]]
+            "roots": [0]
+        }
+
+    Nodes are in `id` order and referenced by their index in the chunks'
+    columns, concatenated. Parents outside the WBS element are left out,
+    so their children are roots. Only the ids of the nodes and of their
+    parents are kept until the chunks are sent, to build the tree.
+    '''
+
+    rows = ConfigurationItem.objects.filter(wbs_element=wbs_element).order_by("pk").values_list(*BOM_TREE_COLUMNS, "parents")
+    ids, parent_ids = [], []
+
+    yield json.dumps({"id": wbs_element.pk, "name": wbs_element.name})[:-1] + ', "chunks": ['
+    for i, chunk in enumerate(item_chunks(rows.iterator(chunk_size=chunk_size), chunk_size)):
+        # object columns keep nullable integers as integers
+        df = pd.DataFrame(chunk, columns=[*BOM_TREE_COLUMNS, "parent"], dtype=object)
+        ids.append(df["id"].to_numpy(dtype="int64"))
+        parent_ids.append(df["parent"].fillna(-1).to_numpy(dtype="int64"))
+
+        items = df.drop_duplicates("id")
+        columns = {column: items[column].where(items[column].notna(), None).tolist() for column in BOM_TREE_COLUMNS}
+        yield ("," if i else "") + json.dumps(columns, cls=DjangoJSONEncoder)
+
+    ids = np.concatenate(ids) if ids else np.array([], dtype="int64")
+    parent_ids = np.concatenate(parent_ids) if parent_ids else np.array([], dtype="int64")
+
+    index = pd.Index(np.unique(ids))
+    size = len(index)
+
+    parents = index.get_indexer(parent_ids)
+    children = index.get_indexer(ids)[parents >= 0]
+    parents = parents[parents >= 0]
+
+    order = np.argsort(parents, kind="stable")
+    child_offsets = np.concatenate([[0], np.cumsum(np.bincount(parents, minlength=size))])
+    roots = np.flatnonzero(np.bincount(children, minlength=size) == 0)
+
+    def array(values):
+        yield "["
+        for start in range(0, len(values), chunk_size):
+            yield ("," if start else "") + json.dumps(values[start : start + chunk_size])[1:-1]
+        yield "]"
+
+    yield f'], "size": {size}, "child_offsets": '
+    yield from array(child_offsets.tolist())
+    yield ', "children": '
+    yield from array(children[order].tolist())
+    yield ', "roots": '
+    yield from array(roots.tolist())
+    yield "}"
 
 
 class Serializers:
@@ -29,17 +126,37 @@ class Serializers:
 
             self.fields["configuration_items"] = configuration_item.Serializers.WithWbsElement(many=True)
 
+    # the nodes are streamed by `Viewset.retrieve` (see `bom_tree`)
+    class BomTree(serializers.ModelSerializer):
+        class Meta:
+            model = WbsElement
+            fields = [
+                "id",
+                "name",
+            ]
+
+        chain_queryset = lambda q, r: q.prefetch_related(None)
+
     for_ = {
         "summary": Summary,
         "detail": Detail,
+        "bom_tree": BomTree,
     }
 
 
 class Viewset(ProjectionsAndFilters):
-    queryset = WbsElement.objects.prefetch_related(Prefetch(lookup="configuration_items", queryset=ConfigurationItem.objects.prefetch_related("parents")))
+    queryset = WbsElement.objects.prefetch_related(Prefetch(lookup="configuration_items", queryset=ConfigurationItem.objects.with_kit_readiness().with_program_inventory().prefetch_related("parents")))
     serializers = Serializers
     serializer_class = Serializers.Detail
+    cache_dependencies = [ProgramInventory]
 
     filters = {
-        "name": lambda q, v, _: q.filter(name=v),
+        "name": Filter("name"),
     }
+
+    def retrieve(self, request, *args, **kwargs):
+        # `?projection=bom_tree` streams the BOM as parallel arrays
+        if request.query_params.get("projection") == "bom_tree":
+            return StreamingHttpResponse(bom_tree(self.get_object()), content_type="application/json")
+
+        return super().retrieve(request, *args, **kwargs)
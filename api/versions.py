@@ -0,0 +1,129 @@
+from django.apps import apps
+from django.contrib.admin.models import LogEntry
+from django.db.models import F
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from functools import lru_cache
+from core.models import ModelVersion
+
+'''
+Version counters of the models, which key the response cache of
+`ProjectionsAndFilters`: a cached page is only found again while every
+model it was built from is at the same version, so it is never served
+stale and needs no expiry.
+
+The counters are `ModelVersion` rows, bumped in the transaction that
+changes the model, so they commit (or roll back) with it and every
+process sees them: the pages themselves can stay in a per-process cache.
+
+A model's version is bumped when:
+
+    one of its instances is saved or deleted (signals)
+    an admin adds, changes or deletes one (admin log entries)
+    the API creates, updates or deletes one (`ProjectionsAndFilters`)
+    an upload pipeline writing to it completes (`bump` in the ingest)
+
+A delete also bumps the models whose rows it cascades to or nulls.
+
+Listening to `post_delete` makes Django fetch and signal every row a
+queryset deletes instead of running a single DELETE, so the tables the
+upload pipelines bulk-delete from (`BULK_MODELS`) get no delete
+receiver: their pipelines bump them instead, and the admin and the
+API catch individual deletes.
+'''
+
+# Apps whose models the API serves
+APPS = ["core", "users", "auth"]
+
+BULK_MODELS = [
+    "core.ConfigurationItem",
+    "core.ConfigurationItemClosure",
+    "core.InventoryItem",
+    "core.ProgramInventory",
+    "core.AltSub",
+    "core.StagedRow",
+]
+
+
+def name(model):
+    '''
+    Name of the counter of `model`, or `model` itself if already a name.
+    '''
+
+    return model if isinstance(model, str) else model._meta.label_lower
+
+
+def get(models):
+    '''
+    Current versions of `models` (or counter names), in order.
+    '''
+
+    names = [name(model) for model in models]
+    versions = dict(ModelVersion.objects.filter(name__in=names).values_list("name", "version"))
+    return tuple(versions.get(counter, 0) for counter in names)
+
+
+def bump(*models):
+    '''
+    Bumps the versions of `models` (or counter names) as part of the
+    current transaction.
+    '''
+
+    # sorted, so concurrent transactions lock the rows in the same order
+    names = sorted({name(model) for model in models})
+    ModelVersion.objects.bulk_create([ModelVersion(name=counter) for counter in names], ignore_conflicts=True)
+    ModelVersion.objects.filter(name__in=names).update(version=F("version") + 1)
+
+
+@lru_cache(maxsize=None)
+def dependents(model):
+    '''
+    `model` and every model whose rows point at it, directly or not, so
+    deleting one of its rows can change theirs.
+    '''
+
+    found = {model}
+    pending = [model]
+    while pending:
+        for relation in pending.pop()._meta.related_objects:
+            if relation.related_model not in found:
+                found.add(relation.related_model)
+                pending.append(relation.related_model)
+    return tuple(sorted(found, key=lambda related: related._meta.label))
+
+
+def saved(sender, **kwargs):
+    bump(sender)
+
+
+def deleted(sender, **kwargs):
+    bump(*dependents(sender))
+
+
+def m2m(sender, instance, action, model, **kwargs):
+    if action.startswith("post_"):
+        bump(type(instance), model, sender)
+
+
+def logged(sender, instance, **kwargs):
+    model = instance.content_type.model_class() if instance.content_type_id else None
+    if model is not None:
+        bump(*dependents(model))
+
+
+def connect():
+    '''
+    Connects the receivers; called once by `ApiConfig.ready`.
+    '''
+
+    bulk = {apps.get_model(label) for label in BULK_MODELS}
+
+    m2m_changed.connect(m2m, dispatch_uid="api.versions.m2m")
+    post_save.connect(logged, sender=LogEntry, dispatch_uid="api.versions.logged")
+    for app in APPS:
+        for model in apps.get_app_config(app).get_models():
+            if model is ModelVersion:
+                continue
+            uid = model._meta.label_lower
+            post_save.connect(saved, sender=model, dispatch_uid=f"api.versions.saved.{uid}")
+            if model not in bulk:
+                post_delete.connect(deleted, sender=model, dispatch_uid=f"api.versions.deleted.{uid}")
@@ -1,5 +1,13 @@
-from rest_framework import viewsets, filters
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework import viewsets, filters, serializers
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
 from zen_queries.rest_framework import QueriesDisabledViewMixin
+from api import versions
+import datetime
+import hashlib
 
 
 class InvalidProjectionError(Exception):
@@ -10,6 +18,132 @@ class InvalidFilterError(Exception):
     pass
 
 
+BOOLEANS = {"true": True, "1": True, "yes": True, "false": False, "0": False, "no": False}
+
+
+def boolean(value):
+    if value.lower() not in BOOLEANS:
+        raise ValueError(value)
+    return BOOLEANS[value.lower()]
+
+
+def positive(value):
+    value = int(value)
+    if value < 1:
+        raise ValueError(value)
+    return value
+
+
+def date(value):
+    return datetime.date.fromisoformat(value)
+
+
+def choice(*values):
+    def parse(value):
+        if value not in values:
+            raise ValueError(value)
+        return value
+
+    return parse
+
+
+class Filter:
+    '''
+    Typed entry of `ProjectionsAndFilters.filters`, which maps each
+    operator to a lookup a B-tree index can seek on:
+
+        exact     ?plant=P100                  plant = 'P100'
+        prefix    ?wbs=Y-ABCDE                 wbs >= 'Y-ABCDE' AND wbs < 'Y-ABCDE\U0010ffff'
+        in        ?material_type=3,5           material_type IN (3, 5)
+        range     ?req_date=2024-01-01,        req_date >= '2024-01-01' (either bound optional)
+        set       ?superseded=true             superseded_by IS NOT NULL (`type=boolean`)
+
+    Prefixes are a range rather than `__startswith`, which SQLite runs as
+    a case-insensitive LIKE that cannot use the index. They are
+    case-sensitive. `contains` (`__icontains`) is kept for small tables
+    and free text, and always scans.
+
+    Values are converted with `type` (e.g. `int`, `boolean`, `date` or
+    `choice("A", "B")`); a value that does not convert is a 400. Other
+    query parameters are read the same way, e.g.
+    `Filter("page", type=positive).parse(value)`.
+    '''
+
+    OPERATORS = ["exact", "prefix", "in", "range", "set", "contains"]
+
+    def __init__(self, field, op="exact", type=str):
+        if op not in self.OPERATORS:
+            raise ValueError(f'Invalid filter operator: "{op}"')
+        self.field = field
+        self.op = op
+        self.type = type
+
+    def parse(self, value):
+        try:
+            return self.type(value.strip())
+        except (TypeError, ValueError):
+            raise ValidationError({self.field: [f'Invalid value: "{value}"']})
+
+    def lookups(self, value):
+        if self.op == "prefix":
+            value = self.parse(value)
+            return {f"{self.field}__gte": value, f"{self.field}__lt": value + "\U0010ffff"}
+        if self.op == "in":
+            return {f"{self.field}__in": [self.parse(part) for part in value.split(",") if part.strip()]}
+        if self.op == "range":
+            low, _, high = value.partition(",")
+            bounds = {}
+            if low.strip():
+                bounds[f"{self.field}__gte"] = self.parse(low)
+            if high.strip():
+                bounds[f"{self.field}__lte"] = self.parse(high)
+            return bounds
+        if self.op == "set":
+            return {f"{self.field}__isnull": not self.parse(value)}
+        if self.op == "contains":
+            return {f"{self.field}__icontains": self.parse(value)}
+        return {self.field: self.parse(value)}
+
+    def __call__(self, q, value, request):
+        return q.filter(**self.lookups(value))
+
+
+def checked(filter):
+    # for parameters other filters or actions read: only checks the value
+    def check(q, value, request):
+        filter.parse(value)
+        return q
+
+    return check
+
+
+def serializer_models(serializer_class, found=None):
+    '''
+    Models of `serializer_class` and of the serializers nested in it,
+    with the through models of their many-to-many fields.
+    '''
+
+    found = set() if found is None else found
+    model = getattr(getattr(serializer_class, "Meta", None), "model", None)
+    if model:
+        found.add(model)
+
+    for field in serializer_class().fields.values():
+        if model:
+            try:
+                relation = model._meta.get_field(field.source)
+            except (FieldDoesNotExist, TypeError):
+                relation = None
+            if relation is not None and relation.many_to_many:
+                found.add(relation.through if relation.auto_created and not relation.concrete else relation.remote_field.through)
+
+        field = getattr(field, "child", field)
+        if isinstance(field, serializers.BaseSerializer):
+            serializer_models(type(field), found)
+
+    return found
+
+
 class ProjectionsAndFilters(viewsets.ModelViewSet, QueriesDisabledViewMixin):
     filter_backends = [filters.OrderingFilter]
     ordering = ["id"]
@@ -19,8 +153,66 @@ class ProjectionsAndFilters(viewsets.ModelViewSet, QueriesDisabledViewMixin):
     filters = {}
     _default_filters = [
         "page",
+        "dry_run",
     ]
 
+    # List and detail responses are cached, keyed by the request and the
+    # versions of the models they are built from (see `api.versions`):
+    # the queryset's model, the models of the projection's serializers,
+    # and `cache_dependencies` for what annotations and filters read.
+    cache_responses = True
+    cache_dependencies = []
+    _cache_models = {}
+
+    def list(self, request, *args, **kwargs):
+        return self.cached(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached(super().retrieve, request, *args, **kwargs)
+
+    def cache_models(self):
+        cache_key = (type(self), self.get_serializer_class())
+        if cache_key not in self._cache_models:
+            models = serializer_models(cache_key[1], {self.queryset.model, *self.cache_dependencies})
+            self._cache_models[cache_key] = sorted(models, key=lambda model: model._meta.label)
+        return self._cache_models[cache_key]
+
+    def cached(self, view, request, *args, **kwargs):
+        if not (settings.RESPONSE_CACHE and self.cache_responses):
+            return view(request, *args, **kwargs)
+
+        # versions are read before the data, so a write landing meanwhile files the page under the old ones
+        request_key = (
+            type(self).__module__,
+            type(self).__qualname__,
+            self.action,
+            sorted(kwargs.items()),
+            sorted(request.query_params.lists()),
+            versions.get(self.cache_models()),
+        )
+        key = "response:" + hashlib.md5(repr(request_key).encode()).hexdigest()
+
+        data = cache.get(key)
+        if data is not None:
+            return Response(data)
+
+        response = view(request, *args, **kwargs)
+        if isinstance(response, Response) and response.status_code == 200:
+            cache.set(key, response.data, settings.RESPONSE_CACHE_TIMEOUT)
+        return response
+
+    def perform_create(self, serializer):
+        super().perform_create(serializer)
+        versions.bump(self.queryset.model)
+
+    def perform_update(self, serializer):
+        super().perform_update(serializer)
+        versions.bump(self.queryset.model)
+
+    def perform_destroy(self, instance):
+        super().perform_destroy(instance)
+        versions.bump(*versions.dependents(self.queryset.model))
+
     def get_serializer_class(self, *args, **kwargs):
         if self.request.method == "GET":
 
@@ -74,6 +266,8 @@ class ProjectionsAndFilters(viewsets.ModelViewSet, QueriesDisabledViewMixin):
             # dynamically build the list of filters on the queryset
             if filters:
                 for filter in filters:
+                    if filter in self._default_filters:
+                        continue
                     q = self.filters[filter](q, self.request.query_params.get(filter), self.request)
 
         return q
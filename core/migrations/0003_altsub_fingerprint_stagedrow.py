@@ -0,0 +1,72 @@
+# Generated by Django 4.0.2 on 2026-10-18 08:52
+
+import django.core.serializers.json
+from django.db import migrations, models
+import hashlib
+
+
+def fingerprint(values):
+    joined = "\x1f".join("\x00" if value is None else str(value) for value in values)
+    return hashlib.blake2b(joined.encode(), digest_size=16).hexdigest()
+
+
+def backfill_altsub_fingerprints(apps, schema_editor):
+    AltSub = apps.get_model("core", "AltSub")
+    fields = [
+        "plant",
+        "model__model_code",
+        "type_code",
+        "primary_material_id",
+        "replacement_part_id",
+        "next_higher_assembly",
+        "alternate_or_substitute_code",
+        "sub_code",
+        "wbs_element",
+        "revision_level",
+        "reason_for_change",
+        "item_text_line",
+        "created_by",
+        "created_date",
+    ]
+
+    batch = []
+    for id, *values in AltSub.objects.values_list("id", *fields).iterator():
+        batch.append(AltSub(id=id, fingerprint=fingerprint(values)))
+        if len(batch) >= 10_000:
+            AltSub.objects.bulk_update(batch, ["fingerprint"])
+            batch = []
+    AltSub.objects.bulk_update(batch, ["fingerprint"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_groupwbs_program_sector_wbselement_wbselementuser_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StagedRow',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('batch', models.UUIDField()),
+                ('row', models.PositiveIntegerField()),
+                ('fingerprint', models.CharField(max_length=32)),
+                ('data', models.JSONField(encoder=django.core.serializers.json.DjangoJSONEncoder)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='altsub',
+            name='fingerprint',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=32),
+        ),
+        migrations.RunPython(backfill_altsub_fingerprints, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='stagedrow',
+            index=models.Index(fields=['batch', 'row'], name='staged_rows_batch_row'),
+        ),
+        migrations.AddConstraint(
+            model_name='stagedrow',
+            constraint=models.UniqueConstraint(fields=('batch', 'fingerprint'), name='unique_staged_rows'),
+        ),
+    ]
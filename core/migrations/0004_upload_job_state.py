@@ -0,0 +1,160 @@
+# Generated by Django 4.0.2 on 2026-10-18 08:53
+
+from django.db import migrations, models
+
+
+def mark_existing_uploads_succeeded(apps, schema_editor):
+    # uploads made before the job runner were processed synchronously
+    for model_name in ["AltSubUpload", "ConfigurationItemUpload", "InventoryUpload", "MaterialMasterUpload"]:
+        apps.get_model("core", model_name).objects.update(status=3)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_altsub_fingerprint_stagedrow'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='altsubupload',
+            name='errors',
+            field=models.JSONField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='altsubupload',
+            name='finished',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='altsubupload',
+            name='rows_added',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='altsubupload',
+            name='rows_deleted',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='altsubupload',
+            name='rows_read',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='altsubupload',
+            name='started',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='altsubupload',
+            name='status',
+            field=models.IntegerField(choices=[(1, 'Queued'), (2, 'Running'), (3, 'Succeeded'), (4, 'Failed')], default=1),
+        ),
+        migrations.AddField(
+            model_name='configurationitemupload',
+            name='errors',
+            field=models.JSONField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='configurationitemupload',
+            name='finished',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='configurationitemupload',
+            name='rows_added',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='configurationitemupload',
+            name='rows_deleted',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='configurationitemupload',
+            name='rows_read',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='configurationitemupload',
+            name='started',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='configurationitemupload',
+            name='status',
+            field=models.IntegerField(choices=[(1, 'Queued'), (2, 'Running'), (3, 'Succeeded'), (4, 'Failed')], default=1),
+        ),
+        migrations.AddField(
+            model_name='inventoryupload',
+            name='errors',
+            field=models.JSONField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='inventoryupload',
+            name='finished',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='inventoryupload',
+            name='rows_added',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='inventoryupload',
+            name='rows_deleted',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='inventoryupload',
+            name='rows_read',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='inventoryupload',
+            name='started',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='inventoryupload',
+            name='status',
+            field=models.IntegerField(choices=[(1, 'Queued'), (2, 'Running'), (3, 'Succeeded'), (4, 'Failed')], default=1),
+        ),
+        migrations.AddField(
+            model_name='materialmasterupload',
+            name='errors',
+            field=models.JSONField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='materialmasterupload',
+            name='finished',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='materialmasterupload',
+            name='rows_added',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='materialmasterupload',
+            name='rows_deleted',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='materialmasterupload',
+            name='rows_read',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='materialmasterupload',
+            name='started',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='materialmasterupload',
+            name='status',
+            field=models.IntegerField(choices=[(1, 'Queued'), (2, 'Running'), (3, 'Succeeded'), (4, 'Failed')], default=1),
+        ),
+        migrations.RunPython(mark_existing_uploads_succeeded, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 4.0.2 on 2026-10-18 08:55
+
+from django.db import migrations, models
+import hashlib
+
+
+def fingerprint(values):
+    joined = "\x1f".join("\x00" if value is None else str(value) for value in values)
+    return hashlib.blake2b(joined.encode(), digest_size=16).hexdigest()
+
+
+def backfill_materialmaster_fingerprints(apps, schema_editor):
+    MaterialMaster = apps.get_model("core", "MaterialMaster")
+    fields = [
+        "name",
+        "nomenclature",
+        "plant",
+        "material_type",
+        "base_unit_of_measure",
+        "procurement_type",
+        "goods_receipt_time",
+        "planned_delivery_time",
+        "storage_condition",
+        "base_drawing",
+        "electrical_flag",
+    ]
+
+    batch = []
+    for id, *values in MaterialMaster.objects.values_list("id", *fields).iterator():
+        batch.append(MaterialMaster(id=id, fingerprint=fingerprint(values)))
+        if len(batch) >= 10_000:
+            MaterialMaster.objects.bulk_update(batch, ["fingerprint"])
+            batch = []
+    MaterialMaster.objects.bulk_update(batch, ["fingerprint"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_upload_job_state'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='materialmaster',
+            name='fingerprint',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=32),
+        ),
+        migrations.RunPython(backfill_materialmaster_fingerprints, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 4.0.2 on 2026-10-18 08:56
+
+from django.db import migrations, models
+import hashlib
+
+
+def fingerprint(values):
+    joined = "\x1f".join("\x00" if value is None else str(value) for value in values)
+    return hashlib.blake2b(joined.encode(), digest_size=16).hexdigest()
+
+
+def backfill_inventoryitem_fingerprints(apps, schema_editor):
+    InventoryItem = apps.get_model("core", "InventoryItem")
+    fields = [
+        "material_master_id",
+        "plant",
+        "storage_location",
+        "material_type",
+        "wbs",
+        "batch",
+        "lot_date_code",
+        "base_unit_of_measure",
+        "unrestricted_inventory",
+        "qm_lot_inventory",
+        "restricted_inventory",
+        "blocked_inventory",
+        "shelf_life_expiration_date",
+        "discard_date",
+        "on_hand_inventory",
+        "program_group_wbs_id",
+    ]
+
+    batch = []
+    for id, *values in InventoryItem.objects.values_list("id", *fields).iterator():
+        batch.append(InventoryItem(id=id, fingerprint=fingerprint(values)))
+        if len(batch) >= 10_000:
+            InventoryItem.objects.bulk_update(batch, ["fingerprint"])
+            batch = []
+    InventoryItem.objects.bulk_update(batch, ["fingerprint"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_materialmaster_fingerprint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='inventoryitem',
+            name='fingerprint',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=32),
+        ),
+        migrations.RunPython(backfill_inventoryitem_fingerprints, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 4.0.2 on 2026-10-18 09:10
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_inventoryitem_fingerprint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='altsubupload',
+            name='checksum',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=32),
+        ),
+        migrations.AddField(
+            model_name='altsubupload',
+            name='superseded_by',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='supersedes', to='core.altsubupload'),
+        ),
+        migrations.AddField(
+            model_name='configurationitemupload',
+            name='checksum',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=32),
+        ),
+        migrations.AddField(
+            model_name='configurationitemupload',
+            name='superseded_by',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='supersedes', to='core.configurationitemupload'),
+        ),
+        migrations.AddField(
+            model_name='inventoryupload',
+            name='checksum',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=32),
+        ),
+        migrations.AddField(
+            model_name='inventoryupload',
+            name='superseded_by',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='supersedes', to='core.inventoryupload'),
+        ),
+        migrations.AddField(
+            model_name='materialmasterupload',
+            name='checksum',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=32),
+        ),
+        migrations.AddField(
+            model_name='materialmasterupload',
+            name='superseded_by',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='supersedes', to='core.materialmasterupload'),
+        ),
+    ]
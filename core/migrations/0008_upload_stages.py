@@ -0,0 +1,33 @@
+# Generated by Django 4.0.2 on 2026-10-18 09:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_upload_history'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='altsubupload',
+            name='stages',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+        migrations.AddField(
+            model_name='configurationitemupload',
+            name='stages',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+        migrations.AddField(
+            model_name='inventoryupload',
+            name='stages',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+        migrations.AddField(
+            model_name='materialmasterupload',
+            name='stages',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
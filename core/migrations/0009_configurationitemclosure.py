@@ -0,0 +1,57 @@
+# Generated by Django 4.0.2 on 2026-10-18 09:19
+
+from collections import defaultdict
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def backfill_configurationitem_closure(apps, schema_editor):
+    ConfigurationItem = apps.get_model("core", "ConfigurationItem")
+    ConfigurationItemClosure = apps.get_model("core", "ConfigurationItemClosure")
+
+    parents = defaultdict(list)
+    for child, parent in ConfigurationItem.parents.through.objects.values_list("from_configurationitem_id", "to_configurationitem_id").iterator():
+        parents[child].append(parent)
+
+    batch = []
+    for descendant in list(parents):
+        depths, frontier, depth = {}, [descendant], 0
+        while frontier:
+            depth += 1
+            frontier = [parent for node in frontier for parent in parents[node] if parent not in depths]
+            for ancestor in frontier:
+                depths.setdefault(ancestor, depth)
+
+        batch.extend(ConfigurationItemClosure(ancestor_id=ancestor, descendant_id=descendant, depth=depth) for ancestor, depth in depths.items())
+        if len(batch) >= 10_000:
+            ConfigurationItemClosure.objects.bulk_create(batch)
+            batch = []
+    ConfigurationItemClosure.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_upload_stages'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ConfigurationItemClosure',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('depth', models.PositiveIntegerField()),
+                ('ancestor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='descendant_links', to='core.configurationitem')),
+                ('descendant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ancestor_links', to='core.configurationitem')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='configurationitemclosure',
+            index=models.Index(fields=['descendant', 'depth'], name='closure_descendant_depth'),
+        ),
+        migrations.AddConstraint(
+            model_name='configurationitemclosure',
+            constraint=models.UniqueConstraint(fields=('ancestor', 'descendant'), name='unique_configuration_item_closure'),
+        ),
+        migrations.RunPython(backfill_configurationitem_closure, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 4.0.2 on 2026-10-18 09:21
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def backfill_program_inventory(apps, schema_editor):
+    InventoryItem = apps.get_model("core", "InventoryItem")
+    ProgramInventory = apps.get_model("core", "ProgramInventory")
+
+    totals = (
+        InventoryItem.objects.filter(program_group_wbs__isnull=False)
+        .values_list("program_group_wbs_id", "material_master_id")
+        .annotate(models.Sum("on_hand_inventory"))
+        .order_by()
+    )
+    ProgramInventory.objects.bulk_create(
+        [ProgramInventory(group_wbs_id=group_wbs, material_master_id=material, on_hand_inventory=on_hand) for group_wbs, material, on_hand in totals.iterator()],
+        batch_size=10_000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_configurationitemclosure'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProgramInventory',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('on_hand_inventory', models.FloatField(null=True)),
+                ('group_wbs', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='program_inventory', to='core.groupwbs')),
+                ('material_master', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='program_inventory', to='core.materialmaster', to_field='name')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='programinventory',
+            constraint=models.UniqueConstraint(fields=('group_wbs', 'material_master'), name='unique_program_inventory'),
+        ),
+        migrations.RunPython(backfill_program_inventory, migrations.RunPython.noop),
+    ]
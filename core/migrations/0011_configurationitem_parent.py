@@ -0,0 +1,30 @@
+# Generated by Django 4.0.2 on 2026-10-18 09:22
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def backfill_parent(apps, schema_editor):
+    ConfigurationItem = apps.get_model("core", "ConfigurationItem")
+
+    edges = ConfigurationItem.parents.through.objects.filter(
+        from_configurationitem_id=models.OuterRef("pk"),
+        to_configurationitem__replenishment=models.OuterRef("net_order"),
+    )
+    ConfigurationItem.objects.update(parent=models.Subquery(edges.order_by("to_configurationitem_id").values("to_configurationitem_id")[:1]))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_programinventory'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='configurationitem',
+            name='parent',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='core.configurationitem'),
+        ),
+        migrations.RunPython(backfill_parent, migrations.RunPython.noop),
+    ]
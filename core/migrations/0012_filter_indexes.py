@@ -0,0 +1,49 @@
+# Generated by Django 4.0.2 on 2026-10-18 09:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_configurationitem_parent'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='altsub',
+            index=models.Index(fields=['plant', 'primary_material'], name='alt_sub_plant'),
+        ),
+        migrations.AddIndex(
+            model_name='altsub',
+            index=models.Index(fields=['type_code'], name='alt_sub_type_code'),
+        ),
+        migrations.AddIndex(
+            model_name='configurationitem',
+            index=models.Index(fields=['name'], name='configuration_item_name'),
+        ),
+        migrations.AddIndex(
+            model_name='configurationitem',
+            index=models.Index(fields=['req_date'], name='configuration_item_req_date'),
+        ),
+        migrations.AddIndex(
+            model_name='configurationitem',
+            index=models.Index(fields=['po_delivery'], name='configuration_item_po_deliv'),
+        ),
+        migrations.AddIndex(
+            model_name='inventoryitem',
+            index=models.Index(fields=['plant', 'material_master'], name='inventory_item_plant'),
+        ),
+        migrations.AddIndex(
+            model_name='inventoryitem',
+            index=models.Index(fields=['wbs'], name='inventory_item_wbs'),
+        ),
+        migrations.AddIndex(
+            model_name='inventoryitem',
+            index=models.Index(fields=['shelf_life_expiration_date'], name='inventory_item_sled'),
+        ),
+        migrations.AddIndex(
+            model_name='materialmaster',
+            index=models.Index(fields=['plant', 'name'], name='material_master_plant'),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 4.0.2 on 2026-10-18 09:30
+
+from django.db import migrations
+
+
+# FTS5 table behind api.search, one row per material with its id as rowid (SQLite only)
+def create_part_search(apps, schema_editor):
+    if schema_editor.connection.vendor != "sqlite":
+        return
+
+    schema_editor.execute("CREATE VIRTUAL TABLE core_partsearch USING fts5(name, nomenclature, base_drawing, related, tokenize='trigram')")
+    schema_editor.execute(
+        """
+        INSERT INTO core_partsearch (rowid, name, nomenclature, base_drawing, related)
+        SELECT m.id, m.name, coalesce(m.nomenclature, ''), coalesce(m.base_drawing, ''), coalesce((
+            SELECT group_concat(part, ' ') FROM (
+                SELECT replacement_part_id AS part FROM core_altsub WHERE primary_material_id = m.name
+                UNION SELECT primary_material_id FROM core_altsub WHERE replacement_part_id = m.name
+                UNION SELECT next_higher_assembly FROM core_altsub WHERE primary_material_id = m.name AND next_higher_assembly IS NOT NULL
+                UNION SELECT wbs FROM core_inventoryitem WHERE material_master_id = m.name AND wbs IS NOT NULL
+                UNION SELECT batch FROM core_inventoryitem WHERE material_master_id = m.name
+            )
+        ), '')
+        FROM core_materialmaster m
+        """
+    )
+
+
+def drop_part_search(apps, schema_editor):
+    if schema_editor.connection.vendor == "sqlite":
+        schema_editor.execute("DROP TABLE core_partsearch")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_part_search, drop_part_search),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 4.0.2 on 2026-10-18 10:27
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_model_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='altsubupload',
+            name='heartbeat',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+        migrations.AddField(
+            model_name='configurationitemupload',
+            name='heartbeat',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+        migrations.AddField(
+            model_name='inventoryupload',
+            name='heartbeat',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+        migrations.AddField(
+            model_name='materialmasterupload',
+            name='heartbeat',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+    ]
@@ -1,12 +1,15 @@
 from attr import field
 from django.conf import settings
 from django.db import models
-from django.db.models import constraints, Sum
+from django.db.models import constraints
+from django.utils import timezone
 from django.utils.text import slugify
 from django.forms import ValidationError
 from django.urls import reverse
 from django.core.validators import RegexValidator
+from django.core.serializers.json import DjangoJSONEncoder
 import datetime
+import hashlib
 from functools import cached_property
 from django.core.validators import MinValueValidator, MaxValueValidator
 
@@ -14,6 +17,15 @@ from django.core.validators import MinValueValidator, MaxValueValidator
 validate_y_group = RegexValidator(regex=r"^[Y]-[A-Z0-9]{5}-[A-Z]{2}$", message="Please enter a valid Y-Group")
 
 
+def fingerprint(values):
+    """
+    Stable content hash of a row of values. Upload pipelines store it on
+    each row so files can be diffed against the database in SQL.
+    """
+    joined = "\x1f".join("\x00" if value is None else str(value) for value in values)
+    return hashlib.blake2b(joined.encode(), digest_size=16).hexdigest()
+
+
 def format_to_percent(obj, sigdigits):
     if obj:
         return "{0:.{sigdigits}%}".format(obj, sigdigits=sigdigits)
@@ -76,6 +88,66 @@ class ProgramUser(models.Model):
     program = models.ForeignKey(Program, on_delete=models.CASCADE, related_name="program_users")
 
 
+####################################################################################################
+# Upload Job Model
+class UploadJob(models.Model):
+    """
+    Uploads are processed by a background worker (see `api.uploads.jobs`).
+    These fields track the job so the frontend can poll its progress, and
+    `stages` keeps the time, queries and row counts of each stage of the
+    pipeline (see `api.uploads.jobs.stage`).
+
+    `checksum` identifies the file's content, and `superseded_by` links a
+    successful upload to the next one applied over it (see
+    `api.uploads.history`).
+    """
+
+    class StatusChoices(models.IntegerChoices):
+        QUEUED = 1, "Queued"
+        RUNNING = 2, "Running"
+        SUCCEEDED = 3, "Succeeded"
+        FAILED = 4, "Failed"
+
+    status = models.IntegerField(choices=StatusChoices.choices, default=StatusChoices.QUEUED)
+    rows_read = models.PositiveIntegerField(default=0)
+    rows_added = models.PositiveIntegerField(default=0)
+    rows_deleted = models.PositiveIntegerField(default=0)
+    started = models.DateTimeField(blank=True, null=True)
+    finished = models.DateTimeField(blank=True, null=True)
+    errors = models.JSONField(blank=True, null=True)
+    stages = models.JSONField(blank=True, default=dict, editable=False)
+    checksum = models.CharField(max_length=32, blank=True, default="", db_index=True, editable=False)
+    superseded_by = models.ForeignKey("self", blank=True, null=True, on_delete=models.SET_NULL, related_name="supersedes", editable=False)
+    # last write of the job: its creation, then each `update_job`
+    heartbeat = models.DateTimeField(default=timezone.now, editable=False)
+
+    class Meta:
+        abstract = True
+
+    @property
+    def duration(self):
+        if self.started:
+            return ((self.finished or timezone.now()) - self.started).total_seconds()
+
+    # set while a worker runs the job, to publish progress made inside the
+    # pipeline's transactions (see `api.uploads.jobs.Progress`)
+    progress = None
+
+    def update_job(self, **fields):
+        """
+        Saves job fields straight to the database, without touching the
+        rest of the record, so progress is visible to pollers immediately.
+        Unsaved uploads (dry runs) are only updated in memory.
+        """
+        fields = {**fields, "heartbeat": timezone.now()}
+        for field, value in fields.items():
+            setattr(self, field, value)
+        if self.pk and self.progress:
+            self.progress.write(type(self), self.pk, fields)
+        elif self.pk:
+            type(self).objects.filter(pk=self.pk).update(**fields)
+
+
 ####################################################################################################
 # Group WBS & WBS Elements Models
 class GroupWbs(models.Model):
@@ -120,17 +192,107 @@ class WbsElementUser(models.Model):
 
 
 # Configuration Item Models
-class ConfigurationItemUpload(models.Model):
+class ConfigurationItemUpload(UploadJob):
     program = models.ForeignKey(Program, on_delete=models.CASCADE, related_name="configuration_item_uploads")
     data_file = models.FileField(blank=True, null=True, upload_to="program_reports/%Y/%m/%d")
     created = models.DateTimeField(auto_now_add=True)
 
 
+class ConfigurationItemQuerySet(models.QuerySet):
+    def with_kit_readiness(self):
+        """
+        Annotates each item with its number of parents and children, the
+        children on hand, and the kit-ready percentage (children on hand
+        over children), in the same grouped query as the items.
+        """
+        if "kit_ready_percentage" in self.query.annotations:
+            return self
+
+        return self.annotate(
+            parent_count=models.Count("parents", distinct=True),
+            child_count=models.Count("children", distinct=True),
+            on_hand_count=models.Count("children", filter=models.Q(children__replenishment=ConfigurationItem.ON_HAND), distinct=True),
+        ).annotate(
+            kit_ready_percentage=models.Case(
+                models.When(child_count__gt=0, then=100.0 * models.F("on_hand_count") / models.F("child_count")),
+                default=0.0,
+                output_field=models.FloatField(),
+            )
+        )
+
+    def with_late_to_need(self):
+        """
+        Annotates each item with `late_to_need`, the database-side version
+        of `ConfigurationItem.is_late_to_need`: "LTN", "ON TIME" or null.
+        """
+        if "late_to_need" in self.query.annotations:
+            return self
+
+        return self.annotate(
+            late_to_need=models.Case(
+                models.When(configuration_type=ConfigurationItem.ConfigurationTypeChoices.MAKE, then=None),
+                models.When(po_delivery__isnull=False, req_date__lt=models.F("po_delivery"), then=models.Value(ConfigurationItem.LTN)),
+                models.When(po_delivery__isnull=True, replenishment=ConfigurationItem.ON_HAND, then=models.Value(ConfigurationItem.ON_TIME)),
+                default=None,
+                output_field=models.CharField(),
+            )
+        )
+
+    def late_to_need_counts(self):
+        """
+        LTN, ON TIME and n/a item counts per WBS element, in one grouped
+        query. Each row also carries the element's group WBS and program.
+        """
+        return (
+            self.with_late_to_need()
+            .order_by()
+            .values("wbs_element_id", "wbs_element__group_wbs_id", "wbs_element__group_wbs__program_id")
+            .annotate(
+                ltn=models.Count("pk", filter=models.Q(late_to_need=ConfigurationItem.LTN)),
+                on_time=models.Count("pk", filter=models.Q(late_to_need=ConfigurationItem.ON_TIME)),
+                na=models.Count("pk", filter=models.Q(late_to_need__isnull=True)),
+            )
+        )
+
+    def resolve_parents(self):
+        """
+        Sets `parent` on every item to the first of its `parents` whose
+        `replenishment` is the item's `net_order`, in one UPDATE.
+        """
+        edges = ConfigurationItem.parents.through.objects.filter(
+            from_configurationitem_id=models.OuterRef("pk"),
+            to_configurationitem__replenishment=models.OuterRef("net_order"),
+        )
+        return self.update(parent=models.Subquery(edges.order_by("to_configurationitem_id").values("to_configurationitem_id")[:1]))
+
+    def with_program_inventory(self):
+        """
+        Annotates each item with the on-hand inventory of its material in
+        its program's group WBS, read from `ProgramInventory`.
+        """
+        return self.annotate(
+            program_inventory=models.Subquery(
+                ProgramInventory.objects.filter(
+                    group_wbs_id=models.OuterRef("wbs_element__group_wbs_id"),
+                    material_master_id=models.OuterRef("name"),
+                ).values("on_hand_inventory")[:1]
+            )
+        )
+
+
 class ConfigurationItem(models.Model):
+    # `replenishment` of the items already in stock
+    ON_HAND = "ON-HAND QTY"
+    # values of `is_late_to_need`
+    LTN = "LTN"
+    ON_TIME = "ON TIME"
+
     wbs_element = models.ForeignKey(WbsElement, on_delete=models.CASCADE, related_name="configuration_items")
     upload = models.ForeignKey(ConfigurationItemUpload, null=True, on_delete=models.CASCADE, related_name="configuration_items")
     name = models.CharField(max_length=100)
     parents = models.ManyToManyField("self", symmetrical=False, related_name="children")
+    # the parent whose `replenishment` is this item's `net_order`, resolved by the BOM upload
+    parent = models.ForeignKey("self", blank=True, null=True, on_delete=models.SET_NULL, related_name="+", editable=False)
 
     class ConfigurationTypeChoices(models.IntegerChoices):
         MAKE = 3, "MAKE"
@@ -145,6 +307,8 @@ class ConfigurationItem(models.Model):
     replenishment = models.CharField(max_length=100)
     po_delivery = models.DateField(blank=True, null=True)
 
+    objects = ConfigurationItemQuerySet.as_manager()
+
     class Meta:
         constraints = [
             constraints.UniqueConstraint(
@@ -158,6 +322,13 @@ class ConfigurationItem(models.Model):
                 name="unique_configuration_item",
             )
         ]
+        indexes = [
+            # `?name=` is a prefix match, which SQLite serves from this index
+            models.Index(fields=["name"], name="configuration_item_name"),
+            # the `?req_date=` and `?po_delivery=` ranges of the BOM views
+            models.Index(fields=["req_date"], name="configuration_item_req_date"),
+            models.Index(fields=["po_delivery"], name="configuration_item_po_deliv"),
+        ]
 
     def _str__(self):
         return self.name
@@ -165,40 +336,45 @@ class ConfigurationItem(models.Model):
     def get_absolute_url(self):
         return reverse("programs", kwargs={"slug": self.wbs_element.group_wbs.program.slug, "pk": self.pk})
 
+    # The kit-readiness properties use the annotations of
+    # `ConfigurationItem.objects.with_kit_readiness()` when present.
     @property
     def total_parent_items(self):
+        if hasattr(self, "parent_count"):
+            return self.parent_count
         return len(self.parents.all())
 
     @property
     def total_children_items(self):
+        if hasattr(self, "child_count"):
+            return self.child_count
         return len(self.children.all())
 
     @property
     def total_parts_in_inventory(self):
-        counter = 0
-        for child in self.children.all():
-            if child.replenishment == "ON-HAND QTY":
-                counter += 1
-        return counter
+        if hasattr(self, "on_hand_count"):
+            return self.on_hand_count
+        return sum(child.replenishment == self.ON_HAND for child in self.children.all())
 
     @property
     def calculate_kit_ready_percentage(self):
-        if self.total_parts_in_inventory > 0:
-            return format_to_percent(self.total_parts_in_inventory / self.total_children_items, 0)
+        parts_in_inventory = self.total_parts_in_inventory
+        if parts_in_inventory > 0:
+            return format_to_percent(parts_in_inventory / self.total_children_items, 0)
         else:
             return 0.0
 
     ##############################
     # *Get rid of
     def get_parent_object(self):
-        for parent in self.parents.all():
-            if parent.replenishment == self.net_order:
-                return parent
-
-    parent = property(get_parent_object)
+        return self.parent
 
+    # uses the annotation of `ConfigurationItem.objects.with_late_to_need()` when present
     @property
     def is_late_to_need(self):
+        if hasattr(self, "late_to_need"):
+            return self.late_to_need
+
         if self.configuration_type == 3:
             return None
 
@@ -206,29 +382,40 @@ class ConfigurationItem(models.Model):
             late_flag = self.req_date < self.po_delivery
 
             if late_flag:
-                return "LTN"
-        elif self.replenishment == "ON-HAND QTY":
-            return "ON TIME"
+                return self.LTN
+        elif self.replenishment == self.ON_HAND:
+            return self.ON_TIME
 
     ##############################
     # *Get rid of
     @property
     def total_program_inventory(self):
-        try:
-            inv = (
-                InventoryItem.objects.filter(program_group_wbs_id=self.wbs_element.group_wbs_id)
-                .filter(material_master_id__name=self.name)
-                .aggregate(Sum("on_hand_inventory"))
-            )
-            return inv["on_hand_inventory__sum"]
-        except InventoryItem.DoesNotExist:
-            return None
+        if hasattr(self, "program_inventory"):
+            return self.program_inventory
+        rollup = ProgramInventory.objects.filter(group_wbs_id=self.wbs_element.group_wbs_id, material_master_id=self.name).first()
+        return rollup.on_hand_inventory if rollup else None
 
     @property
     def formatted_req_date(self):
         return datetime.date.strftime(self.req_date, "%m/%d/%Y")
 
 
+class ConfigurationItemClosure(models.Model):
+    """
+    Transitive closure of `ConfigurationItem.parents`: one row for each
+    ancestor/descendant pair, at the depth of the shortest path between
+    them. Maintained by the BOM upload (see `api.uploads.closure`).
+    """
+
+    ancestor = models.ForeignKey(ConfigurationItem, on_delete=models.CASCADE, related_name="descendant_links")
+    descendant = models.ForeignKey(ConfigurationItem, on_delete=models.CASCADE, related_name="ancestor_links")
+    depth = models.PositiveIntegerField()
+
+    class Meta:
+        constraints = [constraints.UniqueConstraint(fields=["ancestor", "descendant"], name="unique_configuration_item_closure")]
+        indexes = [models.Index(fields=["descendant", "depth"], name="closure_descendant_depth")]
+
+
 ####################################################################################################
 # Company Data Models
 class Sector(models.Model):
@@ -237,7 +424,7 @@ class Sector(models.Model):
 
 ####################################################################################################
 # Material Master Models
-class MaterialMasterUpload(models.Model):
+class MaterialMasterUpload(UploadJob):
     sector = models.ForeignKey(Program, on_delete=models.CASCADE, related_name="material_master_uploads")
     data_file = models.FileField(upload_to="material_master_reports/%Y/%m/%d")
     created = models.DateTimeField(auto_now_add=True)
@@ -266,14 +453,38 @@ class MaterialMaster(models.Model):
     base_drawing = models.CharField(max_length=100, null=True, blank=True)
     electrical_flag = models.CharField(max_length=100, null=True, blank=True)
     upload = models.ForeignKey(MaterialMasterUpload, null=True, on_delete=models.CASCADE, related_name="material_master_items")
+    fingerprint = models.CharField(max_length=32, db_index=True, editable=False, default="")
+
+    class Meta:
+        # `?plant=` on its own, or with a `?name=` prefix
+        indexes = [models.Index(fields=["plant", "name"], name="material_master_plant")]
 
     def _str__(self):
         return self.name
 
+    def get_fingerprint_values(self):
+        return (
+            self.name,
+            self.nomenclature,
+            self.plant,
+            self.material_type,
+            self.base_unit_of_measure,
+            self.procurement_type,
+            self.goods_receipt_time,
+            self.planned_delivery_time,
+            self.storage_condition,
+            self.base_drawing,
+            self.electrical_flag,
+        )
+
+    def save(self, *args, **kwargs):
+        self.fingerprint = fingerprint(self.get_fingerprint_values())
+        super().save(*args, **kwargs)
+
 
 ####################################################################################################
 # Inventory Models
-class InventoryUpload(models.Model):
+class InventoryUpload(UploadJob):
     sector = models.ForeignKey(Program, on_delete=models.CASCADE, related_name="inventory_uploads")
     data_file = models.FileField(upload_to="inventory_reports/%Y/%m/%d")
     created = models.DateTimeField(auto_now_add=True)
@@ -307,14 +518,65 @@ class InventoryItem(models.Model):
     on_hand_inventory = models.FloatField(null=True)
     upload = models.ForeignKey(InventoryUpload, null=True, on_delete=models.CASCADE, related_name="inventory_items")
     program_group_wbs = models.ForeignKey(GroupWbs, blank=True, null=True, on_delete=models.CASCADE, related_name="inventory_items")
+    fingerprint = models.CharField(max_length=32, db_index=True, editable=False, default="")
+
+    class Meta:
+        indexes = [
+            # stock of a plant, optionally narrowed to a `?material_master=` prefix
+            models.Index(fields=["plant", "material_master"], name="inventory_item_plant"),
+            # `?wbs=` prefix matches
+            models.Index(fields=["wbs"], name="inventory_item_wbs"),
+            # stock expiring within a `?shelf_life_expiration_date=` range
+            models.Index(fields=["shelf_life_expiration_date"], name="inventory_item_sled"),
+        ]
 
     def get_absolute_url(self):
         return reverse("core:inventory_list")
 
+    def get_fingerprint_values(self):
+        return (
+            self.material_master_id,
+            self.plant,
+            self.storage_location,
+            self.material_type,
+            self.wbs,
+            self.batch,
+            self.lot_date_code,
+            self.base_unit_of_measure,
+            self.unrestricted_inventory,
+            self.qm_lot_inventory,
+            self.restricted_inventory,
+            self.blocked_inventory,
+            self.shelf_life_expiration_date,
+            self.discard_date,
+            self.on_hand_inventory,
+            self.program_group_wbs_id,
+        )
+
+    def save(self, *args, **kwargs):
+        self.fingerprint = fingerprint(self.get_fingerprint_values())
+        super().save(*args, **kwargs)
+
+
+class ProgramInventory(models.Model):
+    """
+    On-hand inventory of each material per group WBS, summed over every
+    sector's `InventoryItem`s. An inventory upload rebuilds the rows of
+    the group WBS whose inventory it changes (see
+    `api.v1.resources.inventory_item_upload`).
+    """
+
+    group_wbs = models.ForeignKey(GroupWbs, on_delete=models.CASCADE, related_name="program_inventory")
+    material_master = models.ForeignKey(MaterialMaster, to_field="name", on_delete=models.CASCADE, related_name="program_inventory")
+    on_hand_inventory = models.FloatField(null=True)
+
+    class Meta:
+        constraints = [constraints.UniqueConstraint(fields=["group_wbs", "material_master"], name="unique_program_inventory")]
+
 
 ####################################################################################################
 # Alt/Sub Models
-class AltSubUpload(models.Model):
+class AltSubUpload(UploadJob):
     sector = models.ForeignKey(Program, on_delete=models.CASCADE, related_name="altsub_uploads")
     data_file = models.FileField(upload_to="altsub_reports/%Y/%m/%d")
     created = models.DateTimeField(auto_now_add=True)
@@ -340,3 +602,67 @@ class AltSub(models.Model):
     created_by = models.CharField(max_length=100, blank=True, null=True)
     created_date = models.DateField(blank=True, null=True)
     upload = models.ForeignKey(AltSubUpload, null=True, on_delete=models.CASCADE, related_name="altsub_items")
+    fingerprint = models.CharField(max_length=32, db_index=True, editable=False, default="")
+
+    class Meta:
+        indexes = [
+            # alternates of a plant, optionally narrowed to a `?primary_material=` prefix
+            models.Index(fields=["plant", "primary_material"], name="alt_sub_plant"),
+            # `?type_code=` alternates vs. substitutes
+            models.Index(fields=["type_code"], name="alt_sub_type_code"),
+        ]
+
+    def get_fingerprint_values(self):
+        return (
+            self.plant,
+            self.model.model_code,
+            self.type_code,
+            self.primary_material_id,
+            self.replacement_part_id,
+            self.next_higher_assembly,
+            self.alternate_or_substitute_code,
+            self.sub_code,
+            self.wbs_element,
+            self.revision_level,
+            self.reason_for_change,
+            self.item_text_line,
+            self.created_by,
+            self.created_date,
+        )
+
+    def save(self, *args, **kwargs):
+        self.fingerprint = fingerprint(self.get_fingerprint_values())
+        super().save(*args, **kwargs)
+
+
+####################################################################################################
+# Upload Staging Models
+class StagedRow(models.Model):
+    """
+    Rows of an upload file, staged so the upload can be diffed against
+    the database with set-based queries. Each ingest run stages under its
+    own `batch` and clears it when done.
+    """
+
+    batch = models.UUIDField()
+    row = models.PositiveIntegerField()
+    fingerprint = models.CharField(max_length=32)
+    data = models.JSONField(encoder=DjangoJSONEncoder)
+
+    class Meta:
+        constraints = [constraints.UniqueConstraint(fields=["batch", "fingerprint"], name="unique_staged_rows")]
+        indexes = [models.Index(fields=["batch", "row"], name="staged_rows_batch_row")]
+
+
+####################################################################################################
+# Cache Version Models
+class ModelVersion(models.Model):
+    """
+    Version counters keying the caches of the API (see `api.versions`),
+    bumped in the same transaction as the rows they cover. They are kept
+    in the database rather than in the cache, so every process sees a
+    change as soon as it commits.
+    """
+
+    name = models.CharField(max_length=100, unique=True)
+    version = models.PositiveBigIntegerField(default=0)
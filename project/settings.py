@@ -39,6 +39,7 @@ INSTALLED_APPS = [
     "rest_framework",
     "users.apps.UsersConfig",
     "core.apps.CoreConfig",
+    "api.apps.ApiConfig",
 ]
 
 MIDDLEWARE = [
@@ -155,3 +156,46 @@ LOGGING = {
     },
     "loggers": {"django.db.backends": {"level": "DEBUG"}},
 }
+
+# Number of CSV rows read, diffed and written per batch by the upload pipelines
+UPLOAD_CHUNK_SIZE = 50_000
+
+# Keep a columnar snapshot of each parsed upload next to its file (see api.uploads.snapshots)
+UPLOAD_SNAPSHOTS = True
+
+# Rows per bulk INSERT/UPDATE statement on backends without a bound-parameter limit
+UPLOAD_BULK_BATCH_SIZE = 5_000
+
+# Number of background threads processing uploads per process (0 processes them inline; at most 1
+# on SQLite, which also needs a single web process to keep to one writer)
+UPLOAD_WORKERS = 2
+
+# Maximum number of natural keys (model codes, material names, ...) cached per upload
+UPLOAD_RESOLVER_CACHE_SIZE = 200_000
+
+# Seconds without progress after which `recover_uploads` fails a queued or running upload
+# as abandoned by a stopped server (see api.uploads.jobs)
+UPLOAD_STALE_AFTER = 30 * 60
+
+# Number of processes parsing the files of a batch ingest (None uses every core)
+UPLOAD_PROCESSES = None
+
+# Per-process cache of program dashboards and API responses. Their keys carry version counters
+# stored in the database (see api.versions), so a change made by any process is seen by all.
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    }
+}
+
+# Seconds a program dashboard is kept. Dashboards are never served stale; this only frees the
+# space of those whose program has since changed.
+DASHBOARD_CACHE_TIMEOUT = 60 * 60
+
+# Cache list and detail responses of the API, keyed by the model versions stored in the
+# database (see api.versions), so any cache backend is safe, even one per process
+RESPONSE_CACHE = True
+
+# Seconds a cached response is kept. Pages are never served stale; this only frees the space
+# of pages whose models have since changed.
+RESPONSE_CACHE_TIMEOUT = 24 * 60 * 60